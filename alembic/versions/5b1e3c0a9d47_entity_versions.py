@@ -0,0 +1,38 @@
+"""entity versions
+
+Revision ID: 5b1e3c0a9d47
+Revises: d008a138763c
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e3c0a9d47'
+down_revision = 'd008a138763c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+    entity_versions = op.create_table(
+        'entity_versions',
+        sa.Column('entity', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('entity')
+    )
+    op.bulk_insert(
+        entity_versions,
+        [
+            {"entity": table_name, "version": 0}
+            for table_name in existing_tables
+            if table_name != "alembic_version"
+        ]
+    )
+
+
+def downgrade():
+    op.drop_table('entity_versions')
@@ -0,0 +1,52 @@
+"""search index
+
+Revision ID: 7c2f4d8e1a60
+Revises: 5b1e3c0a9d47
+Create Date: 2026-10-18 09:31:07.562310
+
+The index starts empty. Run "avdata reindex" after upgrading to index the
+records already in the database.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f4d8e1a60'
+down_revision = '5b1e3c0a9d47'
+branch_labels = None
+depends_on = None
+
+
+def _has_fts5(bind):
+    if bind.dialect.name != "sqlite":
+        return False
+    options = {row[0] for row in bind.execute("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+
+def upgrade():
+    op.create_table(
+        'search_tokens',
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.Column('weight', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'entity_id', 'token')
+    )
+    op.create_index(op.f('ix_search_tokens_token'), 'search_tokens',
+                    ['token'], unique=False)
+    if _has_fts5(op.get_bind()):
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, entity_id UNINDEXED, content, "
+            "tokenize = 'unicode61')"
+        )
+
+
+def downgrade():
+    if _has_fts5(op.get_bind()):
+        op.execute("DROP TABLE IF EXISTS search_index")
+    op.drop_index(op.f('ix_search_tokens_token'), table_name='search_tokens')
+    op.drop_table('search_tokens')
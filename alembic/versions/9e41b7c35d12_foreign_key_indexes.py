@@ -0,0 +1,51 @@
+"""foreign key indexes
+
+Revision ID: 9e41b7c35d12
+Revises: 7c2f4d8e1a60
+Create Date: 2026-10-18 10:02:55.193846
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e41b7c35d12'
+down_revision = '7c2f4d8e1a60'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('formats', 'object_id'),
+    ('formats', 'format_type_id'),
+    ('instantiation_files', 'item_id'),
+    ('file_notes', 'file_id'),
+    ('file_annotations', 'file_id'),
+    ('tyko_object', 'project_id'),
+    ('project_has_notes', 'project_id'),
+    ('project_has_notes', 'notes_id'),
+    ('object_has_notes', 'object_id'),
+    ('object_has_notes', 'notes_id'),
+    ('item_has_notes', 'item_id'),
+    ('item_has_notes', 'notes_id'),
+]
+
+# TEXT columns, of which MySQL can only index a prefix
+TEXT_INDEXES = [
+    ('tyko_object', 'barcode'),
+    ('project', 'project_code'),
+]
+
+
+def upgrade():
+    for table_name, column_name in INDEXES:
+        op.create_index(op.f(f'ix_{table_name}_{column_name}'), table_name,
+                        [column_name], unique=False)
+    for table_name, column_name in TEXT_INDEXES:
+        op.create_index(op.f(f'ix_{table_name}_{column_name}'), table_name,
+                        [column_name], unique=False, mysql_length=64)
+
+
+def downgrade():
+    for table_name, column_name in reversed(INDEXES + TEXT_INDEXES):
+        op.drop_index(op.f(f'ix_{table_name}_{column_name}'),
+                      table_name=table_name)
@@ -0,0 +1,192 @@
+"""Latency of the object details and item files requests on a large catalogue.
+
+Fills a SQLite database with a catalogue of --objects objects, each with
+--items-per-object items, one file per item and one note per object, which
+is 100k items and files with the defaults. The requests are then timed
+without the indexes on the foreign keys and lookup columns, which is what
+the schema had before they were added, and again with them.
+
+Usage:
+    python -m benchmarks.bench_foreign_key_indexes [--objects N]
+        [--items-per-object N] [--requests N]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+import tyko
+import tyko.database
+from tyko.schema import formats
+from tyko.schema.avtables import AVTables
+from tyko.schema.instantiation import InstantiationFile
+from tyko.schema.notes import Note
+from tyko.schema.objects import CollectionObject, object_has_notes_table
+from tyko.schema.projects import Project
+
+INSERT_BATCH_SIZE = 10000
+
+# Indexes added to the schema, dropped for the "before" timings
+INDEX_NAMES = {
+    "ix_formats_object_id",
+    "ix_formats_format_type_id",
+    "ix_instantiation_files_item_id",
+    "ix_file_notes_file_id",
+    "ix_file_annotations_file_id",
+    "ix_tyko_object_project_id",
+    "ix_tyko_object_barcode",
+    "ix_project_project_code",
+    "ix_project_has_notes_project_id",
+    "ix_project_has_notes_notes_id",
+    "ix_object_has_notes_object_id",
+    "ix_object_has_notes_notes_id",
+    "ix_item_has_notes_item_id",
+    "ix_item_has_notes_notes_id",
+}
+
+
+def _insert(connection, table, rows: List[dict]) -> None:
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        connection.execute(table.insert(),
+                           rows[start:start + INSERT_BATCH_SIZE])
+
+
+def populate(engine, number_of_objects: int, items_per_object: int) -> None:
+    number_of_items = number_of_objects * items_per_object
+    with engine.begin() as connection:
+        _insert(connection, Project.__table__, [
+            {"project_id": project_id, "title": f"project {project_id}",
+             "project_code": f"P{project_id:05d}"}
+            for project_id in range(1, number_of_objects // 100 + 2)
+        ])
+        _insert(connection, CollectionObject.__table__, [
+            {"object_id": object_id, "name": f"object {object_id}",
+             "barcode": f"{object_id:010d}",
+             "project_id": object_id // 100 + 1}
+            for object_id in range(1, number_of_objects + 1)
+        ])
+        _insert(connection, formats.AVFormat.__table__, [
+            {"item_id": item_id, "name": f"item {item_id}",
+             "type": "items", "format_type_id": 1,
+             "object_id": (item_id - 1) // items_per_object + 1}
+            for item_id in range(1, number_of_items + 1)
+        ])
+        _insert(connection, formats.CollectionItem.__table__, [
+            {"table_id": item_id}
+            for item_id in range(1, number_of_items + 1)
+        ])
+        _insert(connection, InstantiationFile.__table__, [
+            {"file_id": item_id, "file_name": f"file_{item_id}.wav",
+             "item_id": item_id}
+            for item_id in range(1, number_of_items + 1)
+        ])
+        _insert(connection, Note.__table__, [
+            {"note_id": object_id, "text": f"note {object_id}",
+             "note_type_id": 1}
+            for object_id in range(1, number_of_objects + 1)
+        ])
+        _insert(connection, object_has_notes_table, [
+            {"notes_id": object_id, "object_id": object_id}
+            for object_id in range(1, number_of_objects + 1)
+        ])
+
+
+def _indexes():
+    return [index for table in AVTables.metadata.sorted_tables
+            for index in table.indexes if index.name in INDEX_NAMES]
+
+
+def drop_indexes(engine) -> None:
+    for index in _indexes():
+        index.drop(bind=engine)
+    engine.execute("ANALYZE")
+
+
+def create_indexes(engine) -> None:
+    for index in _indexes():
+        index.create(bind=engine)
+    engine.execute("ANALYZE")
+
+
+def time_requests(request: Callable[[int], None],
+                  ids: List[int]) -> List[float]:
+    request(ids[0])
+    timings = []
+    for entity_id in ids:
+        start = time.perf_counter()
+        request(entity_id)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    print(f"{name:<32} "
+          f"mean {statistics.mean(timings) * 1000:9.3f} ms  "
+          f"median {statistics.median(timings) * 1000:9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=20000)
+    parser.add_argument("--items-per-object", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = Flask(__name__, template_folder="../tyko/templates")
+        app.config["SQLALCHEMY_DATABASE_URI"] = \
+            "sqlite:///" + os.path.join(temp_dir, "catalogue.db")
+        database = SQLAlchemy(app)
+        tyko.create_app(app, verify_db=False)
+        tyko.database.init_database(database.engine)
+        app.config["TESTING"] = True
+        server = app.test_client()
+
+        start = time.perf_counter()
+        populate(database.engine, args.objects, args.items_per_object)
+        print(f"{args.objects} objects and "
+              f"{args.objects * args.items_per_object} items and files "
+              f"inserted in {time.perf_counter() - start:.1f}s")
+
+        object_ids = random.Random(0).sample(range(1, args.objects + 1),
+                                             args.requests)
+
+        def object_details(object_id: int) -> None:
+            response = server.get(f"/api/object/{object_id}")
+            assert response.status_code == 200, response.status_code
+
+        def item_files(object_id: int) -> None:
+            item_id = (object_id - 1) * args.items_per_object + 1
+            project_id = object_id // 100 + 1
+            response = server.get(
+                f"/api/project/{project_id}/object/{object_id}"
+                f"/item/{item_id}/files")
+            assert response.status_code == 200, response.status_code
+
+        drop_indexes(database.engine)
+        before = {
+            "object details": time_requests(object_details, object_ids),
+            "item files": time_requests(item_files, object_ids),
+        }
+        create_indexes(database.engine)
+        after = {
+            "object details": time_requests(object_details, object_ids),
+            "item files": time_requests(item_files, object_ids),
+        }
+        for name in before:
+            report(f"{name} without indexes", before[name])
+            report(f"{name} with indexes", after[name])
+            speedup = \
+                statistics.mean(before[name]) / statistics.mean(after[name])
+            print(f"speedup: {speedup:.1f}x")
+        database.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Per-request latency of the single object PBCore export.
+
+Compares requests for /api/object/<id>-pbcore.xml rendered with a template
+environment created for every request, which is what the export did before
+the templates were cached, against the module level environment that
+compiles each template once per process.
+
+Usage:
+    python -m benchmarks.bench_pbcore_render [--requests N] [--items N]
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Callable, List
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+import tyko
+import tyko.database
+from tyko.pbcore import pbcore
+
+
+def create_server(number_of_items: int):
+    app = Flask(__name__, template_folder="../tyko/templates")
+    database = SQLAlchemy(app)
+    tyko.create_app(app, verify_db=False)
+    tyko.database.init_database(database.engine)
+    app.config["TESTING"] = True
+    server = app.test_client()
+
+    project_id = server.post(
+        "/api/project/",
+        data=json.dumps({"title": "benchmark project"}),
+        content_type="application/json"
+    ).get_json()["id"]
+
+    object_id = server.post(
+        f"/api/project/{project_id}/object",
+        data=json.dumps({"name": "benchmark object"}),
+        content_type="application/json"
+    ).get_json()["object"]["object_id"]
+
+    for item_number in range(number_of_items):
+        server.post(
+            f"/api/project/{project_id}/object/{object_id}/item",
+            data=json.dumps({
+                "name": f"item {item_number}",
+                "format_id": 1,
+            }),
+            content_type="application/json"
+        )
+    return server, object_id
+
+
+def time_requests(request: Callable[[], None],
+                  number_of_requests: int) -> List[float]:
+    request()
+    timings = []
+    for _ in range(number_of_requests):
+        start = time.perf_counter()
+        request()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    print(f"{name:<32} "
+          f"mean {statistics.mean(timings) * 1000:8.3f} ms  "
+          f"median {statistics.median(timings) * 1000:8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--items", type=int, default=5)
+    args = parser.parse_args()
+
+    server, object_id = create_server(args.items)
+    route = f"/api/object/{object_id}-pbcore.xml"
+
+    def export():
+        response = server.get(route)
+        assert response.status_code == 200, response.status_code
+
+    cached_environment = pbcore.ENVIRONMENT
+    try:
+        pbcore.ENVIRONMENT = _UncachedEnvironment()
+        before = time_requests(export, args.requests)
+    finally:
+        pbcore.ENVIRONMENT = cached_environment
+    after = time_requests(export, args.requests)
+
+    report("template compiled per request", before)
+    report("template compiled once", after)
+    print(f"speedup: {statistics.mean(before) / statistics.mean(after):.2f}x")
+
+
+class _UncachedEnvironment:
+    """Hands out templates from a new environment every time."""
+
+    @staticmethod
+    def get_template(name: str):
+        return pbcore.create_environment().get_template(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Synthetic catalogue generator for the benchmarks.
+
+Fills a database with projects, objects and a mix of every format of item,
+each with files, notes and file annotations, so that the benchmarks run
+against data shaped like a real catalogue. The content is made up but
+deterministic for a given seed, so two runs with the same arguments time
+the same work.
+
+Records are added through a session of the data provider, so the search
+index and entity versions are kept up to date as they would be in
+production.
+
+Usage:
+    python -m benchmarks.catalogue DATABASE_URL [--projects N]
+        [--objects-per-project N] [--items-per-object N]
+"""
+import argparse
+import datetime
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+import sqlalchemy
+
+import tyko.database
+from tyko import data_provider, sessions
+from tyko.schema import formats
+from tyko.schema.collection import Collection
+from tyko.schema.instantiation import FileAnnotation, FileAnnotationType, \
+    FileNotes, InstantiationFile
+from tyko.schema.notes import Note
+from tyko.schema.objects import CollectionObject
+from tyko.schema.projects import Project, ProjectStatus
+
+WORDS = [
+    "interview", "lecture", "concert", "rehearsal", "oral", "history",
+    "field", "recording", "radio", "broadcast", "campus", "symphony",
+    "choir", "band", "debate", "speech", "archive", "reel", "session",
+    "festival", "seminar", "dance", "theatre", "poetry", "reading",
+]
+
+CASSETTE_TYPES = ["compact cassette", "DAT", "ADAT", "Other"]
+TAPE_TYPES = ["I", "II", "IV"]
+TAPE_THICKNESSES = [("0.5", "mm"), ("1.0", "mm"), ("1.5", "mm")]
+ANNOTATION_TYPES = ["Audio Quality", "Speed", "Noise"]
+COLLECTIONS = ["University Archives", "Music Library", "Film Archive"]
+
+
+@dataclass
+class CatalogueSize:
+    projects: int = 5
+    objects_per_project: int = 40
+    items_per_object: int = 5
+    files_per_item: int = 2
+    notes_per_record: int = 1
+    annotations_per_file: int = 1
+
+    @property
+    def objects(self) -> int:
+        return self.projects * self.objects_per_project
+
+    @property
+    def items(self) -> int:
+        return self.objects * self.items_per_object
+
+    @property
+    def files(self) -> int:
+        return self.items * self.files_per_item
+
+
+@dataclass
+class Catalogue:
+    """Ids of the generated records, to pick the records to benchmark."""
+
+    size: CatalogueSize
+    project_ids: List[int] = field(default_factory=list)
+    object_ids: List[int] = field(default_factory=list)
+    item_ids: List[int] = field(default_factory=list)
+    file_ids: List[int] = field(default_factory=list)
+    # project, object, item and file ids of the files
+    file_paths: List[tuple] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+class _Generator:
+    def __init__(self, session, size: CatalogueSize, seed: int) -> None:
+        self.session = session
+        self.size = size
+        self.random = random.Random(seed)
+        self.statuses = session.query(ProjectStatus).all()
+        self.cassette_types = self._enumeration(
+            formats.CassetteType, [{"name": name}
+                                   for name in CASSETTE_TYPES])
+        self.tape_types = self._enumeration(
+            formats.CassetteTapeType, [{"name": name}
+                                       for name in TAPE_TYPES])
+        self.tape_thicknesses = self._enumeration(
+            formats.CassetteTapeThickness,
+            [{"value": value, "unit": unit}
+             for value, unit in TAPE_THICKNESSES])
+        self.annotation_types = self._enumeration(
+            FileAnnotationType, [{"name": name}
+                                 for name in ANNOTATION_TYPES])
+        self.collections = self._enumeration(
+            Collection, [{"collection_name": name, "department": "Archives"}
+                         for name in COLLECTIONS])
+        session.commit()
+
+    def _enumeration(self, mapped_class, values) -> list:
+        entries = self.session.query(mapped_class).all()
+        if not entries:
+            entries = [mapped_class(**value) for value in values]
+            self.session.add_all(entries)
+        return entries
+
+    def words(self, count: int) -> str:
+        return " ".join(self.random.choice(WORDS) for _ in range(count))
+
+    def date(self) -> datetime.date:
+        return datetime.date(1950, 1, 1) + \
+            datetime.timedelta(days=self.random.randrange(25000))
+
+    def notes(self) -> List[Note]:
+        return [Note(text=self.words(12),
+                     note_type_id=self.random.randint(1, 4))
+                for _ in range(self.size.notes_per_record)]
+
+    def project(self, number: int) -> Project:
+        project = Project(title=f"{self.words(3)} project {number}",
+                          project_code=f"PRJ-{number:05d}",
+                          current_location=self.words(2),
+                          status=self.random.choice(self.statuses))
+        project.notes = self.notes()
+        return project
+
+    def collection_object(self, number: int) -> CollectionObject:
+        collection_object = CollectionObject(
+            name=f"{self.words(2)} {number}",
+            barcode=f"{self.random.randrange(10 ** 9):010d}",
+            originals_rec_date=self.date(),
+            collection=self.random.choice(self.collections))
+        collection_object.notes = self.notes()
+        return collection_object
+
+    def item(self, number: int, sequence: int) -> formats.AVFormat:
+        format_name = self.random.choice(
+            ["audio cassette", "open reel", "grooved disc", "film",
+             "audio video"])
+        format_id, format_class = formats.format_types[format_name]
+        item = format_class(name=f"{self.words(2)} {number}",
+                            obj_sequence=sequence,
+                            format_type_id=format_id)
+        if format_class is formats.AudioCassette:
+            item.cassette_type = self.random.choice(self.cassette_types)
+            item.tape_type = self.random.choice(self.tape_types)
+            item.tape_thickness = self.random.choice(self.tape_thicknesses)
+            item.inspection_date = self.date()
+            item.recording_date = self.date()
+        elif format_class is formats.OpenReel:
+            item.date_recorded = self.date()
+            item.track_count = str(self.random.choice([1, 2, 4]))
+            item.reel_diam = self.random.choice([5, 7, 10])
+            item.tape_brand = self.random.choice(["Scotch", "Ampex", "BASF"])
+            item.base = self.random.choice(["acetate", "polyester"])
+            item.generation = self.random.choice(["master", "copy"])
+        elif format_class is formats.GroovedDisc:
+            item.date_recorded = self.random.randint(1900, 1990)
+            item.side = self.random.choice(["A", "B"])
+            item.diameter = self.random.choice([7, 10, 12])
+            item.disc_material = self.random.choice(["shellac", "vinyl"])
+            item.playback_speed = self.random.choice(["33", "45", "78"])
+        elif format_class is formats.Film:
+            item.date_of_film = self.date()
+            item.can_label = self.words(3)
+            item.length = self.random.randrange(100, 2000)
+            item.format_gauge = self.random.choice([8, 16, 35])
+            item.color = self.random.choice(["color", "black and white"])
+        elif format_class is formats.AudioVideo:
+            item.av_date_recorded = self.date()
+            item.side = self.random.choice(["A", "B"])
+            item.format_subtype = self.random.choice(["VHS", "U-matic"])
+        item.notes = self.notes()
+        item.files = [self.instantiation_file(number, file_number)
+                      for file_number in range(self.size.files_per_item)]
+        return item
+
+    def instantiation_file(self, item_number: int,
+                           file_number: int) -> InstantiationFile:
+        instantiation_file = InstantiationFile(
+            file_name=f"item_{item_number:07d}_{file_number:02d}.wav",
+            generation=self.random.choice(["Preservation", "Access",
+                                           "Mezzanine"]),
+            filesize=self.random.randrange(10 ** 6, 10 ** 9),
+            filesize_unit="B")
+        instantiation_file.notes = [
+            FileNotes(message=self.words(8))
+            for _ in range(self.size.notes_per_record)]
+        instantiation_file.annotations = [
+            FileAnnotation(
+                annotation_type=self.random.choice(self.annotation_types),
+                annotation_content=self.words(4))
+            for _ in range(self.size.annotations_per_file)]
+        return instantiation_file
+
+
+def generate(provider: data_provider.DataProvider,
+             size: CatalogueSize = CatalogueSize(),
+             seed: int = 0) -> Catalogue:
+    """Add a synthetic catalogue to the database of a data provider.
+
+    One transaction is committed per project so the whole catalogue is
+    never held in memory.
+    """
+    catalogue = Catalogue(size=size)
+    start = time.perf_counter()
+    session = sessions.unscoped(provider.db_session_maker)()
+    try:
+        generator = _Generator(session, size, seed)
+        item_number = 0
+        for project_number in range(size.projects):
+            project = generator.project(project_number)
+            for object_number in range(size.objects_per_project):
+                collection_object = generator.collection_object(
+                    project_number * size.objects_per_project +
+                    object_number)
+                items = []
+                for sequence in range(1, size.items_per_object + 1):
+                    items.append(generator.item(item_number, sequence))
+                    item_number += 1
+                for item in items:
+                    item.object = collection_object
+                project.objects.append(collection_object)
+            session.add(project)
+            session.commit()
+            _record_ids(catalogue, project)
+            session.expunge_all()
+    finally:
+        session.close()
+    catalogue.seconds = time.perf_counter() - start
+    return catalogue
+
+
+def _record_ids(catalogue: Catalogue, project: Project) -> None:
+    catalogue.project_ids.append(project.id)
+    for collection_object in project.objects:
+        catalogue.object_ids.append(collection_object.id)
+        for item in collection_object.all_items():
+            catalogue.item_ids.append(item.table_id)
+            for instantiation_file in item.files:
+                catalogue.file_ids.append(instantiation_file.file_id)
+                catalogue.file_paths.append(
+                    (project.id, collection_object.id, item.table_id,
+                     instantiation_file.file_id))
+
+
+def read(engine) -> Catalogue:
+    """Read the ids of a catalogue already in a database.
+
+    Only the files that are in an item of an object of a project are read,
+    as they are the records that can be reached from every page.
+    """
+    catalogue = Catalogue(size=CatalogueSize())
+    session = sqlalchemy.orm.Session(bind=engine)
+    try:
+        catalogue.file_paths = [
+            tuple(row) for row in session.query(
+                CollectionObject.project_id, CollectionObject.id,
+                formats.AVFormat.table_id, InstantiationFile.file_id)
+            .join(formats.AVFormat,
+                  formats.AVFormat.object_id == CollectionObject.id)
+            .join(InstantiationFile,
+                  InstantiationFile.item_id == formats.AVFormat.table_id)
+            .filter(CollectionObject.project_id.isnot(None))
+            .order_by(InstantiationFile.file_id)
+        ]
+    finally:
+        session.close()
+    for level, ids in enumerate([catalogue.project_ids, catalogue.object_ids,
+                                 catalogue.item_ids, catalogue.file_ids]):
+        ids.extend(sorted({path[level] for path in catalogue.file_paths}))
+    catalogue.size = CatalogueSize(
+        projects=len(catalogue.project_ids),
+        objects_per_project=len(catalogue.object_ids) //
+        max(len(catalogue.project_ids), 1),
+        items_per_object=len(catalogue.item_ids) //
+        max(len(catalogue.object_ids), 1),
+        files_per_item=len(catalogue.file_ids) //
+        max(len(catalogue.item_ids), 1))
+    return catalogue
+
+
+def create_provider(database_url: str) -> data_provider.DataProvider:
+    """Create a new database and a data provider for it."""
+    engine = sqlalchemy.create_engine(database_url)
+    tyko.database.init_database(engine)
+    return data_provider.DataProvider(engine)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database_url")
+    parser.add_argument("--projects", type=int,
+                        default=CatalogueSize.projects)
+    parser.add_argument("--objects-per-project", type=int,
+                        default=CatalogueSize.objects_per_project)
+    parser.add_argument("--items-per-object", type=int,
+                        default=CatalogueSize.items_per_object)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    size = CatalogueSize(projects=args.projects,
+                         objects_per_project=args.objects_per_project,
+                         items_per_object=args.items_per_object)
+    catalogue = generate(create_provider(args.database_url), size,
+                         seed=args.seed)
+    print(f"Generated {size.projects} projects, {size.objects} objects, "
+          f"{size.items} items and {size.files} files in "
+          f"{catalogue.seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""Load test replaying the traffic of the web front end.
+
+A number of concurrent clients browse the catalogue the way a user of the
+front end does. Each visit loads a page and then the API requests the page
+makes from the browser when it loads:
+
+projects
+    /project, then /api/project for its table
+project
+    /project/<id>, which is rendered on the server
+object
+    /project/<id>/object/<id>, then the items table from
+    /api/project/<id>/object/<id> and the three cassette enumerations
+    used by the new item form
+item
+    /project/<id>/object/<id>/item/<id>, then /api/item/<id> for the
+    files table
+file
+    /project/<id>/object/<id>/item/<id>/files/<id>, then /api for the
+    route templates used by the annotation editor
+objects
+    /object, then /api/object for its table
+pbcore
+    /api/object/<id>-pbcore.xml, the download link of the object page
+
+Without --url, a synthetic catalogue (see benchmarks.catalogue) is
+generated in a SQLite file and served by a threaded server in this
+process. With --url, the requests go to a server that is already running,
+such as gunicorn with a given number of workers, and --database-url is
+read to find the records to visit.
+
+Throughput, the p50, p95 and p99 latency and the error rate of every
+endpoint are printed and can be written as JSON with --output, together
+with the connection pool metrics of the server.
+
+Usage:
+    python -m benchmarks.load_testing [--clients N] [--duration SECONDS]
+        [--mix object=4,item=4,...] [--projects N] [--objects-per-project N]
+        [--url URL --database-url DATABASE_URL] [--output results.json]
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import sqlalchemy
+from werkzeug.serving import make_server
+
+from . import catalogue as synthetic
+from .suite import create_app
+
+DEFAULT_MIX = {
+    "projects": 1,
+    "project": 2,
+    "object": 4,
+    "item": 4,
+    "file": 2,
+    "objects": 1,
+    "pbcore": 0.5,
+}
+
+ENUMERATIONS = [
+    "/api/formats/cassette_tape/cassette_tape_format_types",
+    "/api/formats/cassette_tape/cassette_tape_tape_types",
+    "/api/formats/cassette_tape/cassette_tape_tape_thickness",
+]
+
+
+class Request(NamedTuple):
+    # Route of the request, which its latency is reported under
+    endpoint: str
+    path: str
+
+
+# Ids of a project, an object, an item and a file of the object
+Path = Tuple[int, int, int, int]
+
+
+def _projects(path: Path) -> List[Request]:
+    return [Request("/project", "/project"),
+            Request("/api/project", "/api/project")]
+
+
+def _project(path: Path) -> List[Request]:
+    return [Request("/project/<id>", f"/project/{path[0]}")]
+
+
+def _object(path: Path) -> List[Request]:
+    page = "/project/{}/object/{}".format(*path)
+    return [Request("/project/<id>/object/<id>", page),
+            Request("/api/project/<id>/object/<id>", f"/api{page}"),
+            *[Request(url, url) for url in ENUMERATIONS]]
+
+
+def _item(path: Path) -> List[Request]:
+    return [Request("/project/<id>/object/<id>/item/<id>",
+                    "/project/{}/object/{}/item/{}".format(*path)),
+            Request("/api/item/<id>", f"/api/item/{path[2]}")]
+
+
+def _file(path: Path) -> List[Request]:
+    return [Request("/project/<id>/object/<id>/item/<id>/files/<id>",
+                    "/project/{}/object/{}/item/{}/files/{}".format(*path)),
+            Request("/api", "/api")]
+
+
+def _objects(path: Path) -> List[Request]:
+    return [Request("/object", "/object"),
+            Request("/api/object", "/api/object")]
+
+
+def _pbcore(path: Path) -> List[Request]:
+    return [Request("/api/object/<id>-pbcore.xml",
+                    f"/api/object/{path[1]}-pbcore.xml")]
+
+
+VISITS: Dict[str, Callable[[Path], List[Request]]] = {
+    "projects": _projects,
+    "project": _project,
+    "object": _object,
+    "item": _item,
+    "file": _file,
+    "objects": _objects,
+    "pbcore": _pbcore,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = dict(DEFAULT_MIX)
+    for entry in filter(None, value.split(",")):
+        name, _, weight = entry.partition("=")
+        if name not in VISITS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown visit {name}. Expected one of {', '.join(VISITS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(
+                f"Invalid weight for {name}: {weight}") from error
+    return mix
+
+
+class Recorder:
+    """Latencies and errors of the requests made, by endpoint."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = collections.defaultdict(list)
+        self.errors: Dict[str, int] = collections.defaultdict(int)
+        self.statuses: Dict[str, collections.Counter] = \
+            collections.defaultdict(collections.Counter)
+
+    def record(self, endpoint: str, seconds: float, status: str) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            if not status.startswith(("2", "3")):
+                self.errors[endpoint] += 1
+
+
+def _request(base_url: str, request: Request, timeout: float) -> str:
+    try:
+        with urllib.request.urlopen(base_url + request.path,
+                                    timeout=timeout) as response:
+            response.read()
+            return str(response.status)
+    except urllib.error.HTTPError as error:
+        return str(error.code)
+    except OSError as error:
+        return type(error).__name__
+
+
+def run_client(base_url: str, paths: List[Path], mix: Dict[str, float],
+               recorder: Optional[Recorder], deadline: float, seed: int,
+               think_time: float = 0.0, timeout: float = 30.0) -> None:
+    """Make visits until the deadline, recording them if there's a recorder.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.perf_counter() < deadline:
+        visit = VISITS[rng.choices(names, weights)[0]]
+        for request in visit(rng.choice(paths)):
+            start = time.perf_counter()
+            status = _request(base_url, request, timeout)
+            if recorder is not None:
+                recorder.record(request.endpoint,
+                                time.perf_counter() - start, status)
+        if think_time:
+            time.sleep(rng.expovariate(1 / think_time))
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1,
+                int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, seconds: float) -> Dict[str, dict]:
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / seconds,
+            "p50_ms": _percentile(latencies, 50) * 1000,
+            "p95_ms": _percentile(latencies, 95) * 1000,
+            "p99_ms": _percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "errors": recorder.errors[endpoint],
+            "error_rate": recorder.errors[endpoint] / len(latencies),
+            "statuses": dict(recorder.statuses[endpoint]),
+        }
+    return endpoints
+
+
+def run_load(base_url: str, paths: List[Path], mix: Dict[str, float],
+             clients: int, duration: float, warmup: float = 0.0,
+             think_time: float = 0.0, seed: int = 0) -> Dict[str, object]:
+    if not paths:
+        raise ValueError("No records to visit")
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("Every visit has a weight of 0")
+
+    if warmup:
+        deadline = time.perf_counter() + warmup
+        with ThreadPoolExecutor(clients) as executor:
+            for client in range(clients):
+                executor.submit(run_client, base_url, paths, mix, None,
+                                deadline, -1 - client - seed, think_time)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(clients) as executor:
+        futures = [
+            executor.submit(run_client, base_url, paths, mix, recorder,
+                            deadline, seed + client, think_time)
+            for client in range(clients)
+        ]
+        for future in futures:
+            future.result()
+    seconds = time.perf_counter() - start
+    if not recorder.latencies:
+        raise RuntimeError("No request completed in the time given")
+
+    endpoints = summarize(recorder, seconds)
+    total_requests = sum(result["requests"] for result in endpoints.values())
+    total_errors = sum(result["errors"] for result in endpoints.values())
+    all_latencies = sorted(latency
+                           for latencies in recorder.latencies.values()
+                           for latency in latencies)
+    return {
+        "clients": clients,
+        "seconds": seconds,
+        "mix": mix,
+        "total": {
+            "requests": total_requests,
+            "throughput_rps": total_requests / seconds,
+            "p50_ms": _percentile(all_latencies, 50) * 1000,
+            "p95_ms": _percentile(all_latencies, 95) * 1000,
+            "p99_ms": _percentile(all_latencies, 99) * 1000,
+            "errors": total_errors,
+            "error_rate": total_errors / max(total_requests, 1),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def pool_metrics(base_url: str) -> Optional[dict]:
+    try:
+        with urllib.request.urlopen(f"{base_url}/api/metrics/pool",
+                                    timeout=10) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+
+def report(results: Dict[str, object]) -> None:
+    rows = list(results["endpoints"].items()) + [("total", results["total"])]
+    width = max(len(endpoint) for endpoint, _ in rows)
+    print(f"{'endpoint':<{width}} {'requests':>8} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}",
+          file=sys.stderr)
+    for endpoint, result in rows:
+        print(f"{endpoint:<{width}} {result['requests']:>8} "
+              f"{result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{result['error_rate']:>7.1%}", file=sys.stderr)
+
+
+def _serve(app) -> Tuple[str, Callable[[], None]]:
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        server.shutdown()
+        thread.join()
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30,
+                        help="seconds to record the requests for")
+    parser.add_argument("--warmup", type=float, default=2,
+                        help="seconds to make requests for before "
+                             "recording them")
+    parser.add_argument("--think-time", type=float, default=0,
+                        help="mean seconds a client waits between visits")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weights of the visits, such as "
+                             "object=4,pbcore=0. Visits not given keep "
+                             "their default weight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url",
+                        help="base url of a running server to load. "
+                             "Requires --database-url")
+    parser.add_argument("--database-url",
+                        help="database of the server given by --url")
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--objects-per-project", type=int, default=40)
+    parser.add_argument("--items-per-object", type=int, default=5)
+    parser.add_argument("--output",
+                        help="file to write the JSON results to")
+    args = parser.parse_args()
+    if args.url and not args.database_url:
+        parser.error("--url requires --database-url")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.url:
+            engine = sqlalchemy.create_engine(args.database_url)
+            catalogue = synthetic.read(engine)
+            engine.dispose()
+            base_url = args.url.rstrip("/")
+            stop = None
+        else:
+            database_path = os.path.join(temp_dir, "catalogue.db")
+            provider = synthetic.create_provider(
+                f"sqlite:///{database_path}")
+            catalogue = synthetic.generate(provider, synthetic.CatalogueSize(
+                projects=args.projects,
+                objects_per_project=args.objects_per_project,
+                items_per_object=args.items_per_object), seed=args.seed)
+            base_url, stop = _serve(create_app(database_path))
+
+        print(f"{args.clients} clients on {base_url} for "
+              f"{args.duration:g}s, visiting {len(catalogue.object_ids)} "
+              f"objects", file=sys.stderr)
+        try:
+            results = run_load(base_url, catalogue.file_paths, args.mix,
+                               args.clients, args.duration,
+                               warmup=args.warmup,
+                               think_time=args.think_time, seed=args.seed)
+            results["pool"] = pool_metrics(base_url)
+        finally:
+            if stop is not None:
+                stop()
+
+    report(results)
+    if results["pool"] is not None:
+        print(f"pool: {results['pool']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""Benchmark suite for the data connectors, serializers and API.
+
+Generates a synthetic catalogue in a SQLite database (see
+benchmarks.catalogue), then times:
+
+connector
+    the hot data connector methods, called directly
+serialize
+    serialize() of records that are already loaded, without the queries
+api
+    list and detail endpoints through the Flask test client
+pbcore
+    the PBCore exports of an object and of a whole project
+
+Every benchmark is called once to warm up and then --repeat times, on a
+different record each time. The results are written as JSON with the
+catalogue size and the environment, so runs from different commits can be
+compared with --compare.
+
+Usage:
+    python -m benchmarks.suite [--projects N] [--objects-per-project N]
+        [--items-per-object N] [--repeat N] [--filter TEXT]
+        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import flask
+from flask.testing import FlaskClient
+import sqlalchemy
+
+import tyko
+import tyko.database
+from tyko import data_provider, loader_profiles
+from tyko.schema import formats
+from tyko.schema.objects import CollectionObject
+from tyko.schema.projects import Project
+
+from . import catalogue as synthetic
+
+RESULTS_VERSION = 1
+
+
+class Benchmark(NamedTuple):
+    group: str
+    name: str
+    # Called with the index of the run, to pick the record to work on
+    run: Callable[[int], Any]
+
+
+def create_app(database_path: str) -> flask.Flask:
+    """Create the application with its database in a SQLite file."""
+    settings = os.path.join(os.path.dirname(database_path), "settings.py")
+    with open(settings, "w", encoding="utf-8") as settings_file:
+        settings_file.write(
+            f"SQLALCHEMY_DATABASE_URI = 'sqlite:///{database_path}'\n"
+            f"SQLALCHEMY_TRACK_MODIFICATIONS = False\n")
+    os.environ["TYKO_SETTINGS"] = settings
+    app = flask.Flask(__name__, template_folder="../tyko/templates")
+    tyko.create_app(app, verify_db=False)
+    app.logger.disabled = True
+    return app
+
+
+def _ok(response) -> None:
+    assert response.status_code == 200, \
+        f"{response.request.path}: {response.status_code}"
+
+
+def connector_benchmarks(provider: data_provider.DataProvider,
+                         catalogue: synthetic.Catalogue
+                         ) -> Iterator[Benchmark]:
+    session_maker = provider.db_session_maker
+    projects = data_provider.ProjectDataConnector(session_maker)
+    objects = data_provider.ObjectDataConnector(session_maker)
+    items = data_provider.ItemDataConnector(session_maker)
+    files = data_provider.FilesDataConnector(session_maker)
+
+    def pick(ids: List[int]) -> Callable[[int], int]:
+        return lambda run: ids[run % len(ids)]
+
+    project_id = pick(catalogue.project_ids)
+    object_id = pick(catalogue.object_ids)
+    item_id = pick(catalogue.item_ids)
+    file_id = pick(catalogue.file_ids)
+
+    yield Benchmark("connector", "project.get",
+                    lambda run: projects.get(project_id(run),
+                                             serialize=True))
+    yield Benchmark("connector", "project.get_page",
+                    lambda run: projects.get(serialize=True, limit=20))
+    yield Benchmark("connector", "object.get",
+                    lambda run: objects.get(object_id(run), serialize=True))
+    yield Benchmark("connector", "object.get_page",
+                    lambda run: objects.get(serialize=True, limit=50))
+    yield Benchmark(
+        "connector", "object.get_in_project",
+        lambda run: objects.get_in_project(
+            catalogue.file_paths[run % len(catalogue.file_paths)][0],
+            catalogue.file_paths[run % len(catalogue.file_paths)][1],
+            serialize=True))
+    yield Benchmark("connector", "item.get",
+                    lambda run: items.get(item_id(run), serialize=True))
+    yield Benchmark("connector", "file.get",
+                    lambda run: files.get(file_id(run), serialize=True))
+    yield Benchmark(
+        "connector", "file.get_many",
+        lambda run: files.get_many(
+            catalogue.file_ids[run * 10 % len(catalogue.file_ids):]
+            [:10], serialize=True))
+
+
+def serializer_benchmarks(provider: data_provider.DataProvider,
+                          catalogue: synthetic.Catalogue
+                          ) -> Iterator[Benchmark]:
+    # Loaded once with the same loader profiles as the connectors, so only
+    # the serialization is timed
+    session = provider.db_session_maker.session_factory()
+    project_profile = loader_profiles.get_profile(Project, single=True)
+    object_profile = loader_profiles.get_profile(CollectionObject,
+                                                 single=True)
+    item_profile = loader_profiles.get_profile(formats.AVFormat,
+                                               single=True)
+    loaded_projects = session.query(Project)\
+        .options(*project_profile.options)\
+        .filter(Project.id.in_(catalogue.project_ids[:5])).all()
+    loaded_objects = session.query(CollectionObject)\
+        .options(*object_profile.options)\
+        .filter(CollectionObject.id.in_(catalogue.object_ids[:50])).all()
+    loaded_items = session.query(loader_profiles.ITEMS)\
+        .options(*item_profile.options)\
+        .filter(formats.AVFormat.table_id.in_(catalogue.item_ids[:50]))\
+        .all()
+    # Anything the profiles leave to lazy loading, such as the notes and
+    # annotations of item files, is loaded here rather than in a timed run
+    for item in loaded_items:
+        item.serialize(True)
+
+    yield Benchmark(
+        "serialize", "project",
+        lambda run: loaded_projects[run % len(loaded_projects)].serialize(
+            project_profile.recurse))
+    yield Benchmark(
+        "serialize", "object",
+        lambda run: loaded_objects[run % len(loaded_objects)].serialize(
+            object_profile.recurse))
+    yield Benchmark(
+        "serialize", "item",
+        lambda run: loaded_items[run % len(loaded_items)].serialize(True))
+
+
+def api_benchmarks(server: FlaskClient,
+                   catalogue: synthetic.Catalogue) -> Iterator[Benchmark]:
+    def path(run: int):
+        return catalogue.file_paths[run * 7 % len(catalogue.file_paths)]
+
+    def get(url_for_run: Callable[[int], str]) -> Callable[[int], None]:
+        return lambda run: _ok(server.get(url_for_run(run)))
+
+    yield Benchmark("api", "GET /api/project",
+                    get(lambda run: "/api/project"))
+    yield Benchmark("api", "GET /api/project/<id>",
+                    get(lambda run: f"/api/project/{path(run)[0]}"))
+    yield Benchmark("api", "GET /api/object",
+                    get(lambda run: "/api/object?limit=50"))
+    yield Benchmark("api", "GET /api/object/<id>",
+                    get(lambda run: f"/api/object/{path(run)[1]}"))
+    yield Benchmark(
+        "api", "GET /api/project/<id>/object/<id>",
+        get(lambda run: "/api/project/{}/object/{}".format(*path(run))))
+    yield Benchmark("api", "GET /api/item/<id>",
+                    get(lambda run: f"/api/item/{path(run)[2]}"))
+    yield Benchmark(
+        "api", "GET item files",
+        get(lambda run: "/api/project/{}/object/{}/item/{}/files".format(
+            *path(run))))
+    yield Benchmark(
+        "api", "GET item file",
+        get(lambda run: "/api/project/{}/object/{}/item/{}/files"
+                        "?id={}".format(*path(run))))
+    yield Benchmark(
+        "api", "GET /api/file/<id>/annotations",
+        get(lambda run: f"/api/file/{path(run)[3]}/annotations"))
+    yield Benchmark(
+        "api", "GET /api/search",
+        get(lambda run: "/api/search?q=" +
+            synthetic.WORDS[run % len(synthetic.WORDS)]))
+
+
+def pbcore_benchmarks(server: FlaskClient,
+                      catalogue: synthetic.Catalogue
+                      ) -> Iterator[Benchmark]:
+    object_ids = catalogue.object_ids
+    project_ids = catalogue.project_ids
+    yield Benchmark(
+        "pbcore", "object xml",
+        lambda run: _ok(server.get(
+            f"/api/object/{object_ids[run % len(object_ids)]}-pbcore.xml")))
+    yield Benchmark(
+        "pbcore", "project xml",
+        lambda run: _ok(server.get(
+            "/api/pbcore",
+            query_string={"project_id": project_ids[run % len(project_ids)],
+                          "format": "xml"})))
+
+
+def time_benchmark(benchmark: Benchmark, repeat: int) -> Dict[str, Any]:
+    benchmark.run(0)
+    timings = []
+    for run in range(1, repeat + 1):
+        start = time.perf_counter()
+        benchmark.run(run)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "group": benchmark.group,
+        "name": benchmark.name,
+        "runs": repeat,
+        "mean_ms": statistics.mean(timings),
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1,
+                              int(round(0.95 * (len(timings) - 1))))],
+        "min_ms": timings[0],
+        "max_ms": timings[-1],
+        "stdev_ms": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc)
+        .isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+
+def report(results: List[Dict[str, Any]],
+           baseline: Optional[Dict[str, Any]] = None) -> None:
+    previous = {}
+    if baseline is not None:
+        previous = {(result["group"], result["name"]): result
+                    for result in baseline["results"]}
+    for result in results:
+        line = f"{result['group']:<10} {result['name']:<36} " \
+               f"mean {result['mean_ms']:9.3f} ms  " \
+               f"p95 {result['p95_ms']:9.3f} ms"
+        before = previous.get((result["group"], result["name"]))
+        if before is not None:
+            line += f"  {before['mean_ms'] / result['mean_ms']:6.2f}x"
+        print(line, file=sys.stderr)
+
+
+def run_suite(size: synthetic.CatalogueSize, repeat: int,
+              name_filter: Optional[str] = None,
+              seed: int = 0) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database_path = os.path.join(temp_dir, "catalogue.db")
+        engine = sqlalchemy.create_engine(f"sqlite:///{database_path}")
+        tyko.database.init_database(engine)
+        provider = data_provider.DataProvider(engine)
+        catalogue = synthetic.generate(provider, size, seed=seed)
+        print(f"Generated {size.objects} objects, {size.items} items and "
+              f"{size.files} files in {catalogue.seconds:.1f}s",
+              file=sys.stderr)
+
+        server = create_app(database_path).test_client()
+        benchmarks = [
+            *connector_benchmarks(provider, catalogue),
+            *serializer_benchmarks(provider, catalogue),
+            *api_benchmarks(server, catalogue),
+            *pbcore_benchmarks(server, catalogue),
+        ]
+        results = [
+            time_benchmark(benchmark, repeat) for benchmark in benchmarks
+            if name_filter is None or
+            name_filter in f"{benchmark.group} {benchmark.name}"
+        ]
+        engine.dispose()
+
+    return {
+        "version": RESULTS_VERSION,
+        "environment": environment(),
+        "catalogue": {**dataclasses.asdict(size), "seed": seed,
+                      "generate_seconds": catalogue.seconds},
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--objects-per-project", type=int, default=40)
+    parser.add_argument("--items-per-object", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter",
+                        help="only run the benchmarks whose group and name "
+                             "contain this text")
+    parser.add_argument("--output", default="-",
+                        help="file to write the JSON results to. Defaults "
+                             "to stdout")
+    parser.add_argument("--compare",
+                        help="JSON results of an earlier run to compare "
+                             "with")
+    args = parser.parse_args()
+
+    size = synthetic.CatalogueSize(
+        projects=args.projects,
+        objects_per_project=args.objects_per_project,
+        items_per_object=args.items_per_object)
+    results = run_suite(size, args.repeat, args.filter, seed=args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+    report(results["results"], baseline)
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
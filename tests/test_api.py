@@ -1,5 +1,10 @@
+import csv
+import io
 import json
+import zipfile
 import pytest
+import sqlalchemy
+import tyko.json_response
 from flask import url_for
 
 
@@ -1199,3 +1204,483 @@ def test_api_enum_put_id(endpoint, enum_data, name_key, server_with_enums):
     assert get_resp.status_code == 200, get_resp.status
     get_data = json.loads(get_resp.data)
     assert get_data[name_key] == enum_data[name_key]
+
+
+def test_project_pagination_with_cursor(app):
+    with app.test_client() as server:
+        for i in range(5):
+            assert server.post(
+                "/api/project/",
+                data=json.dumps({"title": f"project {i}"}),
+                content_type='application/json'
+            ).status_code == 200
+
+        titles = []
+        cursor = None
+        pages = 0
+        while True:
+            query = {"limit": 2}
+            if cursor is not None:
+                query["cursor"] = cursor
+            page = json.loads(server.get(url_for("projects", **query)).data)
+            assert page["total"] == 5
+            assert len(page["projects"]) <= 2
+            titles += [project["title"] for project in page["projects"]]
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert pages == 3
+        assert titles == [f"project {i}" for i in range(5)]
+
+
+@pytest.mark.parametrize("route", [
+    "/api/project", "/api/object", "/api/item", "/api/collection", "/api/notes"
+])
+def test_pagination_invalid_cursor(app, route):
+    with app.test_client() as server:
+        resp = server.get(route, query_string={"limit": 2,
+                                               "cursor": "not a cursor"})
+        assert resp.status_code == 400
+
+
+def test_note_pagination_total(app):
+    with app.test_client() as server:
+        for i in range(3):
+            assert server.post(
+                "/api/notes/",
+                data=json.dumps({"note_type_id": "1", "text": f"note {i}"}),
+                content_type='application/json'
+            ).status_code == 200
+
+        page = json.loads(server.get(url_for("notes", limit=1)).data)
+        assert page["total"] == 3
+        assert len(page["notes"]) == 1
+        assert page["next_cursor"] is not None
+
+
+def test_unpaginated_list_is_streamed_in_batches(app, monkeypatch):
+    monkeypatch.setattr(tyko.json_response, "DEFAULT_BATCH_SIZE", 2)
+    with app.test_client() as server:
+        for i in range(5):
+            assert server.post(
+                "/api/notes/",
+                data=json.dumps({"note_type_id": "1", "text": f"note {i}"}),
+                content_type='application/json'
+            ).status_code == 200
+
+        resp = server.get("/api/notes")
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        assert resp.headers["ETag"]
+        streamed = resp.get_json()
+        page = json.loads(server.get(url_for("notes", limit=10)).data)
+        assert streamed["notes"] == page["notes"]
+        assert [note["text"] for note in streamed["notes"]] == \
+            [f"note {i}" for i in range(5)]
+        assert streamed["total"] == 5
+        assert streamed["next_cursor"] is None
+
+
+@pytest.mark.parametrize("route", [
+    "/api/project", "/api/object", "/api/item", "/api/collection",
+    "/api/notes", "/api/format"
+])
+def test_conditional_get_not_modified(app, route):
+    with app.test_client() as server:
+        first = server.get(route)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+
+        second = server.get(route, headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.data == b""
+
+
+def test_conditional_get_modified(app):
+    with app.test_client() as server:
+        etag = server.get("/api/project").headers["ETag"]
+        server.post(
+            "/api/project/",
+            data=json.dumps({"title": "new project"}),
+            content_type='application/json'
+        )
+        resp = server.get("/api/project", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+        assert resp.headers["Cache-Control"] == "private, max-age=0"
+
+
+def test_conditional_get_single_record(app):
+    with app.test_client() as server:
+        project_id = server.post(
+            "/api/project/",
+            data=json.dumps({"title": "my project"}),
+            content_type='application/json'
+        ).get_json()["id"]
+        route = f"/api/project/{project_id}"
+        etag = server.get(route).headers["ETag"]
+        resp = server.get(route, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+
+def test_conditional_get_uses_entity_versions(app):
+    with app.test_client() as server:
+        server.post(
+            "/api/project/",
+            data=json.dumps({"title": "my project"}),
+            content_type='application/json'
+        )
+        etag = server.get("/api/project").headers["ETag"]
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(sqlalchemy.engine.Engine,
+                                "before_cursor_execute",
+                                before_cursor_execute)
+        try:
+            resp = server.get("/api/project",
+                              headers={"If-None-Match": etag})
+        finally:
+            sqlalchemy.event.remove(sqlalchemy.engine.Engine,
+                                    "before_cursor_execute",
+                                    before_cursor_execute)
+        assert resp.status_code == 304
+        assert len(statements) == 1
+        assert "entity_versions" in statements[0]
+
+
+@pytest.fixture()
+def server_with_project_objects(app):
+    with app.test_client() as server:
+        project_id = server.post(
+            "/api/project/",
+            data=json.dumps({"title": "my project"}),
+            content_type='application/json'
+        ).get_json()["id"]
+        for i in range(3):
+            assert server.post(
+                f"/api/project/{project_id}/object",
+                data=json.dumps({"name": f"object {i}", "barcode": str(i)}),
+                content_type='application/json'
+            ).status_code == 200
+        yield server, project_id
+
+
+def test_pbcore_export_xml(server_with_project_objects):
+    server, project_id = server_with_project_objects
+    resp = server.get("/api/pbcore", query_string={"project_id": project_id})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/xml"
+    assert resp.is_streamed
+    document = resp.get_data(as_text=True)
+    assert document.count("<pbcoreDescriptionDocument") == 3
+
+
+def test_pbcore_export_zip(server_with_project_objects):
+    server, project_id = server_with_project_objects
+    resp = server.get("/api/pbcore", query_string={"project_id": project_id,
+                                                   "format": "zip"})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(resp.get_data())) as archive:
+        names = archive.namelist()
+        assert len(names) == 3
+        assert all(name.endswith("-pbcore.xml") for name in names)
+        assert "<pbcoreCollection" in archive.read(names[0]).decode("utf-8")
+
+
+@pytest.mark.parametrize("query_string, status_code", [
+    ({}, 400),
+    ({"project_id": "not a number"}, 400),
+    ({"project_id": 1000}, 404),
+    ({"project_id": 1, "format": "pdf"}, 400),
+])
+def test_pbcore_export_invalid(server_with_project_objects, query_string,
+                               status_code):
+    server, _ = server_with_project_objects
+    resp = server.get("/api/pbcore", query_string=query_string)
+    assert resp.status_code == status_code
+
+
+def test_get_item_files(server_with_object_item_file):
+    server, data = server_with_object_item_file
+    resp = server.get(
+        url_for("item_files",
+                project_id=data['project_id'],
+                object_id=data['object_id'],
+                item_id=data['item_id'])
+    )
+    assert resp.status_code == 200
+    files = resp.get_json()
+    assert files['total'] == 1
+    assert files['files'][0]['id'] == data['file_id']
+    assert files['files'][0]['name'] == "my_dumb_audio.wav"
+    assert files['files'][0]['notes'] == []
+
+
+def test_pool_metrics(app):
+    with app.test_client() as server:
+        server.get("/api/project")
+        resp = server.get("/api/metrics/pool")
+        assert resp.status_code == 200
+        assert resp.get_json()["checkouts"] >= 1
+
+
+def test_metrics(app):
+    with app.test_client() as server:
+        server.get("/api/project")
+        server.get("/api/pbcore", query_string={"project_id": 1000})
+        resp = server.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/plain"
+        metrics = resp.get_data(as_text=True)
+        assert "# TYPE tyko_http_request_duration_seconds histogram" \
+               in metrics
+        assert 'tyko_http_request_duration_seconds_count' \
+               '{endpoint="projects",method="GET"} 1' in metrics
+        assert 'tyko_http_responses_total' \
+               '{endpoint="projects",method="GET",status="200"} 1' in metrics
+        assert 'tyko_http_responses_total' \
+               '{endpoint="pbcore_export",method="GET",status="404"} 1' \
+               in metrics
+        assert 'tyko_sql_statements_per_request_bucket' \
+               '{endpoint="projects",le="0"} 0' in metrics
+        assert "tyko_db_pool_checkouts_total" in metrics
+
+
+def test_notes_filtered_by_note_type(app):
+    with app.test_client() as server:
+        for note_type_id in ["1", "1", "2"]:
+            assert server.post(
+                "/api/notes/",
+                data=json.dumps({"note_type_id": note_type_id,
+                                 "text": "dummy note"}),
+                content_type='application/json'
+            ).status_code == 200
+
+        page = server.get("/api/notes", query_string={
+            "note_type_id": 1, "limit": 1}).get_json()
+        assert page["total"] == 2
+        assert page["notes"][0]["note_type_id"] == 1
+
+        notes = server.get("/api/notes", query_string={
+            "note_type_id": 2}).get_json()
+        assert notes["total"] == 1
+
+        assert server.get("/api/notes", query_string={
+            "note_type_id": "inspection"}).status_code == 400
+
+
+def test_batch_create_objects(server_with_project):
+    server = server_with_project
+    project_id = server.get("/api/project").get_json()["projects"][0][
+        "project_id"]
+    resp = server.post(
+        f"/api/project/{project_id}/objects:batch",
+        data=json.dumps({"objects": [
+            {
+                "name": "first object",
+                "originals_rec_date": "2020-01-15",
+                "items": [
+                    {"name": "first item", "format_id": 2,
+                     "files": [{"file_name": "first.wav"},
+                               {"file_name": "second.wav",
+                                "generation": "mezzanine"}]},
+                    {"name": "second item", "format_id": 3},
+                ]
+            },
+            {"name": "second object"},
+        ]}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 201
+    created = resp.get_json()["objects"]
+    assert len(created) == 2
+    assert len(created[0]["items"]) == 2
+    assert len(created[0]["items"][0]["files"]) == 2
+    assert created[1]["items"] == []
+
+    project = server.get(f"/api/project/{project_id}").get_json()["project"]
+    assert [obj["object_id"] for obj in project["objects"]] == \
+           [obj["object_id"] for obj in created]
+
+    item_id = created[0]["items"][0]["item_id"]
+    item = server.get(f"/api/item/{item_id}").get_json()["item"]
+    assert item["name"] == "first item"
+    assert sorted(f["name"] for f in item["files"]) == \
+           ["first.wav", "second.wav"]
+
+    object_id = created[1]["object_id"]
+    resp = server.post(
+        f"/api/project/{project_id}/object/{object_id}/items:batch",
+        data=json.dumps({"items": [{"name": "added item", "format_id": 3}]}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 201
+    item_id = resp.get_json()["items"][0]["item_id"]
+
+    resp = server.post(
+        f"/api/project/{project_id}/object/{object_id}/item/{item_id}"
+        f"/files:batch",
+        data=json.dumps({"files": [{"file_name": "added.mov"}]}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 201
+    file_id = resp.get_json()["files"][0]["id"]
+    item = server.get(f"/api/item/{item_id}").get_json()["item"]
+    assert [f["id"] for f in item["files"]] == [file_id]
+
+
+def test_batch_create_rejects_whole_batch(server_with_project):
+    server = server_with_project
+    project_id = server.get("/api/project").get_json()["projects"][0][
+        "project_id"]
+    resp = server.post(
+        f"/api/project/{project_id}/objects:batch",
+        data=json.dumps({"objects": [
+            {"name": "valid object"},
+            {"name": "", "originals_rec_date": "15/01/2020"},
+            {"name": "bad item", "items": [{"name": "item"}]},
+        ]}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 400
+    message = resp.get_data(as_text=True)
+    assert "objects[1].name is required" in message
+    assert "objects[1].originals_rec_date" in message
+    assert "objects[2].items[0].format_id is required" in message
+
+    resp = server.post(
+        f"/api/project/{project_id}/objects:batch",
+        data=json.dumps({"objects": [
+            {"name": "valid object", "collection_id": 1000},
+        ]}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 400
+
+    project = server.get(f"/api/project/{project_id}").get_json()["project"]
+    assert project["objects"] == []
+
+    assert server.post(
+        "/api/project/1000/objects:batch",
+        data=json.dumps({"objects": [{"name": "valid object"}]}),
+        content_type='application/json'
+    ).status_code == 404
+
+
+def test_export_catalogue(server_with_object_item_file):
+    server, data = server_with_object_item_file
+    resp = server.get("/api/export")
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    records = [json.loads(line)
+               for line in resp.get_data(as_text=True).splitlines()]
+    assert {record["type"] for record in records} >= \
+        {"project", "object", "item", "file"}
+    files = [record for record in records if record["type"] == "file"]
+    assert files == [{
+        "type": "file",
+        "file_id": data["file_id"],
+        "item_id": data["item_id"],
+        "file_name": "my_dumb_audio.wav",
+        "generation": None,
+        "filesize": None,
+        "filesize_unit": None,
+    }]
+
+    resp = server.get("/api/export",
+                      query_string={"format": "csv", "entity": "item"})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [int(row["item_id"]) for row in rows] == [data["item_id"]]
+    assert json.loads(rows[0]["format_details"]) == {}
+
+    assert server.get("/api/export",
+                      query_string={"format": "csv"}).status_code == 400
+    assert server.get("/api/export",
+                      query_string={"entity": "nothing"}).status_code == 400
+
+
+def test_search(server_with_object_item_file):
+    server, data = server_with_object_item_file
+    resp = server.get("/api/search", query_string={"q": "my_dumb_audio"})
+    assert resp.status_code == 200
+    results = resp.get_json()
+    assert results["query"] == "my_dumb_audio"
+    assert results["total"] == 1
+    assert results["results"][0]["type"] == "file"
+    assert results["results"][0]["id"] == data["file_id"]
+    assert results["results"][0]["name"] == "my_dumb_audio.wav"
+
+    resp = server.get("/api/search",
+                      query_string={"q": "my_dumb", "type": "file,item"})
+    assert {(result["type"], result["id"])
+            for result in resp.get_json()["results"]} == \
+        {("file", data["file_id"])}
+
+    assert server.get("/api/search",
+                      query_string={"q": " ! "}).status_code == 400
+    assert server.get("/api/search",
+                      query_string={"q": "audio",
+                                    "type": "nothing"}).status_code == 400
+
+
+def test_nested_routes_check_the_path(server_with_object_item_file):
+    server, data = server_with_object_item_file
+    files_url = "/api/project/{}/object/{}/item/{}/files"
+    right_path = files_url.format(data["project_id"], data["object_id"],
+                                  data["item_id"])
+    wrong_path = files_url.format(data["project_id"], data["object_id"] + 1,
+                                  data["item_id"])
+
+    resp = server.get(right_path, query_string={"id": data["file_id"]})
+    assert resp.status_code == 200
+    assert server.get(right_path, query_string={
+        "id": data["file_id"] + 1}).status_code == 404
+    assert server.get(wrong_path).status_code == 404
+
+    resp = server.post(
+        "/api/project/{}/object/{}/item/{}/file".format(
+            data["project_id"] + 1, data["object_id"], data["item_id"]),
+        data=json.dumps({"file_name": "misplaced.wav"}),
+        content_type='application/json'
+    )
+    assert resp.status_code == 404
+    resp = server.get(right_path)
+    assert [file_["file_name"] for file_ in resp.get_json()["files"]] == \
+        ["my_dumb_audio.wav"]
+
+    item_url = "/api/project/{}/object/{}/item"
+    resp = server.delete(
+        item_url.format(data["project_id"] + 1, data["object_id"]),
+        query_string={"item_id": data["item_id"]})
+    assert resp.status_code == 404
+    assert server.get(
+        item_url.format(data["project_id"], data["object_id"]),
+        query_string={"item_id": data["item_id"]}).status_code == 200
+
+
+def test_project_object_only_in_its_project(server_with_object_item_file):
+    server, data = server_with_object_item_file
+    resp = server.get("/api/project/{}/object/{}".format(
+        data["project_id"], data["object_id"]))
+    assert resp.status_code == 200
+    project_object = resp.get_json()
+    assert project_object["object_id"] == data["object_id"]
+    assert project_object["parent_project_id"] == data["project_id"]
+    assert [item["item_id"] for item in project_object["items"]] == \
+        [data["item_id"]]
+    assert project_object["items"][0]["routes"]["frontend"] == \
+        "/project/{}/object/{}/item/{}".format(
+            data["project_id"], data["object_id"], data["item_id"])
+
+    resp = server.get("/api/project/{}/object/{}".format(
+        data["project_id"] + 1, data["object_id"]))
+    assert resp.status_code == 404
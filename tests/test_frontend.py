@@ -6,6 +6,7 @@ from pyexpat import ExpatError
 from flask import Flask, url_for
 from flask_sqlalchemy import SQLAlchemy
 import pytest
+import sqlalchemy
 import tyko
 import tyko.database
 from tyko import frontend
@@ -275,3 +276,39 @@ def test_create_project_page(app):
     with app.test_client() as server:
         create_project_page = server.get("/project/create/")
         assert create_project_page.status_code == 200
+
+
+def test_object_details_page_uses_one_connection(app):
+    with app.test_client() as server:
+        project_id = server.post(
+            "/api/project/",
+            data=json.dumps({"title": "my dumb project"}),
+            content_type='application/json'
+        ).get_json()['id']
+
+        collection_id = server.post(
+            url_for("add_collection"),
+            data=json.dumps({"collection_name": "my dumb collection"}),
+            content_type='application/json'
+        ).get_json()['id']
+
+        object_id = server.post(
+            url_for("project_add_object", project_id=project_id),
+            data=json.dumps({"name": "my stupid object",
+                             "collection_id": collection_id}),
+            content_type='application/json'
+        ).get_json()['object']['object_id']
+
+        checkouts = []
+
+        def on_checkout(*args):
+            checkouts.append(args)
+
+        sqlalchemy.event.listen(sqlalchemy.pool.Pool, "checkout", on_checkout)
+        try:
+            resulting_webpage = server.get(f"/object/{object_id}")
+        finally:
+            sqlalchemy.event.remove(sqlalchemy.pool.Pool, "checkout",
+                                    on_checkout)
+        assert resulting_webpage.status_code == 200
+        assert len(checkouts) == 1
@@ -103,3 +103,9 @@ def test_pbcore_valid_id(tmpdir):
         doc = etree.fromstring(pbcore_xml)
         print(str(etree.tostring(doc, pretty_print=True), encoding="utf-8"))
         assert PBCORE_SCHEMA.validate(doc) is True, PBCORE_SCHEMA.error_log.filter_from_errors().last_error.message
+
+
+def test_pbcore_templates_compiled_once():
+    first = pbcore.pbcore.ENVIRONMENT.get_template("pbcore.xml")
+    second = pbcore.pbcore.ENVIRONMENT.get_template("pbcore.xml")
+    assert first is second
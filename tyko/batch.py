@@ -0,0 +1,337 @@
+"""Validation and bulk insertion of batches of objects, items and files.
+
+A whole batch is validated before anything is written so a mistake in the
+last record of a batch does not leave the first ones behind. The records are
+then inserted with Session.bulk_save_objects() in a single transaction,
+which skips the unit of work bookkeeping done for each record added with
+Session.add(). They are inserted one level at a time: every object of the
+batch, then every item, then every file.
+
+Bulk saves do not go through the flush events, so the entity versions, the
+search index and the cache evictions that those events normally take care
+of are handled here and by the callers.
+
+Audio cassettes are not supported in a batch because they need their
+format specific details. They have to be added one at a time.
+"""
+import collections
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, orm
+
+from .exceptions import DataError
+from .schema import formats
+from .schema.collection import Collection
+from .schema.instantiation import InstantiationFile
+from .schema.objects import CollectionObject
+from . import search, versioning
+
+MAX_BATCH_SIZE = 1000
+
+# Formats that can only be created with their format specific details
+UNSUPPORTED_FORMATS = {formats.format_types["audio cassette"][0]}
+
+
+class _Validator:
+    def __init__(self) -> None:
+        self.errors: List[str] = []
+        self.records = 0
+
+    def entries(self, value, path: str) -> List[dict]:
+        if not isinstance(value, list) or \
+                not all(isinstance(entry, dict) for entry in value):
+            self.errors.append(f"{path} must be a list of objects")
+            return []
+        self.records += len(value)
+        return value
+
+    def text(self, entry: dict, key: str, path: str,
+             required: bool = False) -> Optional[str]:
+        value = entry.get(key)
+        if isinstance(value, str) and value.strip() == "":
+            value = None
+        if value is None:
+            if required:
+                self.errors.append(f"{path}.{key} is required")
+            return None
+        if not isinstance(value, str):
+            self.errors.append(f"{path}.{key} must be a string")
+            return None
+        return value
+
+    def integer(self, entry: dict, key: str, path: str,
+                required: bool = False) -> Optional[int]:
+        value = entry.get(key)
+        if value is None or value == "":
+            if required:
+                self.errors.append(f"{path}.{key} is required")
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            self.errors.append(f"{path}.{key} must be an integer")
+            return None
+
+    def date(self, entry: dict, key: str, path: str) -> Optional[datetime]:
+        value = self.text(entry, key, path)
+        if value is None:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            self.errors.append(f"{path}.{key} must be a date as YYYY-MM-DD")
+            return None
+
+    def check(self) -> None:
+        if self.records > MAX_BATCH_SIZE:
+            self.errors.insert(
+                0, f"A batch can contain at most {MAX_BATCH_SIZE} records")
+        if self.errors:
+            raise DataError(message="Invalid batch: " +
+                            "; ".join(self.errors),
+                            status_code=400)
+
+
+def _validate_files(validator: _Validator, entries,
+                    path: str) -> List[Dict[str, Any]]:
+    files = []
+    for index, entry in enumerate(validator.entries(entries, path)):
+        entry_path = f"{path}[{index}]"
+        files.append({
+            "file_name": validator.text(entry, "file_name", entry_path,
+                                        required=True),
+            "generation": validator.text(entry, "generation", entry_path),
+        })
+    return files
+
+
+def _validate_items(validator: _Validator, entries,
+                    path: str) -> List[Dict[str, Any]]:
+    items = []
+    for index, entry in enumerate(validator.entries(entries, path)):
+        entry_path = f"{path}[{index}]"
+        format_id = validator.integer(entry, "format_id", entry_path,
+                                      required=True)
+        if format_id in UNSUPPORTED_FORMATS:
+            validator.errors.append(
+                f"{entry_path}.format_id {format_id} cannot be added in a "
+                f"batch")
+        items.append({
+            "name": validator.text(entry, "name", entry_path, required=True),
+            "format_id": format_id,
+            "obj_sequence": validator.integer(entry, "obj_sequence",
+                                              entry_path),
+            "files": _validate_files(validator, entry.get("files", []),
+                                     f"{entry_path}.files"),
+        })
+    return items
+
+
+def _validate_objects(validator: _Validator, entries,
+                      path: str) -> List[Dict[str, Any]]:
+    objects = []
+    for index, entry in enumerate(validator.entries(entries, path)):
+        entry_path = f"{path}[{index}]"
+        objects.append({
+            "name": validator.text(entry, "name", entry_path, required=True),
+            "barcode": validator.text(entry, "barcode", entry_path),
+            "originals_rec_date": validator.date(entry, "originals_rec_date",
+                                                 entry_path),
+            "collection_id": validator.integer(entry, "collection_id",
+                                               entry_path),
+            "items": _validate_items(validator, entry.get("items", []),
+                                     f"{entry_path}.items"),
+        })
+    return objects
+
+
+def validate_objects(entries) -> List[Dict[str, Any]]:
+    """Validate a batch of objects, with their items and files.
+
+    Raises:
+        DataError: listing every problem found in the batch
+
+    """
+    validator = _Validator()
+    objects = _validate_objects(validator, entries, "objects")
+    validator.check()
+    return objects
+
+
+def validate_items(entries) -> List[Dict[str, Any]]:
+    """Validate a batch of items, with their files.
+
+    Raises:
+        DataError: listing every problem found in the batch
+
+    """
+    validator = _Validator()
+    items = _validate_items(validator, entries, "items")
+    validator.check()
+    return items
+
+
+def validate_files(entries) -> List[Dict[str, Any]]:
+    """Validate a batch of files.
+
+    Raises:
+        DataError: listing every problem found in the batch
+
+    """
+    validator = _Validator()
+    files = _validate_files(validator, entries, "files")
+    validator.check()
+    return files
+
+
+def _missing_ids(session, column, ids: Set[int]) -> Set[int]:
+    if not ids:
+        return set()
+    found = {row[0] for row in session.query(column).filter(column.in_(ids))}
+    return ids - found
+
+
+def check_references(session, objects: Iterable[dict] = (),
+                     items: Iterable[dict] = ()) -> None:
+    """Make sure the collections and formats referenced by a batch exist.
+
+    Raises:
+        DataError: if any of them is missing
+
+    """
+    objects = list(objects)
+    items = list(items) + [item for obj in objects for item in obj["items"]]
+    errors = []
+    missing_collections = _missing_ids(
+        session, Collection.id,
+        {obj["collection_id"] for obj in objects
+         if obj["collection_id"] is not None})
+    if missing_collections:
+        errors.append("Unknown collection_id: " +
+                      ", ".join(map(str, sorted(missing_collections))))
+    missing_formats = _missing_ids(
+        session, formats.FormatTypes.id,
+        {item["format_id"] for item in items})
+    if missing_formats:
+        errors.append("Unknown format_id: " +
+                      ", ".join(map(str, sorted(missing_formats))))
+    if errors:
+        raise DataError(message="Invalid batch: " + "; ".join(errors),
+                        status_code=400)
+
+
+def _flatten(groups: List[list]) -> list:
+    return [record for group in groups for record in group]
+
+
+def _save(session, records: list, id_column, parent_column) -> None:
+    """Insert records in one statement and read their ids back.
+
+    Without return_defaults the records are inserted with a single
+    executemany, but they do not get their ids. The ids are then read by
+    parent in one query, and as the rows of each parent were inserted in
+    the order given, they come back in the same order.
+    """
+    if not records:
+        return
+    last_id = session.query(func.max(id_column)).scalar() or 0
+    session.bulk_save_objects(records)
+    by_parent: Dict[int, List[Any]] = collections.defaultdict(list)
+    for record in records:
+        by_parent[getattr(record, parent_column.key)].append(record)
+    pending = {parent_id: iter(group)
+               for parent_id, group in by_parent.items()}
+    rows = session.query(id_column, parent_column)\
+        .filter(parent_column.in_(list(pending)))\
+        .filter(id_column > last_id)\
+        .order_by(id_column)
+    for entity_id, parent_id in rows:
+        setattr(next(pending[parent_id]), id_column.key, entity_id)
+
+
+def _insert_files(session, parents: List[Tuple[int, List[dict]]]
+                  ) -> List[List[Dict[str, Any]]]:
+    groups = [
+        [
+            InstantiationFile(item_id=item_id, file_name=file_["file_name"],
+                              generation=file_["generation"])
+            for file_ in files
+        ]
+        for item_id, files in parents
+    ]
+    records = _flatten(groups)
+    _save(session, records, InstantiationFile.file_id,
+          InstantiationFile.item_id)
+    search.index_instances(session, records)
+    return [[{"id": record.file_id} for record in group] for group in groups]
+
+
+def _insert_items(session, parents: List[Tuple[int, List[dict]]]
+                  ) -> List[List[Dict[str, Any]]]:
+    groups = [
+        [
+            formats.CollectionItem(object_id=object_id, name=item["name"],
+                                   format_type_id=item["format_id"],
+                                   obj_sequence=item["obj_sequence"])
+            for item in items
+        ]
+        for object_id, items in parents
+    ]
+    records = _flatten(groups)
+    # The rows of the items table of the joined inheritance need the ids of
+    # the formats rows, so they are read back as each item is inserted
+    session.bulk_save_objects(records, return_defaults=True)
+    search.index_instances(session, records)
+    items = _flatten([entries for _, entries in parents])
+    files = iter(_insert_files(session, [
+        (record.table_id, item["files"])
+        for record, item in zip(records, items)
+    ]))
+    return [
+        [
+            {"item_id": record.table_id, "files": next(files)}
+            for record in group
+        ]
+        for group in groups
+    ]
+
+
+def insert_files(session, item_id: int,
+                 files: List[dict]) -> List[Dict[str, Any]]:
+    return _insert_files(session, [(item_id, files)])[0]
+
+
+def insert_items(session, object_id: int,
+                 items: List[dict]) -> List[Dict[str, Any]]:
+    return _insert_items(session, [(object_id, items)])[0]
+
+
+def insert_objects(session, project_id: int,
+                   objects: List[dict]) -> List[Dict[str, Any]]:
+    """Insert objects with their items and files, one level at a time."""
+    records = [
+        CollectionObject(project_id=project_id, name=obj["name"],
+                         barcode=obj["barcode"],
+                         originals_rec_date=obj["originals_rec_date"],
+                         collection_id=obj["collection_id"])
+        for obj in objects
+    ]
+    _save(session, records, CollectionObject.id, CollectionObject.project_id)
+    search.index_instances(session, records)
+    items = _insert_items(session, [
+        (record.id, obj["items"]) for record, obj in zip(records, objects)
+    ])
+    return [
+        {"object_id": record.id, "items": record_items}
+        for record, record_items in zip(records, items)
+    ]
+
+
+def bump_versions(session) -> None:
+    """Bump the versions of every table a batch can insert into."""
+    versioning.bump(session.connection(), [
+        versioning.entity_name(orm.class_mapper(mapped_class))
+        for mapped_class in (CollectionObject, formats.CollectionItem,
+                             InstantiationFile)
+    ])
@@ -0,0 +1,416 @@
+"""Read-through cache for serialized entities.
+
+The detail documents of projects, objects, items and files are cached under
+keys such as ``project:3`` once they have been serialized by their data
+connector. The cache is attached to a sessionmaker through its ``info``
+dictionary so every connector created from that sessionmaker shares it.
+
+Any flush that touches an entity evicts the entity's key and the keys of all
+of its ancestors after the transaction is committed: a note change evicts the
+projects, objects and items it belongs to, a file change evicts its item,
+that item's object and that object's project.
+
+Every eviction also bumps the generation of the keys it evicts. A document
+is only stored if the generation of its key is unchanged since the read
+started, so a read that overlaps a commit can not put back the data the
+commit replaced. Generations are kept in each process, so entries also
+expire after TYKO_CACHE_TIMEOUT seconds in both backends, which bounds how
+long another process can serve stale data.
+
+Two backends are available:
+
+``lru``
+    In-process least recently used cache. Only suitable when a single
+    process serves the application because other processes never see its
+    evictions.
+
+``shared``
+    Stores the documents in a shared key value store through any client with
+    a redis-like ``get``/``set``/``delete`` interface.
+"""
+import abc
+import collections
+import functools
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+from .loader_profiles import DETAIL
+from .schema import formats
+from .schema.instantiation import InstantiationFile, FileNotes, \
+    FileAnnotation
+from .schema.notes import Note
+from .schema.objects import CollectionObject, object_has_notes_table
+from .schema.projects import Project, project_has_notes_table
+from .schema.formats import item_has_notes_table
+
+SESSION_INFO_KEY = "entity_cache"
+
+# Seconds before a cached document expires
+DEFAULT_TIMEOUT = 300
+
+PROJECT = "project"
+OBJECT = "object"
+ITEM = "item"
+FILE = "file"
+NOTE = "note"
+
+# Enumerations that are included in the serialized items
+_CASSETTE_ENUMS = {
+    formats.CassetteType: "cassette_format_type_id",
+    formats.CassetteTapeType: "tape_type_id",
+    formats.CassetteTapeThickness: "tape_thickness_id",
+}
+
+EntityKey = Tuple[str, int]
+
+
+class AbsCacheBackend(metaclass=abc.ABCMeta):
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Get the value stored for a key or None if missing"""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Store a value"""
+
+    @abc.abstractmethod
+    def delete(self, *keys: str) -> None:
+        """Remove the keys if they exist"""
+
+
+class LRUCacheBackend(AbsCacheBackend):
+    """Backend keeping the documents in the memory of the process.
+
+    Args:
+        max_entries: number of documents kept before the least recently
+            used are dropped
+        timeout: seconds before an entry expires, or None to keep it until
+            it is evicted
+
+    """
+
+    def __init__(self, max_entries: int = 1024,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT) -> None:
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data: \
+            "collections.OrderedDict[str, Tuple[Optional[float], str]]" = \
+            collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCacheBackend(AbsCacheBackend):
+    """Backend for a key value store shared between processes.
+
+    Args:
+        client: object with redis-like get(key), set(key, value, ex=None)
+            and delete(*keys) methods
+        prefix: prepended to every key so the store can be shared
+        timeout: seconds before an entry expires, or None to keep it until
+            it is evicted
+
+    """
+
+    def __init__(self, client, prefix: str = "tyko:",
+                 timeout: Optional[int] = DEFAULT_TIMEOUT) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.client.set(self.prefix + key, value, ex=self.timeout)
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+class EntityCache:
+    def __init__(self, backend: AbsCacheBackend) -> None:
+        self.backend = backend
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, entity_id: int) -> str:
+        return f"{kind}:{entity_id}"
+
+    def get(self, kind: str, entity_id: int) -> Optional[Dict[str, Any]]:
+        value = self.backend.get(self.make_key(kind, entity_id))
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def generation(self, kind: str, entity_id: int) -> int:
+        """Get the number of times the key of an entity was evicted."""
+        with self._lock:
+            return self._generations.get(self.make_key(kind, entity_id), 0)
+
+    def set(self, kind: str, entity_id: int, data: Dict[str, Any],
+            generation: Optional[int] = None) -> None:
+        """Store the document of an entity.
+
+        Nothing is stored if a generation is given and the entity was
+        evicted since it was read.
+        """
+        key = self.make_key(kind, entity_id)
+        value = json.dumps(data)
+        with self._lock:
+            if generation is not None and \
+                    self._generations.get(key, 0) != generation:
+                return
+            self.backend.set(key, value)
+
+    def evict(self, entities: Iterable[EntityKey]) -> None:
+        keys = sorted({self.make_key(kind, entity_id)
+                       for kind, entity_id in entities})
+        if keys:
+            with self._lock:
+                for key in keys:
+                    self._generations[key] = self._generations.get(key, 0) + 1
+            self.backend.delete(*keys)
+
+
+def from_session_maker(session_maker) -> Optional[EntityCache]:
+    """Get the cache attached to a sessionmaker, if there is one."""
+    kw = getattr(session_maker, "kw", {})
+    return kw.get("info", {}).get(SESSION_INFO_KEY)
+
+
+def read_through(kind: str):
+    """Cache the serialized record returned by a connector's get method.
+
+    Only calls for a single serialized record with the default "detail"
+    loader profile are cached. Everything else goes straight to the
+    database.
+    """
+    def decorator(get):
+        @functools.wraps(get)
+        def wrapper(self, id=None, serialize=False, *args, **kwargs):  # noqa: E501 pylint: disable=redefined-builtin,keyword-arg-before-vararg
+            entity_cache = from_session_maker(self.session_maker)
+            if entity_cache is None or id is None or serialize is not True \
+                    or kwargs.get("profile") not in (None, DETAIL):
+                return get(self, id, serialize, *args, **kwargs)
+
+            data = entity_cache.get(kind, id)
+            if data is None:
+                generation = entity_cache.generation(kind, id)
+                data = get(self, id, serialize, *args, **kwargs)
+                entity_cache.set(kind, id, data, generation=generation)
+            return data
+        return wrapper
+    return decorator
+
+
+def create_backend(config) -> Optional[AbsCacheBackend]:
+    """Create the cache backend selected in the application config.
+
+    TYKO_CACHE_BACKEND
+        "lru", "shared" or None to disable caching
+    TYKO_CACHE_SIZE
+        max number of documents kept by the lru backend
+    TYKO_CACHE_URL
+        url of the redis server used by the shared backend
+    TYKO_CACHE_TIMEOUT
+        seconds before an entry expires, None to keep it until it is
+        evicted
+    """
+    backend_name = config.get("TYKO_CACHE_BACKEND")
+    if not backend_name:
+        return None
+    timeout = config.get("TYKO_CACHE_TIMEOUT", DEFAULT_TIMEOUT)
+    if backend_name == "lru":
+        return LRUCacheBackend(int(config.get("TYKO_CACHE_SIZE", 1024)),
+                               timeout=timeout)
+    if backend_name == "shared":
+        try:
+            import redis  # type: ignore # noqa: E501 pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            raise ValueError("The shared cache backend requires the redis "
+                             "package") from error
+        return SharedCacheBackend(
+            redis.Redis.from_url(config["TYKO_CACHE_URL"]),
+            timeout=timeout
+        )
+    raise ValueError(f"Unknown cache backend: {backend_name}")
+
+
+def _history_values(instance, attribute: str) -> Set[int]:
+    history = attributes.get_history(instance, attribute)
+    values = set(history.unchanged or ()) | set(history.added or ()) | \
+        set(history.deleted or ())
+    values.discard(None)
+    return values
+
+
+def _instance_keys(instance) -> Set[EntityKey]:
+    """Get the keys of an instance and of the parents it points to."""
+    keys: Set[EntityKey] = set()
+    if isinstance(instance, Project):
+        if instance.id is not None:
+            keys.add((PROJECT, instance.id))
+    elif isinstance(instance, CollectionObject):
+        if instance.id is not None:
+            keys.add((OBJECT, instance.id))
+        keys |= {(PROJECT, i) for i in
+                 _history_values(instance, "project_id")}
+    elif isinstance(instance, formats.AVFormat):
+        if instance.table_id is not None:
+            keys.add((ITEM, instance.table_id))
+        keys |= {(OBJECT, i) for i in _history_values(instance, "object_id")}
+    elif isinstance(instance, InstantiationFile):
+        if instance.file_id is not None:
+            keys.add((FILE, instance.file_id))
+        keys |= {(ITEM, i) for i in _history_values(instance, "item_id")}
+    elif isinstance(instance, (FileNotes, FileAnnotation)):
+        keys |= {(FILE, i) for i in _history_values(instance, "file_id")}
+    elif isinstance(instance, Note):
+        if instance.id is not None:
+            keys.add((NOTE, instance.id))
+    elif type(instance) in _CASSETTE_ENUMS:
+        if instance.table_id is not None:
+            keys.add((type(instance).__tablename__, instance.table_id))
+    return keys
+
+
+def _parent_query(kind: str, ids: Set[int]):
+    if kind == FILE:
+        return [(ITEM, sqlalchemy.select([InstantiationFile.item_id])
+                 .where(InstantiationFile.file_id.in_(ids)))]
+    if kind == ITEM:
+        return [(OBJECT, sqlalchemy.select([formats.AVFormat.object_id])
+                 .where(formats.AVFormat.table_id.in_(ids)))]
+    if kind == OBJECT:
+        return [(PROJECT, sqlalchemy.select([CollectionObject.project_id])
+                 .where(CollectionObject.id.in_(ids)))]
+    if kind == NOTE:
+        return [
+            (PROJECT, sqlalchemy.select([project_has_notes_table.c.project_id])
+             .where(project_has_notes_table.c.notes_id.in_(ids))),
+            (OBJECT, sqlalchemy.select([object_has_notes_table.c.object_id])
+             .where(object_has_notes_table.c.notes_id.in_(ids))),
+            (ITEM, sqlalchemy.select([item_has_notes_table.c.item_id])
+             .where(item_has_notes_table.c.notes_id.in_(ids))),
+        ]
+    for enum_type, column_name in _CASSETTE_ENUMS.items():
+        if kind == enum_type.__tablename__:
+            cassettes = formats.AudioCassette.__table__
+            return [(ITEM, sqlalchemy.select([cassettes.c.table_id])
+                     .where(cassettes.c[column_name].in_(ids)))]
+    return []
+
+
+def with_ancestors(session, keys: Set[EntityKey]) -> Set[EntityKey]:
+    """Add the keys of every ancestor of the given entities.
+
+    Uses one query per level of the hierarchy and kind of parent.
+    """
+    result = set(keys)
+    pending = set(keys)
+    while pending:
+        by_kind: Dict[str, Set[int]] = collections.defaultdict(set)
+        for kind, entity_id in pending:
+            by_kind[kind].add(entity_id)
+        pending = set()
+        for kind, ids in by_kind.items():
+            for parent_kind, query in _parent_query(kind, ids):
+                for (parent_id,) in session.execute(query):
+                    if parent_id is None:
+                        continue
+                    parent_key = (parent_kind, parent_id)
+                    if parent_key not in result:
+                        result.add(parent_key)
+                        pending.add(parent_key)
+    return result
+
+
+def _schedule(session, keys: Set[EntityKey]) -> None:
+    if keys and session.info.get(SESSION_INFO_KEY) is not None:
+        session.info.setdefault("evict_after_commit", set()).update(
+            with_ancestors(session, keys))
+
+
+def schedule_eviction(session, mapped_class, entity_id: int) -> None:
+    """Evict an entity and its ancestors once the session commits.
+
+    Needed before a bulk Query.delete(), which does not go through the
+    flush events.
+    """
+    if session.info.get(SESSION_INFO_KEY) is None:
+        return
+    instance = session.query(mapped_class).get(entity_id)
+    if instance is not None:
+        _schedule(session, _instance_keys(instance))
+
+
+def _before_flush(session, flush_context, instances):  # noqa: E501 pylint: disable=unused-argument
+    keys: Set[EntityKey] = set()
+    for instance in session.new:
+        keys |= _instance_keys(instance)
+    for instance in session.deleted:
+        keys |= _instance_keys(instance)
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            keys |= _instance_keys(instance)
+    _schedule(session, keys)
+
+
+def _after_commit(session):
+    entity_cache = session.info.get(SESSION_INFO_KEY)
+    keys = session.info.pop("evict_after_commit", None)
+    if entity_cache is not None and keys:
+        entity_cache.evict(keys)
+
+
+def _after_rollback(session, previous_transaction):  # noqa: E501 pylint: disable=unused-argument
+    session.info.pop("evict_after_commit", None)
+
+
+def track_evictions(session_factory) -> None:
+    """Evict the entities changed by sessions from the factory."""
+    event.listen(session_factory, "before_flush", _before_flush)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_soft_rollback", _after_rollback)
@@ -1,2 +1,31 @@
 class Config:
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+
+    # Cache for serialized entities: None, "lru" or "shared". See tyko.cache
+    TYKO_CACHE_BACKEND = None
+    # Seconds before a cached entity expires, None to keep it until evicted
+    TYKO_CACHE_TIMEOUT = 300
+
+    # Seconds the lookup tables are cached in each process, 0 to turn the
+    # cache off. See tyko.lookups
+    TYKO_LOOKUP_CACHE_TTL = 300
+
+    # Encoder of the API responses: None or "auto" for orjson when it is
+    # installed, "orjson" or "stdlib". See tyko.json_response
+    TYKO_JSON_ENCODER = None
+
+    # Connection pool settings, None keeps the default. See tyko.pool_metrics
+    TYKO_DB_POOL_SIZE = None
+    TYKO_DB_MAX_OVERFLOW = None
+    TYKO_DB_POOL_RECYCLE = None
+    TYKO_DB_POOL_TIMEOUT = None
+
+    # Request metrics served at /metrics. See tyko.instrumentation
+    TYKO_METRICS = True
+
+    # Log likely N+1 queries and requests over the query budget. Only meant
+    # for development. See tyko.query_diagnostics
+    TYKO_QUERY_DIAGNOSTICS = False
+    TYKO_QUERY_BUDGET_COUNT = 50
+    TYKO_QUERY_BUDGET_SECONDS = 0.5
+    TYKO_QUERY_REPEAT_THRESHOLD = 5
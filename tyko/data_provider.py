@@ -2,7 +2,7 @@
 import abc
 from abc import ABC, ABCMeta
 from datetime import datetime
-from typing import List, Optional, Iterator
+from typing import Any, Dict, List, Optional, Iterator
 
 import sqlalchemy
 from sqlalchemy.sql.expression import true
@@ -14,17 +14,55 @@ from .schema.instantiation import FileNotes, InstantiationFile, \
     FileAnnotation, FileAnnotationType
 from .schema import CollectionItem
 from .schema.notes import Note, NoteTypes
-from .schema.objects import CollectionObject
-from .schema.projects import Project, ProjectStatus
+from .schema.objects import CollectionObject, object_has_notes_table
+from .schema.projects import Project, ProjectStatus, \
+    project_has_notes_table
 from .schema.formats import CassetteType, CassetteTapeType, \
-    CassetteTapeThickness, AudioCassette, AVFormat
+    CassetteTapeThickness, AudioCassette, AVFormat, item_has_notes_table
 from .exceptions import DataError
+from . import batch
 from . import database
+from . import cache
+from . import loader_profiles
+from . import lookups
+from . import pool_metrics
+from . import search
+from . import sessions
+from . import versioning
 from tyko import utils
 
 DATE_FORMAT = '%Y-%m-%d'
 
 
+def _page(query, key_column, limit=None, after=None, offset=None):
+    """Restrict a query to a single page of records ordered by key_column.
+
+    Args:
+        query: query to limit
+        key_column: unique column used for the keyset ordering
+        limit: max number of records to return
+        after: only return records with a key greater than this value
+        offset: number of records to skip
+
+    """
+    if after is not None:
+        query = query.filter(key_column > after)
+    query = query.order_by(key_column)
+    if offset is not None:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def _count(session_maker, key_column) -> int:
+    session = session_maker()
+    try:
+        return session.query(sqlalchemy.func.count(key_column)).scalar()
+    finally:
+        session.close()
+
+
 class AbsDataProviderConnector(metaclass=abc.ABCMeta):
 
     def __init__(self, session_maker) -> None:
@@ -50,13 +88,10 @@ class AbsDataProviderConnector(metaclass=abc.ABCMeta):
 class AbsNotesConnector(AbsDataProviderConnector, ABC):  # noqa: E501 pylint: disable=abstract-method
     @staticmethod
     def get_note_type(session, note_type_id):
-        note_types = session.query(NoteTypes) \
-            .filter(NoteTypes.id == note_type_id) \
-            .all()
-
-        if len(note_types) == 0:
+        note_type = lookups.get_entry(session, NoteTypes, int(note_type_id))
+        if note_type is None:
             raise ValueError("Not a valid note_type")
-        return note_types[0]
+        return note_type
 
     @classmethod
     def new_note(cls, session, text: str, note_type_id: int):
@@ -70,20 +105,25 @@ class AbsNotesConnector(AbsDataProviderConnector, ABC):  # noqa: E501 pylint: di
 
 class ProjectDataConnector(AbsNotesConnector):
 
-    def get(self, id=None, serialize=False):
+    @cache.read_through(cache.PROJECT)
+    def get(self, id=None, serialize=False, limit=None, after=None,
+            offset=None, profile=None):
+        loader = loader_profiles.get_profile(Project, profile,
+                                             single=id is not None)
         session = self.session_maker()
+        query = session.query(Project).options(*loader.options)
         if id:
-            all_projects = session.query(Project)\
-                .filter(Project.id == id)\
-                .all()
+            all_projects = query.filter(Project.id == id).all()
 
         else:
-            all_projects = session.query(Project).all()
+            all_projects = _page(query, Project.id,
+                                 limit=limit, after=after, offset=offset)\
+                .all()
 
         if serialize is True:
             serialized_projects = []
             for project in all_projects:
-                serialized_project = project.serialize(recurse=True)
+                serialized_project = project.serialize(recurse=loader.recurse)
                 serialized_projects.append(serialized_project)
 
             all_projects = serialized_projects
@@ -94,6 +134,9 @@ class ProjectDataConnector(AbsNotesConnector):
 
         return all_projects
 
+    def count(self) -> int:
+        return _count(self.session_maker, Project.id)
+
     def get_all_project_status(self) -> List[ProjectStatus]:
         """Get the list of all possible statuses that a project can be
 
@@ -101,11 +144,7 @@ class ProjectDataConnector(AbsNotesConnector):
             All valid status types for projects
 
         """
-        session = self.session_maker()
-        try:
-            return session.query(ProjectStatus).all()
-        finally:
-            session.close()
+        return lookups.all_entries(self.session_maker, ProjectStatus)
 
     def get_project_status_by_name(self, name: str,
                                    create_if_not_exists: bool = False
@@ -220,10 +259,10 @@ class ProjectDataConnector(AbsNotesConnector):
         return self.get(id, serialize)
 
     def update(self, id, changed_data):
-        updated_project = None
-        project = self.get_project(id)
+        session = self.session_maker()
+        try:
+            project = session.query(Project).filter(Project.id == id).one()
 
-        if project:
             if "title" in changed_data:
                 project.title = changed_data['title']
 
@@ -235,25 +274,22 @@ class ProjectDataConnector(AbsNotesConnector):
 
             if "status" in changed_data:
                 if isinstance(changed_data['status'], str):
-                    project.status = \
-                        self.get_project_status_by_name(changed_data['status'])
+                    project.status = session.merge(
+                        self.get_project_status_by_name(
+                            changed_data['status']))
                 else:
                     project.status = changed_data['status']
 
-            session = self.session_maker()
-            session.add(project)
             session.commit()
+            return project.serialize()
+        finally:
             session.close()
 
-            updated_project = session.query(Project)\
-                .filter(Project.id == id)\
-                .one()
-
-        return updated_project.serialize()
-
     def delete(self, id):
         if id:
             session = self.session_maker()
+            cache.schedule_eviction(session, Project, id)
+            search.remove_records(session, Project, [id])
             items_deleted = session.query(Project)\
                 .filter(Project.id == id)\
                 .delete()
@@ -264,11 +300,7 @@ class ProjectDataConnector(AbsNotesConnector):
         return False
 
     def get_note_types(self):
-        session = self.session_maker()
-        try:
-            return session.query(NoteTypes).all()
-        finally:
-            session.close()
+        return lookups.all_entries(self.session_maker, NoteTypes)
 
     def remove_note(self, project_id, note_id):
         session = self.session_maker()
@@ -317,22 +349,52 @@ class ProjectDataConnector(AbsNotesConnector):
         finally:
             session.close()
 
+    def add_objects(self, project_id, objects):
+        """Add a batch of objects, with their items and files, to a project.
+
+        The whole batch is validated first and inserted in one transaction.
+
+        Args:
+            project_id: project to add the objects to
+            objects: list of objects as accepted by batch.validate_objects()
+
+        Returns:
+            the ids of the new objects, items and files, in the order given
+
+        """
+        new_objects = batch.validate_objects(objects)
+        session = self.session_maker()
+        try:
+            self._get_project(session, project_id)
+            batch.check_references(session, objects=new_objects)
+            created = batch.insert_objects(session, project_id, new_objects)
+            batch.bump_versions(session)
+            cache.schedule_eviction(session, Project, project_id)
+            session.commit()
+            return created
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def remove_object(self, project_id, object_id):
         session = self.session_maker()
         try:
             project = self._get_project(session=session, project_id=project_id)
-            for child_object in project.objects:
-                if child_object.id == object_id:
-                    project.objects.remove(child_object)
-                    session.commit()
-                    return session.query(Project) \
-                        .filter(Project.id == project_id) \
-                        .one().serialize()
-            raise DataError(
-                message="Project id {} contains no object with an"
-                        " id {}".format(project_id, object_id),
-                status_code=404
-            )
+            child_object = session.query(CollectionObject)\
+                .filter(CollectionObject.id == object_id)\
+                .filter(CollectionObject.project_id == project_id)\
+                .first()
+            if child_object is None:
+                raise DataError(
+                    message="Project id {} contains no object with an"
+                            " id {}".format(project_id, object_id),
+                    status_code=404
+                )
+            child_object.project_id = None
+            session.commit()
+            return project.serialize()
         finally:
             session.close()
 
@@ -358,20 +420,26 @@ class ProjectDataConnector(AbsNotesConnector):
 
 class ObjectDataConnector(AbsNotesConnector):
 
-    def get(self, id=None, serialize=False):
+    @cache.read_through(cache.OBJECT)
+    def get(self, id=None, serialize=False, limit=None, after=None,
+            offset=None, profile=None):
+        loader = loader_profiles.get_profile(CollectionObject, profile,
+                                             single=id is not None)
         session = self.session_maker()
+        query = session.query(CollectionObject).options(*loader.options)
         try:
             if id is not None:
-                all_collection_object = \
-                    session.query(CollectionObject).filter(
-                        CollectionObject.id == id).all()
+                all_collection_object = query.filter(
+                    CollectionObject.id == id).all()
                 if len(all_collection_object) == 0:
                     raise DataError(
                         message="Unable to find object: {}".format(id))
             else:
-                all_collection_object = \
-                    session.query(CollectionObject).filter(
-                        CollectionObject.project is not None).all()
+                all_collection_object = _page(
+                    query.filter(CollectionObject.project is not None),
+                    CollectionObject.id,
+                    limit=limit, after=after, offset=offset
+                ).all()
         except sqlalchemy.exc.DatabaseError as e:
             raise DataError(message="Unable to find object: {}".format(e))
 
@@ -379,7 +447,7 @@ class ObjectDataConnector(AbsNotesConnector):
             serialized_all_collection_object = []
             for collection_object in all_collection_object:
                 serialized_all_collection_object.append(
-                    collection_object.serialize(False)
+                    collection_object.serialize(loader.recurse)
                 )
 
             all_collection_object = serialized_all_collection_object
@@ -390,6 +458,84 @@ class ObjectDataConnector(AbsNotesConnector):
 
         return all_collection_object
 
+    def count(self) -> int:
+        return _count(self.session_maker, CollectionObject.id)
+
+    def get_in_project(self, project_id: int, object_id: int,
+                       serialize=False, profile=None):
+        """Get an object only if it belongs to the given project.
+
+        Only the object and its own relationships are loaded, not the rest
+        of the project.
+
+        Returns:
+            the object, or None if the project has no object with that id
+
+        """
+        loader = loader_profiles.get_profile(CollectionObject, profile,
+                                             single=True)
+        session = self.session_maker()
+        try:
+            collection_object = session.query(CollectionObject)\
+                .options(*loader.options)\
+                .filter(CollectionObject.id == object_id)\
+                .filter(CollectionObject.project_id == project_id)\
+                .first()
+            if collection_object is not None and serialize:
+                return collection_object.serialize(loader.recurse)
+            return collection_object
+        finally:
+            session.close()
+
+    def iter_project_objects(self, project_id: int, batch_size: int = 100,
+                             serialize=False,
+                             profile=None) -> Iterator[list]:
+        """Iterate over the objects of a project in batches.
+
+        Each batch is loaded with a separate session and a fixed number of
+        queries so only one batch of objects is in memory at a time.
+
+        Raises:
+            DataError: right away if the project does not exist
+
+        """
+        loader = loader_profiles.get_profile(CollectionObject, profile)
+        session = self.session_maker()
+        try:
+            if session.query(Project.id)\
+                    .filter(Project.id == project_id).first() is None:
+                raise DataError(
+                    message="Unable to locate project "
+                            "with ID: {}".format(project_id),
+                    status_code=404
+                )
+            object_ids = [
+                row.id for row in session.query(CollectionObject.id)
+                .filter(CollectionObject.project_id == project_id)
+                .order_by(CollectionObject.id)
+            ]
+        finally:
+            session.close()
+        return self._iter_batches(object_ids, batch_size, serialize, loader)
+
+    def _iter_batches(self, object_ids, batch_size, serialize, loader):
+        session_maker = sessions.unscoped(self.session_maker)
+        for start in range(0, len(object_ids), batch_size):
+            session = session_maker()
+            try:
+                records = session.query(CollectionObject)\
+                    .options(*loader.options)\
+                    .filter(CollectionObject.id.in_(
+                        object_ids[start:start + batch_size]))\
+                    .order_by(CollectionObject.id)\
+                    .all()
+                if serialize:
+                    records = [collection_object.serialize(loader.recurse)
+                               for collection_object in records]
+                yield records
+            finally:
+                session.close()
+
     def create(self, *args, **kwargs):
         name = kwargs["name"]
         data = self.get_data(kwargs)
@@ -463,7 +609,8 @@ class ObjectDataConnector(AbsNotesConnector):
     def delete(self, id):
         if id:
             session = self.session_maker()
-
+            cache.schedule_eviction(session, CollectionObject, id)
+            search.remove_records(session, CollectionObject, [id])
             items_deleted = session.query(CollectionObject)\
                 .filter(CollectionObject.id == id).delete()
 
@@ -473,11 +620,7 @@ class ObjectDataConnector(AbsNotesConnector):
         return False
 
     def get_note_types(self):
-        session = self.session_maker()
-        try:
-            return session.query(NoteTypes).all()
-        finally:
-            session.close()
+        return lookups.all_entries(self.session_maker, NoteTypes)
 
     def add_note(self, object_id: int,
                  note_type_id: int, note_text) -> None:
@@ -603,6 +746,34 @@ class ObjectDataConnector(AbsNotesConnector):
         finally:
             session.close()
 
+    def add_items(self, object_id, items):
+        """Add a batch of items, with their files, to an object.
+
+        Returns:
+            the ids of the new items and files, in the order given
+
+        """
+        new_items = batch.validate_items(items)
+        session = self.session_maker()
+        try:
+            if session.query(CollectionObject.id)\
+                    .filter(CollectionObject.id == object_id).first() is None:
+                raise DataError(
+                    message=f"Unable to locate object with ID: {object_id}",
+                    status_code=404
+                )
+            batch.check_references(session, items=new_items)
+            created = batch.insert_items(session, object_id, new_items)
+            batch.bump_versions(session)
+            cache.schedule_eviction(session, CollectionObject, object_id)
+            session.commit()
+            return created
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def remove_item(self, object_id, item_id):
         session = self.session_maker()
         try:
@@ -745,6 +916,7 @@ class FileNotesDataConnector(AbsDataProviderConnector):
     def delete(self, id):
         session = self.session_maker()
         try:
+            cache.schedule_eviction(session, FileNotes, id)
             items_deleted = session.query(FileNotes)\
                 .filter(FileNotes.id == id).delete()
 
@@ -757,20 +929,61 @@ class FileNotesDataConnector(AbsDataProviderConnector):
 
 
 class FilesDataConnector(AbsDataProviderConnector):
-    def get(self, id=None, serialize=False):
+    @cache.read_through(cache.FILE)
+    def get(self, id=None, serialize=False, profile=None):
+        loader = loader_profiles.get_profile(InstantiationFile, profile,
+                                             single=True)
         session = self.session_maker()
         try:
             matching_file = session.query(InstantiationFile)\
+                .options(*loader.options)\
                 .filter(InstantiationFile.file_id == id).one()
 
             if serialize is True:
-                res = matching_file.serialize(recurse=True)
+                res = matching_file.serialize(recurse=loader.recurse)
                 return res
 
             return matching_file
         finally:
             session.close()
 
+    def get_many(self, ids, serialize=False, profile=None):
+        """Get several files at once.
+
+        The files, their notes and their annotations are loaded with a fixed
+        number of queries no matter how many ids are given.
+
+        Args:
+            ids: ids of the files to get
+            serialize: return the serialized files instead of the records
+            profile: name of the loader profile to use
+
+        Returns:
+            files in the same order as the ids. Ids without a matching file
+            are skipped.
+
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+        loader = loader_profiles.get_profile(InstantiationFile, profile)
+        session = self.session_maker()
+        try:
+            matching_files = {
+                matching_file.file_id: matching_file
+                for matching_file in session.query(InstantiationFile)
+                .options(*loader.options)
+                .filter(InstantiationFile.file_id.in_(ids))
+            }
+            files = [matching_files[file_id]
+                     for file_id in ids if file_id in matching_files]
+            if serialize is True:
+                return [matching_file.serialize(recurse=loader.recurse)
+                        for matching_file in files]
+            return files
+        finally:
+            session.close()
+
     def create(self, item_id, *args, **kwargs):
         name = kwargs['file_name']
         generation = kwargs['generation']
@@ -791,6 +1004,33 @@ class FilesDataConnector(AbsDataProviderConnector):
         finally:
             session.close()
 
+    def create_many(self, item_id, files):
+        """Add a batch of files to an item in one transaction.
+
+        Returns:
+            the ids of the new files, in the order given
+
+        """
+        new_files = batch.validate_files(files)
+        session = self.session_maker()
+        try:
+            if session.query(AVFormat.table_id)\
+                    .filter(AVFormat.table_id == item_id).first() is None:
+                raise DataError(
+                    message=f"Unable to locate item with ID: {item_id}",
+                    status_code=404
+                )
+            created = batch.insert_files(session, item_id, new_files)
+            batch.bump_versions(session)
+            cache.schedule_eviction(session, AVFormat, item_id)
+            session.commit()
+            return created
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
     def update(self, id, changed_data):
         session = self.session_maker()
         try:
@@ -809,6 +1049,8 @@ class FilesDataConnector(AbsDataProviderConnector):
     def delete(self, id: int):
         session = self.session_maker()
         try:
+            cache.schedule_eviction(session, InstantiationFile, id)
+            search.remove_records(session, InstantiationFile, [id])
             items_deleted = session.query(InstantiationFile)\
                 .filter(InstantiationFile.file_id == id).delete()
 
@@ -836,53 +1078,34 @@ class FilesDataConnector(AbsDataProviderConnector):
 class ItemDataConnector(AbsNotesConnector):
 
     @staticmethod
-    def _get_all(session):
-        res = list(session.query(formats.Film).all()) + \
-              list(session.query(formats.AudioCassette).all()) + \
-              list(session.query(formats.AudioVideo).all()) + \
-              list(session.query(formats.GroovedDisc).all()) + \
-              list(session.query(formats.OpenReel).all()) + \
-              list(session.query(formats.CollectionItem).all())
-        if len(res) == 0:
-            res = list(session.query(formats.AVFormat)
-                       .all())
-        return res
+    def _polymorphic_query(session, profile=None) -> orm.Query:
+        """Build a query that loads every type of item in one round trip.
 
-    @staticmethod
-    def _iterall(session) -> Iterator[formats.AVFormat]:
-        yield from session.query(formats.Film).all()
-        yield from session.query(formats.AudioCassette).all()
-        yield from session.query(formats.AudioVideo).all()
-        yield from session.query(formats.GroovedDisc).all()
-        yield from session.query(formats.OpenReel).all()
-        yield from session.query(formats.CollectionItem).all()
+        The AVFormat joined-table hierarchy is loaded with a single outer join
+        over all the format tables so that each row comes back as the correct
+        subclass, and the relationships used by serialize() are eagerly
+        loaded in the same statement.
+        """
+        loader = loader_profiles.get_profile(formats.AVFormat, profile)
+        return session.query(loader_profiles.ITEMS).options(*loader.options)
 
-    @staticmethod
-    def _get_one(session, table_id: int):
-
-        res = list(session.query(formats.Film)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all()) + \
-              list(session.query(formats.AudioCassette)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all()) + \
-              list(session.query(formats.AudioVideo)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all()) + \
-              list(session.query(formats.GroovedDisc)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all()) + \
-              list(session.query(formats.OpenReel)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all()) + \
-              list(session.query(formats.CollectionItem)
-                   .filter(formats.AVFormat.table_id == table_id)
-                   .all())
-        if len(res) == 0:
-            res = list(session.query(formats.AVFormat)
-                       .filter(formats.AVFormat.table_id == table_id)
-                       .all())
-        return res
+    @classmethod
+    def _get_all(cls, session, limit=None, after=None, offset=None,
+                 profile=None):
+        query = cls._polymorphic_query(session, profile)
+        return _page(query, formats.AVFormat.table_id,
+                     limit=limit, after=after, offset=offset).all()
+
+    @classmethod
+    def _iterall(cls, session) -> Iterator[formats.AVFormat]:
+        yield from _page(cls._polymorphic_query(session),
+                         formats.AVFormat.table_id)
+
+    @classmethod
+    def _get_one(cls, session, table_id: int, profile=None):
+        return cls._polymorphic_query(session, profile)\
+            .filter(formats.AVFormat.table_id == table_id)\
+            .all()
 
     @staticmethod
     def _serialize(items):
@@ -893,13 +1116,17 @@ class ItemDataConnector(AbsNotesConnector):
 
         return serialized_all_collection_item
 
-    def get(self, id=None, serialize=False):
+    @cache.read_through(cache.ITEM)
+    def get(self, id=None, serialize=False, limit=None, after=None,
+            offset=None, profile=None):
         session = self.session_maker()
         try:
             if id is not None:
-                all_collection_item = self._get_one(session, id)
+                all_collection_item = self._get_one(session, id, profile)
             else:
-                all_collection_item = self._get_all(session)
+                all_collection_item = self._get_all(
+                    session, limit=limit, after=after, offset=offset,
+                    profile=profile)
 
             if serialize:
                 all_collection_item = self._serialize(all_collection_item)
@@ -911,6 +1138,9 @@ class ItemDataConnector(AbsNotesConnector):
         finally:
             session.close()
 
+    def count(self) -> int:
+        return _count(self.session_maker, formats.AVFormat.table_id)
+
     def add_note(self, item_id: int, note_text: str, note_type_id: int):
         session = self.session_maker()
         try:
@@ -1008,7 +1238,8 @@ class ItemDataConnector(AbsNotesConnector):
         if id:
             session = self.session_maker()
             try:
-
+                cache.schedule_eviction(session, CollectionItem, id)
+                search.remove_records(session, CollectionItem, [id])
                 items_deleted = session.query(CollectionItem)\
                     .filter(CollectionItem.table_id == id).delete()
 
@@ -1023,18 +1254,14 @@ class ItemDataConnector(AbsNotesConnector):
         return self.get(id, serialize)
 
     def get_note_types(self):
-        session = self.session_maker()
-        try:
-            return session.query(NoteTypes).all()
-        finally:
-            session.close()
+        return lookups.all_entries(self.session_maker, NoteTypes)
 
-    @staticmethod
-    def _get_item(item_id, session):
-        for i in ItemDataConnector._iterall(session):
-            if i.table_id == item_id:
-                return i
-        raise ValueError("Not a valid item")
+    @classmethod
+    def _get_item(cls, item_id, session):
+        matching_items = cls._get_one(session, item_id)
+        if len(matching_items) == 0:
+            raise ValueError("Not a valid item")
+        return matching_items[0]
 
     def remove_note(self, item_id, note_id):
         session = self.session_maker()
@@ -1162,15 +1389,18 @@ class AudioCassetteDataConnector(ItemDataConnector):
 
 class CollectionDataConnector(AbsDataProviderConnector):
 
-    def get(self, id=None, serialize=False):
+    def get(self, id=None, serialize=False, limit=None, after=None,
+            offset=None, profile=None):
+        loader = loader_profiles.get_profile(Collection, profile,
+                                             single=id is not None)
         session = self.session_maker()
+        query = session.query(Collection).options(*loader.options)
         if id:
-            all_collections = session.query(Collection)\
-                .filter(Collection.id == id)\
-                .all()
+            all_collections = query.filter(Collection.id == id).all()
         else:
-            all_collections = \
-                session.query(Collection).all()
+            all_collections = _page(query, Collection.id,
+                                    limit=limit, after=after, offset=offset)\
+                .all()
 
         if serialize:
             serialized_collections = []
@@ -1185,6 +1415,9 @@ class CollectionDataConnector(AbsDataProviderConnector):
 
         return all_collections
 
+    def count(self) -> int:
+        return _count(self.session_maker, Collection.id)
+
     def create(self, *args, **kwargs):
         collection_name = kwargs.get("collection_name")
         department = kwargs.get("department")
@@ -1243,37 +1476,36 @@ class CollectionDataConnector(AbsDataProviderConnector):
 
 
 class NotesDataConnector(AbsDataProviderConnector):
-
-    def get(self, id=None, serialize=False):
+    # Association tables linking notes to each kind of parent, and the key
+    # the ids of those parents are serialized under
+    PARENT_TABLES = (
+        ("parent_project_ids", project_has_notes_table, "project_id"),
+        ("parent_object_ids", object_has_notes_table, "object_id"),
+        ("parent_item_ids", item_has_notes_table, "item_id"),
+    )
+
+    def get(self, id=None, serialize=False, limit=None, after=None,
+            offset=None, profile=None, note_type_id=None):
+        loader = loader_profiles.get_profile(Note, profile,
+                                             single=id is not None)
         session = self.session_maker()
+        query = session.query(Note).options(*loader.options)
+        if note_type_id is not None:
+            query = query.filter(Note.note_type_id == note_type_id)
         if id:
-            all_notes = session.query(Note) \
-                .filter(Note.id == id) \
-                .all()
+            all_notes = query.filter(Note.id == id).all()
         else:
-            all_notes = \
-                session.query(Note).all()
+            all_notes = _page(query, Note.id,
+                              limit=limit, after=after, offset=offset)\
+                .all()
 
         if serialize:
+            parents = self.get_parent_ids(
+                session, [note.id for note in all_notes])
             serialized_notes = []
             for note in all_notes:
                 note_data = note.serialize()
-
-                projects_mentioned = [
-                    project.id for project in note.project_sources
-                ]
-                note_data['parent_project_ids'] = projects_mentioned
-
-                objects_mentioned = [
-                    obj.id for obj in note.object_sources
-                ]
-                note_data['parent_object_ids'] = objects_mentioned
-
-                items_mentioned = [
-                    obj.id for obj in note.item_source
-                ]
-                note_data['parent_item_ids'] = items_mentioned
-
+                note_data.update(parents[note.id])
                 serialized_notes.append(note_data)
             all_notes = serialized_notes
 
@@ -1284,6 +1516,44 @@ class NotesDataConnector(AbsDataProviderConnector):
 
         return all_notes
 
+    @classmethod
+    def get_parent_ids(cls, session, note_ids):
+        """Get the ids of the parents of each note with a single query."""
+        parents = {
+            note_id: {key: [] for key, _, _ in cls.PARENT_TABLES}
+            for note_id in note_ids
+        }
+        if not note_ids:
+            return parents
+
+        parent_queries = [
+            sqlalchemy.select([
+                sqlalchemy.literal(key).label("parent_key"),
+                table.c.notes_id.label("note_id"),
+                table.c[column_name].label("parent_id")
+            ]).where(table.c.notes_id.in_(note_ids))
+            for key, table, column_name in cls.PARENT_TABLES
+        ]
+        rows = session.execute(
+            sqlalchemy.union_all(*parent_queries)
+            .order_by("parent_key", "note_id", "parent_id")
+        )
+        for parent_key, note_id, parent_id in rows:
+            if parent_id is not None:
+                parents[note_id][parent_key].append(parent_id)
+        return parents
+
+    def count(self, note_type_id=None) -> int:
+        if note_type_id is None:
+            return _count(self.session_maker, Note.id)
+        session = self.session_maker()
+        try:
+            return session.query(sqlalchemy.func.count(Note.id))\
+                .filter(Note.note_type_id == note_type_id)\
+                .scalar()
+        finally:
+            session.close()
+
     def create(self, *args, **kwargs):
         note_types_id = kwargs.get("note_types_id")
         text = kwargs.get("text")
@@ -1328,6 +1598,8 @@ class NotesDataConnector(AbsDataProviderConnector):
     def delete(self, id):
         if id:
             session = self.session_maker()
+            cache.schedule_eviction(session, Note, id)
+            search.remove_records(session, Note, [id])
             items_deleted = session.query(Note) \
                 .filter(Note.id == id) \
                 .delete()
@@ -1339,26 +1611,48 @@ class NotesDataConnector(AbsDataProviderConnector):
 
 
 class DataProvider:
-    def __init__(self, engine):
+    def __init__(self, engine,
+                 cache_backend: Optional[cache.AbsCacheBackend] = None,
+                 lookup_ttl: Optional[float] = lookups.DEFAULT_TTL):
         self.engine = engine
         self.db_engine = engine
         # self.init_database()
-        self.db_session_maker = orm.sessionmaker(bind=self.db_engine)
+        session_info: Dict[str, Any] = {}
+        self.cache: Optional[cache.EntityCache] = None
+        if cache_backend is not None:
+            self.cache = cache.EntityCache(cache_backend)
+            session_info[cache.SESSION_INFO_KEY] = self.cache
+
+        self.lookup_cache: Optional[lookups.LookupCache] = None
+        if lookup_ttl:
+            self.lookup_cache = lookups.LookupCache(ttl=lookup_ttl)
+            session_info[lookups.SESSION_INFO_KEY] = self.lookup_cache
+
+        self.search_index = search.create_index(self.db_engine)
+        session_info[search.SESSION_INFO_KEY] = self.search_index
+
+        self.pool_metrics = pool_metrics.PoolMetrics()
+        self.pool_metrics.watch(self.db_engine)
+
+        self.db_session_maker = \
+            sessions.create_session_maker(self.db_engine, info=session_info)
+        versioning.track_changes(self.db_session_maker.session_factory)
+        search.track_changes(self.db_session_maker.session_factory)
+        if self.lookup_cache is not None:
+            lookups.track_changes(self.db_session_maker.session_factory)
+        if self.cache is not None:
+            cache.track_evictions(self.db_session_maker.session_factory)
 
     def init_database(self):
         database.init_database(self.engine)
 
     def get_formats(self, id=None, serialize=False):
         try:
-            session = self.db_session_maker()
-
+            all_formats = lookups.all_entries(self.db_session_maker,
+                                              formats.FormatTypes)
             if id:
-                all_formats = session.query(formats.FormatTypes)\
-                    .filter(formats.FormatTypes.id == id)\
-                    .all()
-            else:
-                all_formats = session.query(formats.FormatTypes).all()
-            session.close()
+                all_formats = [format_ for format_ in all_formats
+                               if format_.id == int(id)]
 
         except sqlalchemy.exc.DatabaseError as e:
             raise DataError("Enable to get all format. Reason: {}".format(e))
@@ -1368,6 +1662,15 @@ class DataProvider:
 
         return all_formats
 
+    def search(self, query: str, kinds: Optional[List[str]] = None,
+               limit: int = search.DEFAULT_LIMIT, offset: int = 0):
+        session = self.db_session_maker()
+        try:
+            return search.search(session, query, kinds, limit=limit,
+                                 offset=offset)
+        finally:
+            session.close()
+
 
 def get_schema_version(db_engine: sqlalchemy.engine.Engine) -> Optional[str]:
     """Get the alembic_version version of a given database.
@@ -1459,6 +1762,7 @@ class FileAnnotationsConnector(AbsDataProviderConnector):
     def delete(self, id):
         session = self.session_maker()
         try:
+            cache.schedule_eviction(session, FileAnnotation, id)
             items_deleted = session.query(FileAnnotation)\
                 .filter(FileAnnotation.id == id)\
                 .delete()
@@ -1526,6 +1830,23 @@ class EnumConnector(AbsDataProviderConnector, metaclass=ABCMeta):
     def enum_table(cls):
         pass
 
+    def get(self, id=None, serialize=False):
+        enum_entries = lookups.all_entries(self.session_maker,
+                                           self.enum_table)
+        if id is not None:
+            matches = [entry for entry in enum_entries
+                       if entry.table_id == int(id)]
+            if not matches:
+                return None
+            return matches[0].serialize() if serialize else matches[0]
+        if serialize:
+            return [entry.serialize() for entry in enum_entries]
+        return enum_entries
+
+    def invalidate(self) -> None:
+        """Reload the cached entries of the table after changing it."""
+        lookups.invalidate(self.session_maker, self.enum_table)
+
     def delete(self, id):
         session = self.session_maker()
         try:
@@ -1533,6 +1854,7 @@ class EnumConnector(AbsDataProviderConnector, metaclass=ABCMeta):
                 .filter(self.enum_table.table_id == id) \
                 .delete()
             session.commit()
+            self.invalidate()
             return enum_deleted > 0
         finally:
             session.close()
@@ -1554,6 +1876,7 @@ class EnumConnector(AbsDataProviderConnector, metaclass=ABCMeta):
             if "name" in changed_data:
                 enum.name = changed_data['name']
             session.commit()
+            self.invalidate()
             return enum.serialize()
         finally:
             session.close()
@@ -1562,27 +1885,6 @@ class EnumConnector(AbsDataProviderConnector, metaclass=ABCMeta):
 class CassetteTypeConnector(EnumConnector):
     enum_table = CassetteType
 
-    def get_all(self, session, serialize):
-        cassette_types = session.query(self.enum_table).all()
-        if serialize is False:
-            return cassette_types
-
-        enum_types = []
-        for i in cassette_types:
-            enum_types.append(i.serialize())
-        return enum_types
-
-    def get(self, id=None, serialize=False):
-        session = self.session_maker()
-        try:
-            if id is not None:
-                cassette_types = self.get_by_id(session, int(id), serialize)
-            else:
-                cassette_types = self.get_all(session, serialize)
-            return cassette_types
-        finally:
-            session.close()
-
     def create(self, *args, **kwargs):
         name = kwargs["name"]
         session = self.session_maker()
@@ -1594,6 +1896,7 @@ class CassetteTypeConnector(EnumConnector):
             session.add(new_cassette_type)
             session.flush()
             session.commit()
+            self.invalidate()
             return new_cassette_type.serialize()
         finally:
             session.close()
@@ -1606,34 +1909,13 @@ class CassetteTypeConnector(EnumConnector):
 class CassetteTapeTypeConnector(EnumConnector):
     enum_table = CassetteTapeType
 
-    def get(self, id=None, serialize=False):
-        session = self.session_maker()
-        try:
-            if id is not None:
-                cassette_types = session.query(CassetteTapeType).filter(
-                    CassetteTapeType.table_id == id
-                )
-            else:
-                cassette_types = session.query(CassetteTapeType).all()
-            if serialize is False:
-                return cassette_types
-
-            enum_types = []
-            for i in cassette_types:
-                enum_types.append(i.serialize())
-
-            if id is not None:
-                return enum_types[0]
-            return enum_types
-        finally:
-            session.close()
-
     def create(self, *args, **kwargs):
         new_tape_type = CassetteTapeType(name=kwargs['name'])
         session = self.session_maker()
         try:
             session.add(new_tape_type)
             session.commit()
+            self.invalidate()
             return new_tape_type.serialize()
         finally:
             session.close()
@@ -1642,28 +1924,6 @@ class CassetteTapeTypeConnector(EnumConnector):
 class CassetteTapeThicknessConnector(EnumConnector):
     enum_table = CassetteTapeThickness
 
-    def get(self, id=None, serialize=False):
-        session = self.session_maker()
-        try:
-            if id is not None:
-                cassette_types = session.query(self.enum_table).filter(
-                    CassetteTapeThickness.table_id == id
-                )
-            else:
-                cassette_types = session.query(self.enum_table).all()
-            if serialize is False:
-                return cassette_types
-
-            enum_types = []
-            for i in cassette_types:
-                enum_types.append(i.serialize())
-
-            if id is not None:
-                return enum_types[0]
-            return enum_types
-        finally:
-            session.close()
-
     def create(self, *args, **kwargs):
         session = self.session_maker()
         value = kwargs['value']
@@ -1674,6 +1934,7 @@ class CassetteTapeThicknessConnector(EnumConnector):
 
             session.add(new_thickness)
             session.commit()
+            self.invalidate()
             return new_thickness.serialize()
         finally:
             session.close()
@@ -1688,6 +1949,7 @@ class CassetteTapeThicknessConnector(EnumConnector):
                 matching_enum.unit = changed_data['unit']
 
             session.commit()
+            self.invalidate()
             return matching_enum.serialize()
         finally:
             session.close()
@@ -9,6 +9,8 @@ from .schema import formats
 from .schema import notes
 from .schema import projects
 from tyko import schema
+from tyko import search
+from tyko import versioning
 
 
 def init_database(engine) -> None:
@@ -28,6 +30,8 @@ def init_database(engine) -> None:
             version_table.insert().values(version_num=schema.ALEMBIC_VERSION)  # noqa: E501 pylint: disable=E1120
         session.execute(set_version_sql)
 
+    versioning.populate_versions(session.connection())
+    search.create_index(engine).create(session.connection())
     session.commit()
 
     for i in session.query(notes.NoteTypes):
@@ -138,6 +142,8 @@ def validate_tables(engine):
     valid = True
 
     for table in db.inspect(engine).get_table_names():
+        if search.is_index_table(table):
+            continue
         if table not in expected_table_names:
             print("Unexpected table found: {}".format(table))
             valid = False
@@ -1,7 +1,15 @@
+import functools
+import hashlib
 from functools import wraps
+from typing import Callable, Optional
 from flask import request
 from flask import make_response
 from flask import current_app as app
+from werkzeug.wrappers import Response
+
+from tyko.json_response import jsonify
+
+CACHE_HEADER = "private, max-age=0"
 
 
 def validate_users(username, password):
@@ -19,3 +27,81 @@ def authenticate(func):
             return resp
         return func(*args, **kwargs)
     return decorated
+
+
+def make_conditional(response: Response,
+                     etag: Optional[str] = None) -> Response:
+    """Tag a response with a strong ETag and honor If-None-Match.
+
+    Unless an ETag is given, it is the SHA-256 of the already encoded body so
+    the data is only serialized once. If the client already has the same
+    representation, the response is turned into a 304 Not Modified without a
+    body. A streamed response has no body to hash, so it is only tagged
+    when an ETag is given.
+    """
+    if response.status_code != 200:
+        return response
+
+    if response.is_streamed:
+        if etag is not None:
+            response.set_etag(etag)
+            response.headers.setdefault("Cache-Control", CACHE_HEADER)
+        return response
+
+    if etag is not None:
+        response.set_etag(etag)
+    elif response.get_etag()[0] is None:
+        response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+
+    if "Cache-Control" not in response.headers:
+        response.headers["Cache-Control"] = CACHE_HEADER
+
+    return response.make_conditional(request)
+
+
+def not_modified(etag: str) -> Response:
+    response = make_response("", 304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_HEADER
+    return response
+
+
+def conditional_response(func=None, *,
+                         version_tag: Optional[Callable[..., Optional[str]]]
+                         = None):
+    """Make the response of a GET handler conditional.
+
+    Anything that is not a response or a dict, such as the unserialized
+    records returned by a middleware get(serialize=False), is passed through
+    unchanged.
+
+    Args:
+        func: GET handler
+        version_tag: optional callable that is given the same arguments as
+            the handler and returns an ETag computed from the entity versions
+            the response is built from, or None. When the client already has
+            that ETag, a 304 is returned without calling the handler.
+
+    """
+    if func is None:
+        return functools.partial(conditional_response,
+                                 version_tag=version_tag)
+
+    @wraps(func)
+    def decorated(*args, **kwargs):
+        etag = None
+        if version_tag is not None and request.method in ("GET", "HEAD"):
+            etag = version_tag(*args, **kwargs)
+            if etag is not None and etag in request.if_none_match:
+                return not_modified(etag)
+
+        result = func(*args, **kwargs)
+        if not isinstance(result, (dict, Response)) \
+                or request.method not in ("GET", "HEAD"):
+            return result
+
+        if isinstance(result, dict):
+            result = jsonify(result)
+
+        return make_conditional(result, etag)
+    return decorated
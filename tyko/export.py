@@ -0,0 +1,309 @@
+"""Streaming export of the whole catalogue as JSON lines or CSV.
+
+Every table is read in batches of rows ordered by primary key, each batch
+starting after the last key of the previous one. A batch is read in full
+before anything else is queried, such as the parents of the notes, so no
+result set is left open on the connection, which MySQL does not allow.
+Only one batch of rows is held in memory at a time however large the
+catalogue is.
+
+Records are flat and refer to their parents by id. In JSON lines every
+record has a "type" key naming its entity and all the entities are written
+one after the other. CSV has a fixed set of columns so only one entity can
+be exported at a time. Values that are not scalars, such as the format
+details of an item, are written as JSON in a CSV cell.
+"""
+import csv
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, \
+    Optional, Sequence
+
+from sqlalchemy import orm
+
+from .exceptions import DataError
+from .schema import formats
+from .schema.instantiation import FileAnnotation, FileAnnotationType, \
+    FileNotes, InstantiationFile
+from .schema.notes import Note, NoteTypes
+from .schema.objects import CollectionObject
+from .schema.projects import Project, ProjectStatus
+from . import data_provider as dp
+from . import sessions
+
+Record = Dict[str, Any]
+
+FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Small tables that the exported records point to. They are loaded before
+# the export so the many to one relationships are found in the identity map
+# instead of being loaded one row at a time.
+LOOKUP_TABLES = (
+    ProjectStatus,
+    formats.FormatTypes,
+    formats.CassetteType,
+    formats.CassetteTapeType,
+    formats.CassetteTapeThickness,
+    NoteTypes,
+    FileAnnotationType,
+)
+
+
+def _project(project: Project) -> Record:
+    return {
+        "project_id": project.id,
+        "project_code": project.project_code,
+        "title": project.title,
+        "current_location": project.current_location,
+        "status": project.status.name if project.status is not None
+        else None,
+    }
+
+
+def _object(collection_object: CollectionObject) -> Record:
+    return {
+        "object_id": collection_object.id,
+        "project_id": collection_object.project_id,
+        "collection_id": collection_object.collection_id,
+        "name": collection_object.name,
+        "barcode": collection_object.barcode,
+        "originals_rec_date": CollectionObject.serialize_date(
+            collection_object.originals_rec_date),
+        "originals_return_date": CollectionObject.serialize_date(
+            collection_object.originals_return_date),
+    }
+
+
+def _item(item: formats.AVFormat) -> Record:
+    return {
+        "item_id": item.table_id,
+        "object_id": item.object_id,
+        "name": item.name,
+        "obj_sequence": item.obj_sequence,
+        "format_id": item.format_type_id,
+        "format": item.format_type.name if item.format_type is not None
+        else None,
+        "format_details": item.format_details(),
+    }
+
+
+def _file(instantiation_file: InstantiationFile) -> Record:
+    return {
+        "file_id": instantiation_file.file_id,
+        "item_id": instantiation_file.item_id,
+        "file_name": instantiation_file.file_name,
+        "generation": instantiation_file.generation,
+        "filesize": instantiation_file.filesize,
+        "filesize_unit": instantiation_file.filesize_unit,
+    }
+
+
+def _note(note: Note) -> Record:
+    return {
+        "note_id": note.id,
+        "note_type_id": note.note_type_id,
+        "note_type": note.note_type.name if note.note_type is not None
+        else None,
+        "text": note.text,
+    }
+
+
+def _file_note(file_note: FileNotes) -> Record:
+    return {
+        "note_id": file_note.id,
+        "file_id": file_note.file_id,
+        "message": file_note.message,
+    }
+
+
+def _annotation(annotation: FileAnnotation) -> Record:
+    return {
+        "annotation_id": annotation.id,
+        "file_id": annotation.file_id,
+        "type_id": annotation.type_id,
+        "type": annotation.annotation_type.name
+        if annotation.annotation_type is not None else None,
+        "content": annotation.annotation_content,
+    }
+
+
+class Entity:
+    """How the rows of one entity are queried and turned into records."""
+
+    def __init__(self, name: str, query: Callable[[orm.Session], orm.Query],
+                 key, to_record: Callable[[Any], Record],
+                 fields: Sequence[str]) -> None:
+        self.name = name
+        self.query = query
+        self.key = key
+        self.to_record = to_record
+        self.fields = fields
+
+    def records(self, session, batch_size: int) -> Iterator[List[Record]]:
+        after = None
+        while True:
+            query = self.query(session)
+            if after is not None:
+                query = query.filter(self.key > after)
+            batch = query.order_by(self.key).limit(batch_size).all()
+            if not batch:
+                return
+            after = getattr(batch[-1], self.key.key)
+            yield self.resolve_batch(session,
+                                     [self.to_record(row) for row in batch])
+
+    def resolve_batch(self, session,  # pylint: disable=unused-argument
+                      records: List[Record]) -> List[Record]:
+        return records
+
+
+class NoteEntity(Entity):
+    """Notes, with the ids of the projects, objects and items they are on."""
+
+    def resolve_batch(self, session, records: List[Record]) -> List[Record]:
+        parents = dp.NotesDataConnector.get_parent_ids(
+            session, [record["note_id"] for record in records])
+        for record in records:
+            record.update(parents[record["note_id"]])
+        return records
+
+
+ENTITIES = {
+    entity.name: entity for entity in [
+        Entity("project",
+               lambda session: session.query(Project), Project.id,
+               _project,
+               ["project_id", "project_code", "title", "current_location",
+                "status"]),
+        Entity("object",
+               lambda session: session.query(CollectionObject),
+               CollectionObject.id,
+               _object,
+               ["object_id", "project_id", "collection_id", "name",
+                "barcode", "originals_rec_date", "originals_return_date"]),
+        Entity("item",
+               lambda session: session.query(
+                   orm.with_polymorphic(formats.AVFormat, "*")),
+               formats.AVFormat.table_id,
+               _item,
+               ["item_id", "object_id", "name", "obj_sequence", "format_id",
+                "format", "format_details"]),
+        Entity("file",
+               lambda session: session.query(InstantiationFile),
+               InstantiationFile.file_id,
+               _file,
+               ["file_id", "item_id", "file_name", "generation", "filesize",
+                "filesize_unit"]),
+        NoteEntity("note",
+                   lambda session: session.query(Note), Note.id,
+                   _note,
+                   ["note_id", "note_type_id", "note_type", "text",
+                    "parent_project_ids", "parent_object_ids",
+                    "parent_item_ids"]),
+        Entity("file_note",
+               lambda session: session.query(FileNotes), FileNotes.id,
+               _file_note,
+               ["note_id", "file_id", "message"]),
+        Entity("annotation",
+               lambda session: session.query(FileAnnotation),
+               FileAnnotation.id,
+               _annotation,
+               ["annotation_id", "file_id", "type_id", "type", "content"]),
+    ]
+}
+
+
+def get_entities(file_format: str,
+                 entity_names: Optional[Iterable[str]] = None
+                 ) -> List[Entity]:
+    """Check the export arguments and get the entities to export.
+
+    Raises:
+        DataError: if the format or an entity is unknown, or if more than
+            one entity is exported as CSV
+
+    """
+    if file_format not in FORMATS:
+        raise DataError(
+            message=f"Unsupported export format: {file_format}",
+            status_code=400)
+    names = list(entity_names or ENTITIES)
+    unknown = [name for name in names if name not in ENTITIES]
+    if unknown:
+        raise DataError(
+            message=f"Unknown entity: {', '.join(unknown)}. "
+                    f"Expected one of {', '.join(ENTITIES)}",
+            status_code=400)
+    if file_format == "csv" and len(names) != 1:
+        raise DataError(message="Export one entity at a time as CSV",
+                        status_code=400)
+    return [ENTITIES[name] for name in names]
+
+
+def _jsonl_chunk(entity: Entity, records: List[Record]) -> str:
+    return "".join(
+        json.dumps({"type": entity.name, **record}) + "\n"
+        for record in records
+    )
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _csv_chunk(entity: Entity, records: List[Record]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=entity.fields)
+    for record in records:
+        writer.writerow({key: _csv_value(value)
+                         for key, value in record.items()})
+    return buffer.getvalue()
+
+
+def stream_catalogue(session_maker, file_format: str = "jsonl",
+                     entity_names: Optional[Iterable[str]] = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """Export the catalogue in chunks of text, one chunk per batch of rows.
+
+    The arguments are checked before this returns, so errors can be
+    reported before a response is started.
+
+    Args:
+        session_maker: session maker of the data provider
+        file_format: jsonl or csv
+        entity_names: names of the entities to export, all of them if None
+        batch_size: number of rows fetched from the database at a time
+
+    """
+    entities = get_entities(file_format, entity_names)
+    return _stream(sessions.unscoped(session_maker), entities, file_format,
+                   batch_size)
+
+
+def _stream(session_factory, entities: List[Entity], file_format: str,
+            batch_size: int) -> Iterator[str]:
+    session = session_factory()
+    try:
+        # Keep a reference to the lookup rows for the whole export
+        lookups = [session.query(table).all() for table in LOOKUP_TABLES]
+        for entity in entities:
+            if file_format == "csv":
+                buffer = io.StringIO()
+                csv.DictWriter(buffer, fieldnames=entity.fields)\
+                    .writeheader()
+                yield buffer.getvalue()
+                to_chunk = _csv_chunk
+            else:
+                to_chunk = _jsonl_chunk
+            for records in entity.records(session, batch_size):
+                yield to_chunk(entity, records)
+        del lookups
+    finally:
+        session.close()
@@ -0,0 +1,91 @@
+"""Checks that the ids of a nested route belong to each other.
+
+A route such as /api/project/1/object/2/item/3/files?id=4 names a file by
+its whole path. check_path() makes sure that file 4 is a file of item 3,
+which is an item of object 2, which is an object of project 1, with a
+single query. The query starts from the deepest record of the path and
+joins up through the foreign keys, so it only reads one row per level
+whatever the size of the project.
+"""
+from typing import List, NamedTuple, Optional
+
+from .exceptions import DataError
+from .schema.formats import AVFormat
+from .schema.instantiation import InstantiationFile
+from .schema.objects import CollectionObject
+from .schema.projects import Project
+
+
+class _Level(NamedTuple):
+    name: str
+    model: type
+    key: object
+    parent_key: Optional[object]
+
+
+LEVELS = [
+    _Level("project", Project, Project.id, None),
+    _Level("object", CollectionObject, CollectionObject.id,
+           CollectionObject.project_id),
+    _Level("item", AVFormat, AVFormat.table_id, AVFormat.object_id),
+    _Level("file", InstantiationFile, InstantiationFile.file_id,
+           InstantiationFile.item_id),
+]
+
+
+def path_exists(session, project_id: Optional[int] = None,
+                object_id: Optional[int] = None,
+                item_id: Optional[int] = None,
+                file_id: Optional[int] = None) -> bool:
+    """Check if the records of a path exist and belong to each other.
+
+    Levels left as None are not checked, so path_exists(session,
+    project_id=1, item_id=3) checks that item 3 is in an object of
+    project 1.
+    """
+    ids: List[Optional[int]] = [project_id, object_id, item_id, file_id]
+    given = [level for level, id_ in enumerate(ids) if id_ is not None]
+    if not given:
+        raise ValueError("No ids to check")
+
+    child = given[-1]
+    query = session.query(LEVELS[child].key)\
+        .filter(LEVELS[child].key == ids[child])
+    for parent in range(child - 1, -1, -1):
+        if ids[parent] is not None:
+            query = query.filter(LEVELS[child].parent_key == ids[parent])
+        if given[0] >= parent:
+            break
+        query = query.join(LEVELS[parent].model,
+                           LEVELS[parent].key == LEVELS[child].parent_key)
+        child = parent
+    return query.first() is not None
+
+
+def describe_path(project_id: Optional[int] = None,
+                  object_id: Optional[int] = None,
+                  item_id: Optional[int] = None,
+                  file_id: Optional[int] = None) -> str:
+    ids = [project_id, object_id, item_id, file_id]
+    return ", ".join(f"{level.name} {id_}"
+                     for level, id_ in zip(LEVELS, ids) if id_ is not None)
+
+
+def check_path(session_maker, project_id: Optional[int] = None,
+               object_id: Optional[int] = None,
+               item_id: Optional[int] = None,
+               file_id: Optional[int] = None) -> None:
+    """Make sure the records of a path exist and belong to each other.
+
+    Raises:
+        DataError: with a 404 status if they do not
+
+    """
+    session = session_maker()
+    try:
+        found = path_exists(session, project_id, object_id, item_id, file_id)
+    finally:
+        session.close()
+    if not found:
+        path = describe_path(project_id, object_id, item_id, file_id)
+        raise DataError(message=f"No record matches {path}", status_code=404)
@@ -0,0 +1,326 @@
+"""Bulk import of legacy inventories from CSV or JSON lines files.
+
+Every row of the file is one item. The rows are streamed through a chain of
+generators, read, converted to mapped objects and inserted, so only one
+batch of rows is held in memory at a time whatever the size of the file.
+
+Columns of a row:
+
+project
+    title of the project. Created if there is no project with that title,
+    with the optional project_code and project_status columns
+object
+    name of the object the item belongs to. Consecutive rows with the same
+    project, object and barcode columns are items of the same object, so
+    the rows of an object must be next to each other
+barcode, originals_rec_date
+    optional details of the object
+format
+    name of the format type of the item, such as "audio cassette"
+name, obj_sequence
+    the item itself
+
+The other columns are the format specific details, named after the columns
+of the format table, such as track_count for an open reel. Audio cassettes
+take the names of their cassette_type, tape_type and tape_thickness, and
+dates are written as MM-DD-YYYY, MM-YYYY or YYYY.
+
+Lookup tables are read once into memory. Rows that cannot be imported are
+reported and skipped.
+"""
+import csv
+import functools
+import itertools
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, \
+    Optional, TextIO, Tuple, cast
+
+import sqlalchemy
+from sqlalchemy import orm
+
+from .schema import formats
+from .schema.objects import CollectionObject
+from .schema.projects import Project, ProjectStatus
+from . import utils
+
+Row = Dict[str, Any]
+
+# kind of lookup: (mapped class, name attribute, id attribute)
+LOOKUP_TABLES = {
+    "format": (formats.FormatTypes, "name", "id"),
+    "cassette_type": (formats.CassetteType, "name", "table_id"),
+    "tape_type": (formats.CassetteTapeType, "name", "table_id"),
+    "tape_thickness": (formats.CassetteTapeThickness, "value", "table_id"),
+    "project_status": (ProjectStatus, "name", "id"),
+}
+
+
+class ImportRowError(Exception):
+    """A row that cannot be imported."""
+
+
+@dataclass
+class ImportSummary:
+    rows: int = 0
+    skipped: int = 0
+    objects: int = 0
+    projects: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Row]]:
+    """Read the rows of a CSV or JSON lines file.
+
+    Empty values are left out of the rows.
+
+    Yields:
+        line number and row
+
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, _without_empty_values(row)
+    elif file_format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip() == "":
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                raise ImportRowError(
+                    f"Line {line_number} is not a JSON object")
+            yield line_number, _without_empty_values(row)
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+
+def _without_empty_values(row: Row) -> Row:
+    return {
+        key.strip(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if key is not None and value is not None and str(value).strip() != ""
+    }
+
+
+class Lookups:
+    """Ids of the lookup table entries, read once by name."""
+
+    def __init__(self, session) -> None:
+        self.session = session
+        self._tables: Dict[str, Dict[str, int]] = {}
+        self._projects: Dict[str, int] = {}
+
+    def resolve(self, kind: str, name) -> int:
+        table = self._tables.get(kind)
+        if table is None:
+            mapped_class, name_attribute, id_attribute = LOOKUP_TABLES[kind]
+            table = self._tables[kind] = {
+                str(entry_name).lower(): entry_id for entry_name, entry_id in
+                self.session.query(getattr(mapped_class, name_attribute),
+                                   getattr(mapped_class, id_attribute))
+            }
+        try:
+            return table[str(name).lower()]
+        except KeyError as error:
+            raise ImportRowError(f"Unknown {kind} {name}") from error
+
+    def project_id(self, row: Row, summary: ImportSummary) -> int:
+        title = row.get("project")
+        if title is None:
+            raise ImportRowError("project is required")
+        project_id = self._projects.get(title)
+        if project_id is None:
+            project = self.session.query(Project.id)\
+                .filter(Project.title == title).first()
+            if project is None:
+                project = self._create_project(title, row)
+                summary.projects += 1
+            project_id = self._projects[title] = project.id
+        return project_id
+
+    def _create_project(self, title: str, row: Row) -> Project:
+        project = Project(title=title, project_code=row.get("project_code"))
+        if "project_status" in row:
+            project.status_id = self.resolve("project_status",
+                                             row["project_status"])
+        self.session.add(project)
+        self.session.flush()
+        return project
+
+
+def _integer(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError) as error:
+        raise ImportRowError(f"{value} is not an integer") from error
+
+
+def _precision_date(value) -> Tuple[Any, int]:
+    try:
+        precision = utils.identify_precision(str(value))
+        return utils.create_precision_datetime(str(value), precision), \
+            precision
+    except (AttributeError, ValueError) as error:
+        raise ImportRowError(f"{value} is not a valid date") from error
+
+
+def _date(value):
+    return _precision_date(value)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def details_columns(format_class) -> List[Tuple[str, str, Callable]]:
+    """Get the format specific columns of a format table.
+
+    Returns:
+        name of each column, attribute it is mapped to and a conversion for
+        the values read from a file
+
+    """
+    mapper = orm.class_mapper(format_class)
+    columns = []
+    for column in mapper.local_table.columns:
+        if column.primary_key or column.foreign_keys:
+            continue
+        if isinstance(column.type, sqlalchemy.Integer):
+            convert: Callable = _integer
+        elif isinstance(column.type, sqlalchemy.Date):
+            convert = _date
+        else:
+            convert = str
+        columns.append(
+            (column.name, mapper.get_property_by_column(column).key, convert))
+    return columns
+
+
+def _set_cassette_details(cassette: formats.AudioCassette, row: Row,
+                          lookups: Lookups) -> None:
+    if "cassette_type" not in row:
+        raise ImportRowError("cassette_type is required for audio cassettes")
+    cassette.cassette_format_type_id = \
+        lookups.resolve("cassette_type", row["cassette_type"])
+    if "tape_type" in row:
+        cassette.tape_type_id = lookups.resolve("tape_type", row["tape_type"])
+    if "tape_thickness" in row:
+        cassette.tape_thickness_id = \
+            lookups.resolve("tape_thickness", row["tape_thickness"])
+    if "inspection_date" in row:
+        cassette.inspection_date = _date(row["inspection_date"])
+    if "date_recorded" in row:
+        cassette.recording_date, cassette.recording_date_precision = \
+            _precision_date(row["date_recorded"])
+
+
+def create_item(row: Row, lookups: Lookups) -> formats.AVFormat:
+    """Create the item described by a row, without its object."""
+    if "name" not in row:
+        raise ImportRowError("name is required")
+    if "format" not in row:
+        raise ImportRowError("format is required")
+
+    format_id = lookups.resolve("format", row["format"])
+    format_class: type = formats.CollectionItem
+    for type_id, *item_classes in formats.format_types.values():
+        if type_id == format_id and item_classes:
+            format_class = cast(type, item_classes[0])
+    item = format_class(name=row["name"], format_type_id=format_id)
+    if "obj_sequence" in row:
+        item.obj_sequence = _integer(row["obj_sequence"])
+
+    if format_class is formats.AudioCassette:
+        _set_cassette_details(item, row, lookups)
+    elif format_class is not formats.CollectionItem:
+        for column_name, attribute, convert in details_columns(format_class):
+            if column_name in row:
+                setattr(item, attribute, convert(row[column_name]))
+    return item
+
+
+def _object_key(row: Row) -> Tuple:
+    return row.get("project"), row.get("object"), row.get("barcode")
+
+
+def create_items(rows: Iterable[Tuple[int, Row]], lookups: Lookups,
+                 summary: ImportSummary,
+                 on_error: Callable[[int, str], None]
+                 ) -> Iterator[formats.AVFormat]:
+    """Turn rows into items attached to their objects.
+
+    Rows that cannot be imported are passed to on_error with their line
+    number and skipped.
+    """
+    current_key: Optional[Tuple] = None
+    current_object: Optional[CollectionObject] = None
+    for line_number, row in rows:
+        try:
+            item = create_item(row, lookups)
+            key = _object_key(row)
+            if current_object is None or key != current_key:
+                current_object = _create_object(row, lookups, summary)
+                current_key = key
+        except ImportRowError as error:
+            summary.skipped += 1
+            on_error(line_number, str(error))
+            continue
+        item.object = current_object
+        yield item
+
+
+def _create_object(row: Row, lookups: Lookups,
+                   summary: ImportSummary) -> CollectionObject:
+    if "object" not in row:
+        raise ImportRowError("object is required")
+    new_object = CollectionObject(name=row["object"],
+                                  barcode=row.get("barcode"))
+    if "originals_rec_date" in row:
+        new_object.originals_rec_date = _date(row["originals_rec_date"])
+    new_object.project_id = lookups.project_id(row, summary)
+    summary.objects += 1
+    return new_object
+
+
+def import_rows(session, rows: Iterable[Tuple[int, Row]],
+                batch_size: int = 500,
+                on_error: Optional[Callable[[int, str], None]] = None,
+                on_progress: Optional[Callable[[ImportSummary], None]] = None
+                ) -> ImportSummary:
+    """Import rows as returned by read_rows(), committing every batch.
+
+    Args:
+        session: session to insert with. It is committed after every batch
+        rows: line numbers and rows to import
+        batch_size: number of items inserted per transaction
+        on_error: called with the line number and reason of every row
+            skipped
+        on_progress: called with the summary so far after every batch
+
+    """
+    summary = ImportSummary()
+    start = time.perf_counter()
+    items = create_items(rows, Lookups(session), summary,
+                         on_error or (lambda line_number, reason: None))
+    try:
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if not batch:
+                break
+            session.add_all(batch)
+            session.commit()
+            summary.rows += len(batch)
+            summary.seconds = time.perf_counter() - start
+            if on_progress is not None:
+                on_progress(summary)
+    except Exception:
+        session.rollback()
+        raise
+    summary.seconds = time.perf_counter() - start
+    return summary
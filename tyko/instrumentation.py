@@ -0,0 +1,258 @@
+"""Request and database metrics in the Prometheus text exposition format.
+
+Every view function registered by tyko.routes.Routes is wrapped so the time
+spent handling a request, the size of the response and the number and
+duration of the SQL statements executed while handling it are recorded
+for its endpoint. The metrics, together with the connection pool metrics,
+are served at /metrics.
+
+The cost per request is a few calls to time.perf_counter() and one lock to
+update the counters, so it is meant to be left enabled. It can be turned off
+with TYKO_METRICS = False in the config.
+"""
+import bisect
+import functools
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, \
+    Sequence, Tuple
+
+from flask import make_response, request
+from sqlalchemy import event
+
+from .pool_metrics import PoolMetrics
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: Labels) -> Iterator[str]:
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative += bucket_count
+            yield _sample(f"{name}_bucket",
+                          labels + (("le", _format_value(bound)),),
+                          cumulative)
+        yield _sample(f"{name}_bucket", labels + (("le", "+Inf"),),
+                      self.count)
+        yield _sample(f"{name}_sum", labels, self.sum)
+        yield _sample(f"{name}_count", labels, self.count)
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")\
+        .replace('"', '\\"')
+
+
+def _sample(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(label)}"'
+                              for key, label in labels)
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+class _RequestState(threading.local):
+    active = False
+    statements = 0
+    sql_seconds = 0.0
+
+
+class Instrumentation:
+    """Collect the metrics of the requests handled by a Flask app.
+
+    Args:
+        pool_metrics: metrics of the connection pool to include
+        enabled: if False, instrument() returns the view functions as they
+            are
+
+    """
+
+    def __init__(self, pool_metrics: Optional[PoolMetrics] = None,
+                 enabled: bool = True) -> None:
+        self.pool_metrics = pool_metrics
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._state = _RequestState()
+        self._latency: Dict[Labels, Histogram] = {}
+        self._response_size: Dict[Labels, Histogram] = {}
+        self._statements: Dict[Labels, Histogram] = {}
+        self._sql_seconds: Dict[Labels, float] = {}
+        self._responses: Dict[Labels, int] = {}
+
+    def watch(self, engine) -> None:
+        """Count the SQL statements executed through the engine."""
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute",
+                     self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute",
+                     self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, *args) -> None:
+        # A connection runs one statement at a time, so a statement that
+        # fails only leaves a start time for the next one to replace
+        conn.info["tyko_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, *args) -> None:
+        start = conn.info.pop("tyko_query_start", None)
+        if start is None:
+            return
+        state = self._state
+        if state.active:
+            state.statements += 1
+            state.sql_seconds += time.perf_counter() - start
+
+    def instrument(self, view_func: Callable) -> Callable:
+        """Wrap a view function to record the metrics of its endpoint."""
+        if not self.enabled:
+            return view_func
+
+        @functools.wraps(view_func)
+        def wrapper(*args, **kwargs):
+            state = self._state
+            state.active = True
+            state.statements = 0
+            state.sql_seconds = 0.0
+            start = time.perf_counter()
+            try:
+                response = make_response(view_func(*args, **kwargs))
+            except Exception as error:
+                self._record(
+                    time.perf_counter() - start,
+                    getattr(error, "code", None) or
+                    getattr(error, "status_code", 500),
+                    None
+                )
+                raise
+            finally:
+                state.active = False
+
+            self._record(time.perf_counter() - start,
+                         response.status_code,
+                         response.calculate_content_length())
+            return response
+        return wrapper
+
+    def _record(self, seconds: float, status_code: int,
+                size: Optional[int]) -> None:
+        state = self._state
+        endpoint = (("endpoint", str(request.endpoint)),)
+        labels = endpoint + (("method", request.method),)
+        with self._lock:
+            self._histogram(self._latency, labels,
+                            LATENCY_BUCKETS).observe(seconds)
+            status = labels + (("status", str(status_code)),)
+            self._responses[status] = self._responses.get(status, 0) + 1
+            if size is not None:
+                self._histogram(self._response_size, endpoint,
+                                SIZE_BUCKETS).observe(size)
+            self._histogram(self._statements, endpoint,
+                            STATEMENT_BUCKETS).observe(state.statements)
+            self._sql_seconds[endpoint] = \
+                self._sql_seconds.get(endpoint, 0.0) + state.sql_seconds
+
+    @staticmethod
+    def _histogram(histograms: Dict[Labels, Histogram], labels: Labels,
+                   buckets: Sequence[float]) -> Histogram:
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = Histogram(buckets)
+        return histogram
+
+    def render(self) -> str:
+        """Get all the metrics in the text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            self._render_histograms(
+                lines, "tyko_http_request_duration_seconds",
+                "Time spent handling requests", self._latency)
+            self._render_values(
+                lines, "tyko_http_responses_total", "counter",
+                "Responses returned", self._responses)
+            self._render_histograms(
+                lines, "tyko_http_response_size_bytes",
+                "Size of the responses with a known length",
+                self._response_size)
+            self._render_histograms(
+                lines, "tyko_sql_statements_per_request",
+                "SQL statements executed while handling a request",
+                self._statements)
+            self._render_values(
+                lines, "tyko_sql_duration_seconds_total", "counter",
+                "Time spent executing SQL statements", self._sql_seconds)
+        if self.pool_metrics is not None:
+            self._render_pool(lines, self.pool_metrics.snapshot())
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines: List[str], name: str, description: str,
+                           histograms: Dict[Labels, Histogram]) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in sorted(histograms.items()):
+            lines.extend(histogram.samples(name, labels))
+
+    @staticmethod
+    def _render_values(lines: List[str], name: str, metric_type: str,
+                       description: str,
+                       values: Mapping[Labels, float]) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(values.items()):
+            lines.append(_sample(name, labels, value))
+
+    @classmethod
+    def _render_pool(cls, lines: List[str], snapshot: Dict) -> None:
+        metrics = [
+            ("checkouts", "counter", "Connections handed out by the pool"),
+            ("checkins", "counter", "Connections given back to the pool"),
+            ("connects", "counter", "Connections opened to the database"),
+            ("invalidations", "counter", "Connections discarded"),
+            ("wait_seconds_total", "counter",
+             "Time spent waiting for a connection"),
+            ("wait_seconds_max", "gauge",
+             "Longest time spent waiting for a connection"),
+            ("size", "gauge", "Connections kept by the pool"),
+            ("checked_out", "gauge", "Connections currently in use"),
+            ("overflow", "gauge", "Connections opened over the pool size"),
+        ]
+        for key, metric_type, description in metrics:
+            if key not in snapshot:
+                continue
+            name = f"tyko_db_pool_{key}"
+            if metric_type == "counter" and not name.endswith("_total"):
+                name = f"{name}_total"
+            cls._render_values(lines, name, metric_type, description,
+                               {(): snapshot[key]})
+
+    def metrics_view(self):
+        response = make_response(self.render(), 200)
+        response.headers["Content-Type"] = CONTENT_TYPE
+        return response
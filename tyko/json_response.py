@@ -0,0 +1,199 @@
+"""JSON responses of the API.
+
+jsonify() replaces flask.jsonify for the API. The document is encoded by
+the encoder selected with TYKO_JSON_ENCODER in the config:
+
+"auto" or None
+    orjson if it is installed, otherwise the json module
+"orjson"
+    orjson, which is several times faster on the large documents of the
+    list endpoints. It has to be installed
+"stdlib"
+    the json module of the standard library
+
+Both encoders write date and datetime values in ISO 8601, as the
+serialize_date() of the schema does, and sort the keys unless
+JSON_SORT_KEYS is False.
+
+stream_list() is used by list endpoints asked for every record. The
+records are encoded and sent one batch at a time, so only one batch is held
+in memory whatever the number of records.
+"""
+import abc
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from flask import Flask, Response, current_app, stream_with_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+EXTENSION_KEY = "tyko_json"
+
+# Number of records fetched and encoded at a time by stream_list()
+DEFAULT_BATCH_SIZE = 500
+
+
+def _default(value: Any) -> Any:
+    """Convert the values the encoders do not know to JSON types."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(
+        f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class AbsJSONEncoder(abc.ABC):
+    name: str
+
+    @abc.abstractmethod
+    def dumps(self, data: Any, sort_keys: bool = True) -> bytes:
+        """Encode data as a compact UTF-8 JSON document."""
+
+
+class StdlibJSONEncoder(AbsJSONEncoder):
+    name = "stdlib"
+
+    def dumps(self, data: Any, sort_keys: bool = True) -> bytes:
+        return json.dumps(data, default=_default, sort_keys=sort_keys,
+                          separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonEncoder(AbsJSONEncoder):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ValueError("The orjson JSON encoder requires the orjson "
+                             "package")
+
+    def dumps(self, data: Any, sort_keys: bool = True) -> bytes:
+        options = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=_default, option=options)
+
+
+ENCODERS = {
+    StdlibJSONEncoder.name: StdlibJSONEncoder,
+    OrjsonEncoder.name: OrjsonEncoder,
+}
+
+
+def create_encoder(config) -> AbsJSONEncoder:
+    """Create the JSON encoder selected in the application config."""
+    encoder_name = config.get("TYKO_JSON_ENCODER") or "auto"
+    if encoder_name == "auto":
+        encoder_name = "orjson" if orjson is not None else "stdlib"
+    try:
+        return ENCODERS[encoder_name]()
+    except KeyError as error:
+        raise ValueError(
+            f"Unknown JSON encoder: {encoder_name}") from error
+
+
+def init_app(app: Flask, encoder: AbsJSONEncoder) -> None:
+    app.extensions[EXTENSION_KEY] = encoder
+
+
+def get_encoder() -> AbsJSONEncoder:
+    encoder = current_app.extensions.get(EXTENSION_KEY)
+    if encoder is None:
+        encoder = create_encoder(current_app.config)
+        init_app(current_app, encoder)
+    return encoder
+
+
+def dumps(data: Any) -> bytes:
+    """Encode data with the encoder of the current application."""
+    return get_encoder().dumps(
+        data, sort_keys=current_app.config.get("JSON_SORT_KEYS", True))
+
+
+def _mimetype() -> str:
+    return current_app.config.get("JSONIFY_MIMETYPE", "application/json")
+
+
+def jsonify(*args, **kwargs) -> Response:
+    """Create a JSON response, taking the same arguments as flask.jsonify.
+    """
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args "
+                        "and kwargs")
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+    return Response(dumps(data) + b"\n", mimetype=_mimetype())
+
+
+def _encode_list(key: str, batches: Iterable[List[Any]],
+                 fields: Dict[str, Any]) -> Iterator[bytes]:
+    sort_keys = current_app.config.get("JSON_SORT_KEYS", True)
+    encoder = get_encoder()
+    yield b"{" + encoder.dumps(key) + b":["
+    separator = b""
+    for batch in batches:
+        if not batch:
+            continue
+        # Strip the brackets of the encoded batch to join it to the array
+        yield separator + encoder.dumps(batch, sort_keys=sort_keys)[1:-1]
+        separator = b","
+    yield b"]"
+    for name, value in fields.items():
+        if callable(value):
+            value = value()
+        yield b"," + encoder.dumps(name) + b":" + \
+            encoder.dumps(value, sort_keys=sort_keys)
+    yield b"}\n"
+
+
+def stream_list(key: str, batches: Iterable[List[Any]],
+                **fields: Any) -> Response:
+    """Create a JSON response of an object with a list streamed in batches.
+
+    The response is {key: [records...], **fields}, with the list first.
+    The batches are only read as the response is sent, within the request
+    context. As the status is sent before the first batch is read, a batch
+    that fails to load ends the response early instead of turning it into
+    an error.
+
+    Args:
+        key: key of the list in the JSON object
+        batches: lists of records to encode as the items of the list
+        **fields: other values of the JSON object. Callables are called
+            once every batch has been sent, for values such as the number
+            of records sent
+
+    """
+    return Response(stream_with_context(_encode_list(key, batches, fields)),
+                    mimetype=_mimetype())
+
+
+def iter_batches(get_batch, key: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 after: Optional[Any] = None) -> Iterator[List[Any]]:
+    """Read every record of a keyset paginated source a batch at a time.
+
+    Args:
+        get_batch: called with the limit and after keyword arguments of a
+            data connector's get() and returns serialized records ordered
+            by key
+        key: key of the id of a serialized record
+        batch_size: max number of records in a batch
+        after: id of the record to start after
+
+    """
+    while True:
+        batch = get_batch(limit=batch_size, after=after)
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        after = batch[-1][key]
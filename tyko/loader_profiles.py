@@ -0,0 +1,207 @@
+"""Named eager loading profiles for the data connectors.
+
+Each serialize() method walks a different set of relationships depending on
+how deep it recurses. A profile names one of those depths and bundles the
+loader options needed to load everything that depth touches up front, so a
+call to a connector issues a fixed number of queries no matter how many
+records are returned instead of one lazy load per relationship per row.
+
+``list``
+    what the list endpoints return
+``detail``
+    what the endpoints for a single record return
+``pbcore``
+    everything needed to render a PBCore document for an object
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import orm
+
+from .schema.collection import Collection
+from .schema import formats
+from .schema.instantiation import InstantiationFile, FileAnnotation
+from .schema.notes import Note
+from .schema.objects import CollectionObject
+from .schema.projects import Project
+
+LIST = "list"
+DETAIL = "detail"
+PBCORE = "pbcore"
+
+PROFILES = (LIST, DETAIL, PBCORE)
+
+# Every type of item in the AVFormat hierarchy, loaded with one outer join
+ITEMS = orm.with_polymorphic(formats.AVFormat, "*")
+
+# Relationships from an object to each type of item it can contain
+OBJECT_ITEM_RELATIONSHIPS: Tuple[Tuple[str, Type[formats.AVFormat]], ...] = (
+    ("audio_cassettes", formats.AudioCassette),
+    ("audio_videos", formats.AudioVideo),
+    ("collection_items", formats.CollectionItem),
+    ("films", formats.Film),
+    ("groove_disks", formats.GroovedDisc),
+    ("open_reels", formats.OpenReel),
+)
+
+
+@dataclass(frozen=True)
+class LoaderProfile:
+    """Loader options for a query and how deep its results are serialized.
+
+    Attributes:
+        options: loader options to pass to Query.options()
+        recurse: value for the recurse argument of serialize()
+
+    """
+
+    options: List[orm.Load] = field(default_factory=list)
+    recurse: bool = False
+
+
+def _chain(parent: Optional[orm.Load], strategy: str, attribute):
+    if parent is None:
+        return getattr(orm, strategy)(attribute)
+    return getattr(parent, strategy)(attribute)
+
+
+def _note_options(parent, attribute) -> List[orm.Load]:
+    return [
+        _chain(parent, "selectinload", attribute).joinedload(Note.note_type)
+    ]
+
+
+def _object_item_options(parent, recurse: bool) -> List[orm.Load]:
+    options = []
+    for name, item_class in OBJECT_ITEM_RELATIONSHIPS:
+        relationship = getattr(CollectionObject, name)
+        options.append(
+            _chain(parent, "selectinload", relationship)
+            .joinedload(item_class.format_type)
+        )
+        if not recurse:
+            continue
+        options.append(
+            _chain(parent, "defaultload", relationship)
+            .selectinload(item_class.notes).joinedload(Note.note_type)
+        )
+        options.append(
+            _chain(parent, "defaultload", relationship)
+            .selectinload(item_class.files)
+        )
+        if item_class is formats.AudioCassette:
+            for enum_relationship in (formats.AudioCassette.cassette_type,
+                                      formats.AudioCassette.tape_type,
+                                      formats.AudioCassette.tape_thickness):
+                options.append(
+                    _chain(parent, "defaultload", relationship)
+                    .joinedload(enum_relationship)
+                )
+    return options
+
+
+def _object_options(parent, recurse: bool) -> List[orm.Load]:
+    options = _object_item_options(parent, recurse)
+    options.append(_chain(parent, "joinedload", CollectionObject.contact))
+    options.append(
+        _chain(parent, "joinedload", CollectionObject.collection)
+        .joinedload(Collection.contact)
+    )
+    if recurse:
+        options += _note_options(parent, CollectionObject.notes)
+        project = _chain(parent, "joinedload", CollectionObject.project)
+        options.append(project.joinedload(Project.status))
+        options += _note_options(
+            _chain(parent, "defaultload", CollectionObject.project),
+            Project.notes
+        )
+    else:
+        options.append(_chain(parent, "selectinload", CollectionObject.notes))
+        options.append(_chain(parent, "joinedload", CollectionObject.project))
+    return options
+
+
+def _project_options(recurse: bool) -> List[orm.Load]:
+    options = [orm.joinedload(Project.status)]
+    options += _note_options(None, Project.notes)
+    if recurse:
+        options.append(orm.selectinload(Project.objects))
+        options += _object_options(orm.defaultload(Project.objects),
+                                   recurse=False)
+    return options
+
+
+def _item_options() -> List[orm.Load]:
+    return [
+        orm.joinedload(ITEMS.format_type),
+        *_note_options(None, ITEMS.notes),
+        orm.selectinload(ITEMS.files),
+        orm.joinedload(ITEMS.AudioCassette.cassette_type),
+        orm.joinedload(ITEMS.AudioCassette.tape_type),
+        orm.joinedload(ITEMS.AudioCassette.tape_thickness),
+    ]
+
+
+def _file_options() -> List[orm.Load]:
+    return [
+        orm.selectinload(InstantiationFile.notes),
+        orm.selectinload(InstantiationFile.annotations)
+        .joinedload(FileAnnotation.annotation_type),
+    ]
+
+
+_REGISTRY: Dict[type, Dict[str, LoaderProfile]] = {
+    Project: {
+        LIST: LoaderProfile(_project_options(recurse=True), recurse=True),
+        DETAIL: LoaderProfile(_project_options(recurse=True), recurse=True),
+        PBCORE: LoaderProfile(_project_options(recurse=False)),
+    },
+    CollectionObject: {
+        LIST: LoaderProfile(_object_options(None, recurse=False)),
+        DETAIL: LoaderProfile(_object_options(None, recurse=False)),
+        PBCORE: LoaderProfile(_object_options(None, recurse=True),
+                              recurse=True),
+    },
+    formats.AVFormat: {
+        LIST: LoaderProfile(_item_options()),
+        DETAIL: LoaderProfile(_item_options()),
+        PBCORE: LoaderProfile(_item_options()),
+    },
+    Collection: {
+        LIST: LoaderProfile([orm.joinedload(Collection.contact)]),
+        DETAIL: LoaderProfile([orm.joinedload(Collection.contact)]),
+        PBCORE: LoaderProfile([orm.joinedload(Collection.contact)]),
+    },
+    Note: {
+        LIST: LoaderProfile([orm.joinedload(Note.note_type)]),
+        DETAIL: LoaderProfile([orm.joinedload(Note.note_type)]),
+        PBCORE: LoaderProfile([orm.joinedload(Note.note_type)]),
+    },
+    InstantiationFile: {
+        LIST: LoaderProfile(_file_options(), recurse=True),
+        DETAIL: LoaderProfile(_file_options(), recurse=True),
+        PBCORE: LoaderProfile(_file_options(), recurse=True),
+    },
+}
+
+
+def get_profile(entity: type, name: Optional[str] = None,
+                single: bool = False) -> LoaderProfile:
+    """Look up the loader profile for an entity.
+
+    Args:
+        entity: mapped class being queried
+        name: name of the profile. If not given, "detail" is used when
+            loading a single record, otherwise "list"
+        single: if a single record is being loaded
+
+    Raises:
+        ValueError: if there is no profile with the given name
+
+    """
+    if name is None:
+        name = DETAIL if single else LIST
+    try:
+        return _REGISTRY[entity][name]
+    except KeyError as error:
+        raise ValueError(f"Unknown loader profile: {name}") from error
@@ -0,0 +1,152 @@
+"""Process local cache of the enumerated lookup tables.
+
+Note types, format types, project statuses and the cassette enumerations
+are small and rarely change but are read on almost every page. The rows of
+each table are loaded once into detached instances and kept for
+TYKO_LOOKUP_CACHE_TTL seconds.
+
+A table is reloaded as soon as a change to it is committed by a session of
+the data provider, or through its data connector for bulk changes, in the
+same process. Other processes, such as the other workers of a
+deployment, only see the change once their copy expires, so the TTL bounds
+how long they can serve stale entries. A TTL of 0 or None turns the cache
+off.
+
+The cached instances are shared. They must not be changed or added to a
+session; get_entry() gives a copy that belongs to the caller's session.
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import sqlalchemy
+from sqlalchemy import event, orm
+
+SESSION_INFO_KEY = "lookup_cache"
+
+DEFAULT_TTL = 300
+
+
+class LookupCache:
+    """Rows of the lookup tables, loaded one whole table at a time.
+
+    A table that is missing or expired is loaded over the connection of the
+    session asking for it, so a request does not need a second connection.
+
+    Args:
+        ttl: seconds before a table is loaded again
+
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables: Dict[Type, Tuple[float, List, Dict]] = {}
+
+    @staticmethod
+    def _load(mapped_class: Type, session) -> Tuple[List, Dict]:
+        # A session of its own so the entries are not shared with the caller
+        loader = orm.Session(bind=session.connection())
+        try:
+            entries = loader.query(mapped_class).order_by(
+                *orm.class_mapper(mapped_class).primary_key).all()
+            by_id = {
+                sqlalchemy.inspect(entry).identity[0]: entry
+                for entry in entries
+            }
+        finally:
+            loader.close()
+        return entries, by_id
+
+    def _table(self, mapped_class: Type, session) -> Tuple[List, Dict]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._tables.get(mapped_class)
+        if cached is not None and cached[0] > now:
+            return cached[1], cached[2]
+
+        entries, by_id = self._load(mapped_class, session)
+        with self._lock:
+            self._tables[mapped_class] = (now + self.ttl, entries, by_id)
+        return entries, by_id
+
+    def all(self, mapped_class: Type, session) -> List[Any]:
+        """Get every row of a lookup table, in primary key order."""
+        return list(self._table(mapped_class, session)[0])
+
+    def get(self, mapped_class: Type, entry_id, session) -> Optional[Any]:
+        """Get a row of a lookup table by its primary key."""
+        return self._table(mapped_class, session)[1].get(entry_id)
+
+    def invalidate(self, *mapped_classes: Type) -> None:
+        """Forget the given tables, or all of them if none are given."""
+        with self._lock:
+            if not mapped_classes:
+                self._tables.clear()
+            for mapped_class in mapped_classes:
+                self._tables.pop(mapped_class, None)
+
+
+def from_session_maker(session_maker) -> Optional[LookupCache]:
+    kw = getattr(session_maker, "kw", {})
+    return kw.get("info", {}).get(SESSION_INFO_KEY)
+
+
+def all_entries(session_maker, mapped_class: Type) -> List[Any]:
+    """Get every row of a lookup table, from the cache when there is one."""
+    session = session_maker()
+    try:
+        lookup_cache = session.info.get(SESSION_INFO_KEY)
+        if lookup_cache is not None:
+            return lookup_cache.all(mapped_class, session)
+        return session.query(mapped_class).all()
+    finally:
+        session.close()
+
+
+def get_entry(session, mapped_class: Type, entry_id) -> Optional[Any]:
+    """Get a row of a lookup table as an instance of the session."""
+    lookup_cache = session.info.get(SESSION_INFO_KEY)
+    if lookup_cache is None:
+        return session.query(mapped_class).get(entry_id)
+
+    entry = lookup_cache.get(mapped_class, entry_id, session)
+    if entry is None:
+        return None
+    return session.merge(entry, load=False)
+
+
+def invalidate(session_maker, *mapped_classes: Type) -> None:
+    """Reload the lookup tables after they were changed."""
+    lookup_cache = from_session_maker(session_maker)
+    if lookup_cache is not None:
+        lookup_cache.invalidate(*mapped_classes)
+
+
+def _before_flush(session, flush_context, instances):  # noqa: E501 pylint: disable=unused-argument
+    if session.info.get(SESSION_INFO_KEY) is None:
+        return
+    changed = {type(instance) for instance in session.new} | \
+        {type(instance) for instance in session.deleted} | \
+        {type(instance) for instance in session.dirty
+         if session.is_modified(instance)}
+    session.info.setdefault("invalidate_after_commit", set()).update(
+        changed)
+
+
+def _after_commit(session):
+    lookup_cache = session.info.get(SESSION_INFO_KEY)
+    mapped_classes = session.info.pop("invalidate_after_commit", None)
+    if lookup_cache is not None and mapped_classes:
+        lookup_cache.invalidate(*mapped_classes)
+
+
+def _after_rollback(session, previous_transaction):  # noqa: E501 pylint: disable=unused-argument
+    session.info.pop("invalidate_after_commit", None)
+
+
+def track_changes(session_factory) -> None:
+    """Reload the lookup tables changed by sessions from the factory."""
+    event.listen(session_factory, "before_flush", _before_flush)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_soft_rollback", _after_rollback)
@@ -1,25 +1,34 @@
 # pylint: disable=redefined-builtin, invalid-name
 
 import abc
-import hashlib
-import json
+import functools
 import sys
 import traceback
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-from flask import jsonify, make_response, abort, request, url_for
+from flask import make_response, abort, request, url_for, \
+    Response, stream_with_context
 
 from . import data_provider as dp
+from . import export
+from . import hierarchy
+from . import json_response
 from . import pbcore
+from . import search
+from . import versioning
+from .pagination import PageRequest
 from .exceptions import DataError
+from .decorators import conditional_response
+from .json_response import jsonify
 from .views import files
 
-CACHE_HEADER = "private, max-age=0"
-
 
 class AbsMiddlwareEntity(metaclass=abc.ABCMeta):
     WRITABLE_FIELDS: List[str] = []
 
+    # Tables whose changes can alter the data returned by get()
+    VERSIONED_BY: List[str] = []
+
     @classmethod
     def field_can_edit(cls, field) -> bool:
         return field in cls.WRITABLE_FIELDS
@@ -31,6 +40,112 @@ class AbsMiddlwareEntity(metaclass=abc.ABCMeta):
     def get(self, serialize=False, **kwargs):
         """Add a new entity"""
 
+    def version_tag(self, serialize=False, **kwargs) -> Optional[str]:
+        """Get an ETag for a get() request from the entity versions.
+
+        Returns:
+            None if the call does not produce a response, otherwise an ETag
+            that changes when any of the VERSIONED_BY tables change.
+
+        """
+        if not self.VERSIONED_BY or (not serialize and "id" not in kwargs):
+            return None
+        session = self._data_provider.db_session_maker()
+        try:
+            versions = versioning.get_versions(session, self.VERSIONED_BY)
+        finally:
+            session.close()
+        return versioning.make_etag(request.full_path, versions)
+
+    def get_page(self, serialize, record_key, **filters):
+        """Get the records for the page requested by the request arguments.
+
+        Args:
+            serialize: serialize the records
+            record_key: name of the id field of a serialized record
+            **filters: passed on to the get and count methods of the data
+                connector
+
+        Returns:
+            Tuple of the records, the total number of records, and the cursor
+            for the next page or None if this is the last page.
+
+        """
+        page = PageRequest.from_args(request.args)
+        records = self._data_connector.get(serialize=serialize,
+                                           **page.query_args(), **filters)
+
+        if not page.is_paginated:
+            return records, len(records), None
+
+        next_cursor = page.next_cursor(records, record_key) \
+            if serialize else None
+        return page.trim(records), self._data_connector.count(**filters), \
+            next_cursor
+
+    def list_response(self, key, record_key, transform=None, **filters):
+        """Respond with the records requested by the request arguments.
+
+        A page is sent as a single document. Without pagination arguments
+        every record is requested, and they are read and streamed in
+        batches of json_response.DEFAULT_BATCH_SIZE records.
+
+        Args:
+            key: key of the list of records in the response
+            record_key: name of the id field of a serialized record
+            transform: optional function applied to each serialized record
+            **filters: passed on to the get and count methods of the data
+                connector
+
+        """
+        if PageRequest.from_args(request.args).is_paginated:
+            records, total, next_cursor = \
+                self.get_page(True, record_key, **filters)
+            if transform is not None:
+                records = [transform(record) for record in records]
+            return make_response(jsonify({
+                key: records,
+                "total": total,
+                "next_cursor": next_cursor
+            }), 200)
+
+        sent = 0
+
+        def batches():
+            nonlocal sent
+            for batch in json_response.iter_batches(
+                    functools.partial(self._data_connector.get,
+                                      serialize=True, **filters),
+                    record_key, json_response.DEFAULT_BATCH_SIZE):
+                sent += len(batch)
+                if transform is not None:
+                    batch = [transform(record) for record in batch]
+                yield batch
+
+        return json_response.stream_list(key, batches(), next_cursor=None,
+                                         total=lambda: sent)
+
+    @staticmethod
+    def get_batch(key):
+        """Get the list of records to create from the request body.
+
+        The body is expected to be a JSON object with the list under the key.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or key not in data:
+            raise DataError(
+                message=f"Expected a JSON object with a list of {key}",
+                status_code=400
+            )
+        return data[key]
+
+    def check_path(self, project_id: int, object_id: int,
+                   item_id: Optional[int] = None) -> None:
+        """Make sure the ids of a nested route belong to each other."""
+        hierarchy.check_path(self._data_provider.db_session_maker,
+                             project_id=project_id, object_id=object_id,
+                             item_id=item_id)
+
     @abc.abstractmethod
     def delete(self, id):
         """CRU_D_ Delete"""
@@ -63,6 +178,7 @@ class Middleware:
     def __init__(self, data_provider: dp.DataProvider) -> None:
         self.data_provider = data_provider
 
+    @conditional_response
     def get_formats(self, serialize=True):
         formats = self.data_provider.get_formats(serialize=serialize)
         if serialize:
@@ -71,10 +187,40 @@ class Middleware:
             result = formats
         return result
 
+    @conditional_response
     def get_formats_by_id(self, id):
         formats = self.data_provider.get_formats(id=id, serialize=True)
         return jsonify(formats)
 
+    def export_catalogue(self):
+        file_format = request.args.get("format", "jsonl")
+        entity_names = request.args.getlist("entity") or None
+        batch_size = request.args.get("batch_size",
+                                      export.DEFAULT_BATCH_SIZE, type=int)
+        chunks = export.stream_catalogue(
+            self.data_provider.db_session_maker, file_format, entity_names,
+            batch_size=max(batch_size, 1))
+        response = Response(stream_with_context(chunks),
+                            mimetype=export.FORMATS[file_format])
+        response.headers["Content-Disposition"] = \
+            f"attachment; filename=catalogue.{file_format}"
+        return response
+
+    def search(self):
+        query = request.args.get("q", "")
+        kinds = [
+            kind.strip()
+            for value in request.args.getlist("type")
+            for kind in value.split(",") if kind.strip()
+        ]
+        limit = request.args.get("limit", search.DEFAULT_LIMIT, type=int)
+        offset = request.args.get("offset", 0, type=int)
+        results = self.data_provider.search(
+            query, kinds or None,
+            limit=min(max(limit, 1), search.MAX_LIMIT),
+            offset=max(offset, 0))
+        return jsonify({"query": query, **results})
+
 
 class ObjectMiddlwareEntity(AbsMiddlwareEntity):
     WRITABLE_FIELDS = [
@@ -85,29 +231,31 @@ class ObjectMiddlwareEntity(AbsMiddlwareEntity):
         'originals_return_date'
     ]
 
+    VERSIONED_BY = [
+        "tyko_object",
+        "formats",
+        "notes",
+        "collection",
+        "contact",
+        "project"
+    ]
+
     def __init__(self, data_provider: dp.DataProvider) -> None:
         super().__init__(data_provider)
 
         self._data_connector = \
             dp.ObjectDataConnector(data_provider.db_session_maker)
 
+    @conditional_response(version_tag=AbsMiddlwareEntity.version_tag)
     def get(self, serialize=False, **kwargs):
         if "id" in kwargs:
             return self.object_by_id(id=kwargs["id"])
 
-        objects = self._data_connector.get(serialize=serialize)
-
         if serialize:
-            data = {
-                "objects": objects,
-                "total": len(objects)
-            }
-            response = make_response(jsonify(data), 200)
-
-            return response
+            return self.list_response("objects", "object_id")
 
-        result = objects
-        return result
+        objects, _, _ = self.get_page(serialize, "object_id")
+        return objects
 
     def object_by_id(self, id):
 
@@ -135,6 +283,7 @@ class ObjectMiddlwareEntity(AbsMiddlwareEntity):
 
         return abort(404)
 
+    @conditional_response
     def pbcore(self, id):
         xml = pbcore.create_pbcore_from_object(
             object_id=id,
@@ -200,7 +349,14 @@ class ObjectMiddlwareEntity(AbsMiddlwareEntity):
             "url": url_for("object", object_id=new_object_id)
         })
 
-    def add_note(self, project_id, object_id):  # pylint: disable=W0613
+    def add_items(self, project_id, object_id):
+        self.check_path(project_id, object_id)
+        created = self._data_connector.add_items(object_id,
+                                                 self.get_batch("items"))
+        return make_response(jsonify({"items": created}), 201)
+
+    def add_note(self, project_id, object_id):
+        self.check_path(project_id, object_id)
         data = request.get_json()
         try:
             note_type_id = int(data.get("note_type_id"))
@@ -265,36 +421,27 @@ class CollectionMiddlwareEntity(AbsMiddlwareEntity):
         "department"
     ]
 
+    VERSIONED_BY = [
+        "collection",
+        "contact"
+    ]
+
     def __init__(self, data_provider) -> None:
         super().__init__(data_provider)
 
         self._data_connector = \
             dp.CollectionDataConnector(data_provider.db_session_maker)
 
+    @conditional_response(version_tag=AbsMiddlwareEntity.version_tag)
     def get(self, serialize=False, **kwargs):
         if "id" in kwargs:
             return self.collection_by_id(id=kwargs["id"])
 
-        collections = self._data_connector.get(serialize=serialize)
-
         if serialize:
-            data = {
-                "collections": collections,
-                "total": len((collections))
-            }
-
-            json_data = json.dumps(data)
-            response = make_response(jsonify(data), 200)
+            return self.list_response("collections", "collection_id")
 
-            hash_value = \
-                hashlib.sha256(bytes(json_data, encoding="utf-8")).hexdigest()
-
-            response.headers["ETag"] = str(hash_value)
-            response.headers["Cache-Control"] = CACHE_HEADER
-            return response
-
-        result = collections
-        return result
+        collections, _, _ = self.get_page(serialize, "collection_id")
+        return collections
 
     def collection_by_id(self, id):
         current_collection = self._data_connector.get(id, serialize=True)
@@ -371,12 +518,23 @@ class ProjectMiddlwareEntity(AbsMiddlwareEntity):
         "current_location"
     ]
 
+    VERSIONED_BY = [
+        "project",
+        "project_status_type",
+        "notes",
+        "tyko_object",
+        "formats",
+        "collection",
+        "contact"
+    ]
+
     def __init__(self, data_provider) -> None:
         super().__init__(data_provider)
 
         self._data_connector = \
             dp.ProjectDataConnector(data_provider.db_session_maker)
 
+    @conditional_response(version_tag=AbsMiddlwareEntity.version_tag)
     def get(self, serialize=False, **kwargs):
         if "id" in kwargs:
             return jsonify(
@@ -385,32 +543,11 @@ class ProjectMiddlwareEntity(AbsMiddlwareEntity):
                 }
             )
 
-        limit = request.args.get("limit")
-        offset = request.args.get("offset")
-        projects = self._data_connector.get(serialize=serialize)
-        total_projects = len(projects)
-        if limit:
-            offset_value = int(offset)
-            limit_value = int(limit)
-            projects = projects[offset_value:limit_value+offset_value]
-
         if serialize:
-            data = {
-                "projects": projects,
-                "total": total_projects
-            }
-            json_data = json.dumps(data)
-            response = make_response(jsonify(data), 200)
-
-            hash_value = \
-                hashlib.sha256(bytes(json_data, encoding="utf-8")).hexdigest()
+            return self.list_response("projects", "project_id")
 
-            response.headers["ETag"] = str(hash_value)
-            response.headers["Cache-Control"] = CACHE_HEADER
-            return response
-
-        result = projects
-        return result
+        projects, _, _ = self.get_page(serialize, "project_id")
+        return projects
 
     def get_project_by_id(self, id):
         current_project = self._data_connector.get(id, serialize=True)
@@ -429,12 +566,54 @@ class ProjectMiddlwareEntity(AbsMiddlwareEntity):
 
         return abort(404)
 
+    def get_project_object(self, project_id, object_id):
+        object_connector = \
+            dp.ObjectDataConnector(self._data_provider.db_session_maker)
+        project_object = object_connector.get_in_project(
+            project_id, object_id, serialize=True)
+        if project_object is not None:
+            project_object['routes'] = {
+                "frontend": url_for("page_project_object_details",
+                                    project_id=project_id,
+                                    object_id=object_id),
+                "api": url_for("project_object",
+                               project_id=project_id,
+                               object_id=object_id)
+            }
+        return project_object
+
     def delete(self, id):
         if self._data_connector.delete(id):
             return make_response("", 204)
 
         return make_response("", 404)
 
+    def pbcore_export(self):
+        project_id = request.args.get("project_id", type=int)
+        if project_id is None:
+            raise DataError(message="project_id is required",
+                            status_code=400)
+
+        export_format = request.args.get("format", "xml")
+        if export_format == "xml":
+            chunks = pbcore.stream_pbcore_collection(
+                project_id, data_provider=self._data_provider)
+            return Response(stream_with_context(chunks),
+                            mimetype="text/xml")
+
+        if export_format == "zip":
+            chunks = pbcore.stream_pbcore_zip(
+                project_id, data_provider=self._data_provider)
+            response = Response(stream_with_context(chunks),
+                                mimetype="application/zip")
+            response.headers["Content-Disposition"] = \
+                f"attachment; filename=project-{project_id}-pbcore.zip"
+            return response
+
+        raise DataError(
+            message=f"Unsupported export format: {export_format}",
+            status_code=400)
+
     @classmethod
     def create_changed_data(cls, json_request) -> Dict[str, Any]:
         new_project = super().create_changed_data(json_request)
@@ -568,6 +747,11 @@ class ProjectMiddlwareEntity(AbsMiddlwareEntity):
             traceback.print_exc(file=sys.stderr)
             return make_response("Missing required data: {}".format(e), 400)
 
+    def add_objects(self, project_id):
+        created = self._data_connector.add_objects(
+            project_id, self.get_batch("objects"))
+        return make_response(jsonify({"objects": created}), 201)
+
     def remove_object(self, project_id, object_id):
         try:
             updated_project = self._data_connector.remove_object(
@@ -599,35 +783,31 @@ class ItemMiddlwareEntity(AbsMiddlwareEntity):
         "files"
     ]
 
+    VERSIONED_BY = [
+        "formats",
+        "notes",
+        "instantiation_files",
+        "cassette_types",
+        "cassette_tape_types",
+        "cassette_tape_thickness"
+    ]
+
     def __init__(self, data_provider) -> None:
         super().__init__(data_provider)
 
         self._data_connector = \
             dp.ItemDataConnector(data_provider.db_session_maker)
 
+    @conditional_response(version_tag=AbsMiddlwareEntity.version_tag)
     def get(self, serialize=False, **kwargs):
         if "id" in kwargs:
             return self.item_by_id(kwargs["id"])
 
-        items = self._data_connector.get(serialize=serialize)
         if serialize:
-            data = {
-                "items": items,
-                "total": len(items)
-            }
+            return self.list_response("items", "item_id")
 
-            json_data = json.dumps(data)
-            response = make_response(jsonify(data), 200)
-
-            hash_value = \
-                hashlib.sha256(bytes(json_data, encoding="utf-8")).hexdigest()
-
-            response.headers["ETag"] = str(hash_value)
-            response.headers["Cache-Control"] = CACHE_HEADER
-            return response
-
-        result = items
-        return result
+        items, _, _ = self.get_page(serialize, "item_id")
+        return items
 
     def item_by_id(self, id):
         current_item = self._data_connector.get(id, serialize=True)
@@ -684,12 +864,22 @@ class ItemMiddlwareEntity(AbsMiddlwareEntity):
             }
         )
 
+    def add_files(self, project_id, object_id, item_id):
+        self.check_path(project_id, object_id, item_id)
+        file_connector = dp.FilesDataConnector(
+            self._data_provider.db_session_maker)
+        created = file_connector.create_many(item_id,
+                                             self.get_batch("files"))
+        return make_response(jsonify({"files": created}), 201)
+
     def add_file(self, project_id, object_id, item_id):
         return files.ItemFilesAPI(self._data_provider).post(project_id,
                                                             object_id,
                                                             item_id)
 
-    def add_note(self, item_id):
+    def add_note(self, item_id, project_id=None, object_id=None):
+        if project_id is not None:
+            self.check_path(project_id, object_id, item_id)
         data = request.get_json()
         try:
             note_type_id = int(data.get("note_type_id"))
@@ -759,6 +949,13 @@ class NotestMiddlwareEntity(AbsMiddlwareEntity):
         "note_type_id"
     ]
 
+    VERSIONED_BY = [
+        "notes",
+        "project",
+        "tyko_object",
+        "formats"
+    ]
+
     def __init__(self, data_provider) -> None:
         super().__init__(data_provider)
 
@@ -782,6 +979,7 @@ class NotestMiddlwareEntity(AbsMiddlwareEntity):
         newone['parents'] = parent_routes
         return newone
 
+    @conditional_response(version_tag=AbsMiddlwareEntity.version_tag)
     def get(self, serialize=False, **kwargs):
         if "id" in kwargs:
             note = self._data_connector.get(kwargs['id'], serialize=True)
@@ -794,30 +992,29 @@ class NotestMiddlwareEntity(AbsMiddlwareEntity):
                 "note": note_data
             })
 
-        notes = self._data_connector.get(serialize=serialize)
+        filters = {}
+        note_type_id = request.args.get("note_type_id")
+        if note_type_id:
+            if not note_type_id.isdigit():
+                raise DataError(
+                    message=f"Invalid note_type_id: {note_type_id}",
+                    status_code=400)
+            filters["note_type_id"] = int(note_type_id)
         if serialize:
-            note_data = []
-            for n in notes:
-                new_data = n.copy()
-                del new_data['parent_project_ids']
-                del new_data['parent_object_ids']
-                del new_data['parent_item_ids']
-                note_data.append(new_data)
-            data = {
-                "notes": note_data,
-                "total": len(note_data)
-            }
-            json_data = json.dumps(data)
-            response = make_response(jsonify(data), 200)
-
-            hash_value = \
-                hashlib.sha256(bytes(json_data, encoding="utf-8")).hexdigest()
-
-            response.headers["ETag"] = str(hash_value)
-            response.headers["Cache-Control"] = "private, max-age=0"
-            return response
+            return self.list_response("notes", "note_id",
+                                      transform=self._without_parents,
+                                      **filters)
+        notes, _, _ = self.get_page(serialize, "note_id", **filters)
         return notes
 
+    @staticmethod
+    def _without_parents(note):
+        new_data = note.copy()
+        del new_data['parent_project_ids']
+        del new_data['parent_object_ids']
+        del new_data['parent_item_ids']
+        return new_data
+
     def delete(self, id):
         res = self._data_connector.delete(id)
 
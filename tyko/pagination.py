@@ -0,0 +1,104 @@
+"""Keyset pagination shared by the data connectors and the API endpoints.
+
+A page is requested with a ``limit`` and an opaque ``cursor``. The cursor
+encodes the primary key of the last record of the previous page so the next
+page can be fetched with ``WHERE id > :last_id ORDER BY id LIMIT :limit``
+instead of an ``OFFSET`` scan.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Optional, Mapping, List, Any
+
+from .exceptions import DataError
+
+
+def encode_cursor(last_id: int) -> str:
+    """Create an opaque cursor that points after the given record id."""
+    data = json.dumps({"after": last_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Get the record id a cursor points after.
+
+    Raises:
+        DataError: if the cursor was not created by encode_cursor
+
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(data["after"])
+    except (binascii.Error, ValueError, TypeError, KeyError) as error:
+        raise DataError(message=f"Invalid cursor: {cursor}",
+                        status_code=400) from error
+
+
+def _parse_int(args: Mapping[str, str], key: str) -> Optional[int]:
+    value = args.get(key)
+    if value is None or value == "":
+        return None
+    try:
+        parsed = int(value)
+    except ValueError as error:
+        raise DataError(message=f"Invalid {key}: {value}",
+                        status_code=400) from error
+    if parsed < 0:
+        raise DataError(message=f"Invalid {key}: {value}", status_code=400)
+    return parsed
+
+
+@dataclass
+class PageRequest:
+    limit: Optional[int] = None
+    after: Optional[int] = None
+    offset: Optional[int] = None
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> "PageRequest":
+        """Read the limit, cursor and offset values of a request's args"""
+        cursor = args.get("cursor")
+        return cls(
+            limit=_parse_int(args, "limit"),
+            after=decode_cursor(cursor) if cursor else None,
+            offset=_parse_int(args, "offset"),
+        )
+
+    @property
+    def is_paginated(self) -> bool:
+        return self.limit is not None or self.after is not None \
+            or self.offset is not None
+
+    def query_args(self) -> dict:
+        """Keyword arguments for a data connector's get method.
+
+        One extra record is requested so that it can be known if there is
+        another page without a second query.
+        """
+        return {
+            "limit": self.limit + 1 if self.limit is not None else None,
+            "after": self.after,
+            "offset": self.offset,
+        }
+
+    def trim(self, records: List[Any]) -> List[Any]:
+        if self.limit is None:
+            return records
+        return records[:self.limit]
+
+    def next_cursor(self, records: List[Any], key: str) -> Optional[str]:
+        """Get the cursor for the page following the given records.
+
+        Args:
+            records: records as returned by a get with query_args()
+            key: name of the primary key field of a serialized record
+
+        Returns:
+            A cursor if there are more records, otherwise None
+
+        """
+        if self.limit is None or len(records) <= self.limit \
+                or self.limit == 0:
+            return None
+        return encode_cursor(records[self.limit - 1][key])
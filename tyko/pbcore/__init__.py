@@ -1,3 +1,8 @@
-from .pbcore import create_pbcore_from_object
+from .pbcore import create_pbcore_from_object, stream_pbcore_collection, \
+    stream_pbcore_zip
 
-__all__ = ['create_pbcore_from_object']
+__all__ = [
+    'create_pbcore_from_object',
+    'stream_pbcore_collection',
+    'stream_pbcore_zip',
+]
@@ -1,48 +1,181 @@
-from importlib.resources import read_text
-from jinja2 import Template
+import io
+import time
+import zipfile
+from typing import Iterable, Iterator, List, Optional
+
+import jinja2
+
+from tyko import loader_profiles, sessions
 from tyko.data_provider import DataProvider, ObjectDataConnector, \
-    FilesDataConnector, ProjectDataConnector
+    FilesDataConnector
+
+IDENTIFIER_SOURCE = "University of Illinois at Urbana-Champaign"
 
+# Number of objects loaded and rendered at a time by the batch exports
+EXPORT_BATCH_SIZE = 100
 
-def resolve_project_data(project_connector, unresolved_object: dict):
-    project_id = unresolved_object.get("parent_project_id")
-    if project_id is None:
+
+def _create_bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    try:
+        return jinja2.FileSystemBytecodeCache()
+    except (OSError, RuntimeError):
+        # No usable temp directory, templates are compiled once per process
         return None
-    return project_connector.get(project_id, serialize=True)
 
 
-def create_pbcore_from_object(object_id: int,
-                              data_provider: DataProvider) -> str:
-    template = Template(
-        read_text("tyko.pbcore.templates", "pbcore.xml"),
-        keep_trailing_newline=True
+def create_environment(
+        bytecode_cache: Optional[jinja2.BytecodeCache] = None
+) -> jinja2.Environment:
+    """Create an environment for the PBCore templates.
+
+    Templates are only compiled the first time they are requested from an
+    environment. The templates are part of the package and cannot change
+    while it is running so they are never checked for changes.
+    """
+    return jinja2.Environment(
+        loader=jinja2.PackageLoader("tyko.pbcore", "templates"),
+        keep_trailing_newline=True,
+        auto_reload=False,
+        bytecode_cache=bytecode_cache
     )
 
-    connector = ObjectDataConnector(data_provider.db_session_maker)
-    resulting_object = connector.get(object_id, serialize=True)
-    file_connector = FilesDataConnector(data_provider.db_session_maker)
-    project_connector = ProjectDataConnector(data_provider.db_session_maker)
 
-    resulting_object['project'] = resolve_project_data(
-        project_connector, resulting_object)
+ENVIRONMENT = create_environment(_create_bytecode_cache())
 
-    for item in resulting_object.get("items", []):
-        item['files'] = resolve_files(file_connector, item)
+
+def create_pbcore_from_object(object_id: int,
+                              data_provider: DataProvider) -> str:
+    template = ENVIRONMENT.get_template("pbcore.xml")
+
+    connector = ObjectDataConnector(data_provider.db_session_maker)
+    resulting_object = connector.get(object_id, serialize=True,
+                                     profile=loader_profiles.PBCORE)
+    resolve_object_files(
+        FilesDataConnector(data_provider.db_session_maker),
+        [resulting_object]
+    )
 
     xml = template.render(
         obj=resulting_object,
-        identifier_source="University of Illinois at Urbana-Champaign"
+        identifier_source=IDENTIFIER_SOURCE
     )
 
     return xml
 
 
-def resolve_files(file_connector, item):
-    # The files comibg back aren't complete, get the rest of the metadata
-    # before passing it on to the PBCore template
-    resolved_files = []
-    for item_file in item.get("files", []):
-        file_id = item_file['id']
-        res = file_connector.get(file_id, serialize=True)
-        resolved_files.append(res)
-    return resolved_files
+def resolve_object_files(file_connector: FilesDataConnector,
+                         objects: List[dict]) -> None:
+    """Replace the files of every item of the objects with complete records.
+
+    The files of all the objects are loaded together.
+    """
+    items = [item for obj in objects for item in obj.get("items", [])]
+    files = {
+        file_['id']: file_ for file_ in file_connector.get_many(
+            [item_file['id'] for item in items
+             for item_file in item.get("files", [])],
+            serialize=True,
+            profile=loader_profiles.PBCORE
+        )
+    }
+    for item in items:
+        item['files'] = [
+            files[item_file['id']] for item_file in item.get("files", [])
+            if item_file['id'] in files
+        ]
+
+
+def iter_project_objects(project_id: int,
+                         data_provider: DataProvider,
+                         batch_size: int = EXPORT_BATCH_SIZE
+                         ) -> Iterator[dict]:
+    """Iterate over the objects of a project, ready for the PBCore template.
+
+    Objects are loaded batch_size at a time with the "pbcore" loader profile
+    and the files of every item in a batch are resolved with a single query,
+    so the number of queries grows with the number of batches instead of the
+    number of objects or files.
+
+    Raises:
+        DataError: right away if the project does not exist
+
+    """
+    connector = ObjectDataConnector(data_provider.db_session_maker)
+    batches = connector.iter_project_objects(
+        project_id, batch_size=batch_size, serialize=True,
+        profile=loader_profiles.PBCORE)
+    return _resolve_batches(data_provider, batches)
+
+
+def _resolve_batches(data_provider: DataProvider,
+                     batches: Iterable[List[dict]]) -> Iterator[dict]:
+    file_connector = FilesDataConnector(
+        sessions.unscoped(data_provider.db_session_maker))
+    for batch in batches:
+        resolve_object_files(file_connector, batch)
+        yield from batch
+
+
+def stream_pbcore_collection(project_id: int,
+                             data_provider: DataProvider) -> Iterator[str]:
+    """Generate a single PBCore collection document for a whole project.
+
+    The document is produced chunk by chunk while the objects are loaded so
+    it never has to be held in memory.
+    """
+    template = ENVIRONMENT.get_template("pbcore_collection.xml")
+    return template.generate(
+        objects=iter_project_objects(project_id, data_provider),
+        identifier_source=IDENTIFIER_SOURCE
+    )
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only stream that hands out what has been written so far."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterable[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def stream_pbcore_zip(project_id: int,
+                      data_provider: DataProvider) -> Iterator[bytes]:
+    """Generate a zip archive with a PBCore document for each object.
+
+    The archive is written to an unseekable buffer that is emptied after
+    each chunk of a document so only a small part of it is ever in memory.
+    """
+    template = ENVIRONMENT.get_template("pbcore.xml")
+    objects = iter_project_objects(project_id, data_provider)
+    return _zip_documents(template, objects)
+
+
+def _zip_documents(template: jinja2.Template,
+                   objects: Iterable[dict]) -> Iterator[bytes]:
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) \
+            as archive:
+        for obj in objects:
+            document_info = zipfile.ZipInfo(
+                f"{obj['object_id']}-pbcore.xml",
+                date_time=time.localtime()[:6]
+            )
+            document_info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(document_info, "w") as document:
+                for chunk in template.generate(
+                        obj=obj, identifier_source=IDENTIFIER_SOURCE):
+                    document.write(chunk.encode("utf-8"))
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()
@@ -0,0 +1,145 @@
+"""Connection pool configuration and metrics.
+
+The pool of the application's engine is configured from these settings in
+tyko.config.Config or the file named by TYKO_SETTINGS. Settings left as
+None keep the defaults of SQLAlchemy and Flask-SQLAlchemy. They only apply
+to databases that use a queue of connections, such as MySQL, not to
+SQLite.
+
+TYKO_DB_POOL_SIZE
+    connections kept open in the pool
+TYKO_DB_MAX_OVERFLOW
+    connections opened on top of the pool size when it is exhausted
+TYKO_DB_POOL_RECYCLE
+    seconds after which a connection is replaced. Should be lower than the
+    wait_timeout of a MySQL server
+TYKO_DB_POOL_TIMEOUT
+    seconds to wait for a connection before giving up
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+POOL_SETTINGS = {
+    "TYKO_DB_POOL_SIZE": "pool_size",
+    "TYKO_DB_MAX_OVERFLOW": "max_overflow",
+    "TYKO_DB_POOL_RECYCLE": "pool_recycle",
+    "TYKO_DB_POOL_TIMEOUT": "pool_timeout",
+}
+
+
+def engine_options(config) -> Dict[str, Any]:
+    """Get the engine options for the pool settings in a config."""
+    options: Dict[str, Any] = {"pool_pre_ping": True}
+    uri = config.get("SQLALCHEMY_DATABASE_URI")
+    if uri is None or make_url(uri).get_backend_name() == "sqlite":
+        return options
+
+    options["poolclass"] = MeasuredQueuePool
+    for setting, option in POOL_SETTINGS.items():
+        value = config.get(setting)
+        if value is not None:
+            options[option] = int(value)
+    return options
+
+
+class MeasuredQueuePool(QueuePool):
+    """Queue pool that reports how long each checkout waited."""
+
+    metrics: Optional["PoolMetrics"] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class PoolMetrics:
+    """Counters for the connection pool of an engine, fed by pool events.
+
+    Attributes:
+        checkouts: connections handed out by the pool
+        checkins: connections given back to the pool
+        connects: new connections opened to the database
+        invalidations: connections discarded after an error or a failed
+            pre ping
+        wait_seconds_total: time spent waiting for a connection
+        wait_seconds_max: longest time spent waiting for a connection
+
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._engine = None
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def watch(self, engine) -> None:
+        """Start counting the events of the engine's pool."""
+        self._engine = engine
+        if isinstance(engine.pool, MeasuredQueuePool):
+            engine.pool.metrics = self
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "soft_invalidate", self._on_invalidate)
+
+    def _increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _on_checkout(self, *args) -> None:
+        self._increment("checkouts")
+
+    def _on_checkin(self, *args) -> None:
+        self._increment("checkins")
+
+    def _on_connect(self, *args) -> None:
+        self._increment("connects")
+
+    def _on_invalidate(self, *args) -> None:
+        self._increment("invalidations")
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the current value of every counter and pool gauge.
+
+        The pool gauges, size, checked_out and overflow, are only included
+        for pools that keep a queue of connections.
+        """
+        with self._lock:
+            data: Dict[str, Any] = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+        pool = self._engine.pool if self._engine is not None else None
+        if isinstance(pool, QueuePool):
+            data["size"] = pool.size()
+            data["checked_out"] = pool.checkedout()
+            data["overflow"] = pool.overflow()
+        return data
@@ -0,0 +1,137 @@
+"""Diagnostic logging of the SQL statements issued by each request.
+
+Meant for development. Turned on with TYKO_QUERY_DIAGNOSTICS = True in the
+config. Every statement executed while handling a request is recorded and
+when the request is done a warning is logged
+
+* for every statement template executed TYKO_QUERY_REPEAT_THRESHOLD times
+  or more. Statements that only differ by their parameters have the same
+  template, so these are usually lazy loads in a loop, the N+1 pattern.
+* if the request executed more than TYKO_QUERY_BUDGET_COUNT statements or
+  spent more than TYKO_QUERY_BUDGET_SECONDS executing them.
+"""
+import collections
+import logging
+import re
+import threading
+import time
+from typing import Counter, Dict, List, Optional, Tuple
+
+from flask import Flask, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s)"
+                             r"(?:\s*,\s*(?:\?|%s|%\(\w+\)s))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_template(statement: str) -> str:
+    """Reduce a statement to the form shared by all its executions.
+
+    Whitespace is collapsed and lists of bound parameters, such as the ones
+    of IN clauses, are shortened to a single parameter.
+    """
+    template = _WHITESPACE.sub(" ", statement).strip()
+    return _PARAMETER_LIST.sub("(?)", template)
+
+
+class _RequestQueries(threading.local):
+    recording = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.statements: List[Tuple[str, float]] = []
+
+
+class QueryDiagnostics:
+    """Log the requests that execute too many or too slow statements.
+
+    Args:
+        max_count: number of statements a request may execute
+        max_seconds: time a request may spend executing statements
+        repeat_threshold: number of executions of a statement template
+            that is reported as a likely N+1
+
+    """
+
+    def __init__(self, max_count: int = 50, max_seconds: float = 0.5,
+                 repeat_threshold: int = 5) -> None:
+        self.max_count = max_count
+        self.max_seconds = max_seconds
+        self.repeat_threshold = repeat_threshold
+        self._queries = _RequestQueries()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["QueryDiagnostics"]:
+        if not config.get("TYKO_QUERY_DIAGNOSTICS"):
+            return None
+        return cls(
+            max_count=int(config.get("TYKO_QUERY_BUDGET_COUNT", 50)),
+            max_seconds=float(config.get("TYKO_QUERY_BUDGET_SECONDS", 0.5)),
+            repeat_threshold=int(config.get("TYKO_QUERY_REPEAT_THRESHOLD",
+                                            5))
+        )
+
+    def init_app(self, app: Flask, engine) -> None:
+        event.listen(engine, "before_cursor_execute",
+                     self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute",
+                     self._after_cursor_execute)
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+
+    def _before_cursor_execute(self, conn, *args) -> None:
+        if self._queries.recording:
+            conn.info["tyko_diagnostics_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, *args) -> None:
+        start = conn.info.pop("tyko_diagnostics_start", None)
+        if self._queries.recording and start is not None:
+            self._queries.statements.append(
+                (statement, time.perf_counter() - start))
+
+    def start_request(self) -> None:
+        self._queries.statements = []
+        self._queries.recording = True
+
+    def end_request(self, response):
+        self._queries.recording = False
+        statements, self._queries.statements = self._queries.statements, []
+        for message in self.analyze(statements):
+            logger.warning("%s %s: %s", request.method, request.endpoint,
+                           message)
+        return response
+
+    def analyze(self, statements: List[Tuple[str, float]]) -> List[str]:
+        """Describe the problems with the statements of a request.
+
+        Args:
+            statements: text and duration in seconds of each statement
+
+        """
+        problems = []
+        counts: Counter[str] = collections.Counter()
+        durations: Dict[str, float] = collections.defaultdict(float)
+        for statement, seconds in statements:
+            template = statement_template(statement)
+            counts[template] += 1
+            durations[template] += seconds
+
+        for template, count in counts.most_common():
+            if count < self.repeat_threshold:
+                break
+            problems.append(
+                f"possible N+1, statement executed {count} times: "
+                f"{template}")
+
+        total_seconds = sum(durations.values())
+        if len(statements) > self.max_count or \
+                total_seconds > self.max_seconds:
+            slowest = max(durations, key=durations.__getitem__)
+            problems.append(
+                f"{len(statements)} statements took {total_seconds:.3f}s, "
+                f"over the budget of {self.max_count} statements or "
+                f"{self.max_seconds}s. Most time spent on: {slowest}")
+        return problems
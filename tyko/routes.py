@@ -2,10 +2,12 @@
 
 from dataclasses import dataclass, field
 from typing import Any, List, Iterator, Tuple, Callable, Optional, Union
-from flask import jsonify, render_template, views
+from flask import render_template, views
 
 import tyko.views.files
+from . import instrumentation
 from . import middleware
+from .json_response import jsonify
 from .data_provider import DataProvider
 from . import frontend
 from .views.object_item import ObjectItemNotesAPI, ObjectItemAPI
@@ -83,19 +85,33 @@ class Routes:
         self.db_engine = db_engine
         self.app = app
         self.mw = middleware.Middleware(self.db_engine)
+        self.instrumentation = instrumentation.Instrumentation(
+            pool_metrics=db_engine.pool_metrics,
+            enabled=app.config.get("TYKO_METRICS", True) if app else False
+        )
+        self.instrumentation.watch(db_engine.db_engine)
 
     def init_api_routes(self) -> None:
 
         if self.app:
             for url_rule in self.get_api_routes():
                 self.app.logger.debug(f"Loading rule {url_rule.rule}")
+                view_func = url_rule.view_func
+                if callable(view_func):
+                    view_func = self.instrumentation.instrument(view_func)
                 self.app.add_url_rule(
                     url_rule.rule,
                     endpoint=url_rule.endpoint,
-                    view_func=url_rule.view_func,
+                    view_func=view_func,
                     methods=url_rule.methods,
                     defaults=url_rule.defaults
                 )
+            if self.instrumentation.enabled:
+                self.app.add_url_rule(
+                    "/metrics",
+                    "metrics",
+                    self.instrumentation.metrics_view
+                )
 
     def _page_routes(self, data_prov) -> Iterator[Tuple[str, str, Callable]]:
         file_details = frontend.FileDetailsFrontend(data_prov)
@@ -189,7 +205,8 @@ class Routes:
             for rule, endpoint, func in \
                     self._page_routes(self.mw.data_provider):
                 self.app.logger.debug(f"Loading rule {rule}")
-                self.app.add_url_rule(rule, endpoint, func)
+                self.app.add_url_rule(
+                    rule, endpoint, self.instrumentation.instrument(func))
 
     def get_api_project_routes(self) -> Iterator[UrlRule]:
         project = middleware.ProjectMiddlwareEntity(self.db_engine)
@@ -214,6 +231,12 @@ class Routes:
             view_func=lambda serialize=True: project.get(serialize)
         )
 
+        yield UrlRule(
+            rule="/api/pbcore",
+            endpoint="pbcore_export",
+            view_func=project.pbcore_export
+        )
+
         yield UrlRule(
             rule="/api/project/<int:project_id>",
             endpoint="project",
@@ -228,6 +251,13 @@ class Routes:
             methods=["POST"]
         )
 
+        yield UrlRule(
+            rule="/api/project/<int:project_id>/objects:batch",
+            endpoint="project_add_objects",
+            view_func=project.add_objects,
+            methods=["POST"]
+        )
+
         yield UrlRule(
             rule="/api/project/<int:project_id>/object/<int:object_id>",
             endpoint="project_object",
@@ -272,6 +302,14 @@ class Routes:
             methods=["PUT", "DELETE"]
         )
 
+        yield UrlRule(
+            "/api/project/<int:project_id>/object/<int:object_id>"
+            "/items:batch",
+            endpoint="project_object_add_items",
+            view_func=project_object.add_items,
+            methods=["POST"]
+        )
+
         yield UrlRule(
             rule="/api/object/",
             endpoint="add_object",
@@ -312,7 +350,7 @@ class Routes:
                  "/item/<int:item_id>/notes",
             endpoint="project_object_item_add_note",
             view_func=lambda project_id, object_id, item_id: item.add_note(
-                item_id),
+                item_id, project_id=project_id, object_id=object_id),
             methods=["POST"]
         )
 
@@ -346,6 +384,14 @@ class Routes:
             methods=["POST"]
         )
 
+        yield UrlRule(
+            "/api/project/<int:project_id>/object/<int:object_id>/item"
+            "/<int:item_id>/files:batch",
+            "project_object_item_add_files",
+            item.add_files,
+            methods=["POST"]
+        )
+
         yield UrlRule(
             "/api/item/",
             endpoint="add_item",
@@ -477,6 +523,20 @@ class Routes:
             view_func=self.mw.get_formats_by_id
         )
 
+    def get_api_export_routes(self) -> Iterator[UrlRule]:
+        yield UrlRule(
+            rule="/api/export",
+            endpoint="export_catalogue",
+            view_func=self.mw.export_catalogue
+        )
+
+    def get_api_search_routes(self) -> Iterator[UrlRule]:
+        yield UrlRule(
+            rule="/api/search",
+            endpoint="search",
+            view_func=self.mw.search
+        )
+
     def get_api_routes(self) -> Iterator[UrlRule]:
         yield from self.get_api_project_routes()
         yield from self.get_api_object_routes()
@@ -485,6 +545,8 @@ class Routes:
         yield from self.get_api_notes_routes()
         yield from self.get_api_collection_routes()
         yield from self.get_api_format_routes()
+        yield from self.get_api_export_routes()
+        yield from self.get_api_search_routes()
 
         yield UrlRule(
             "/api",
@@ -494,6 +556,12 @@ class Routes:
             defaults={"app": self.app}
         )
 
+        yield UrlRule(
+            "/api/metrics/pool",
+            "pool_metrics",
+            lambda: jsonify(self.db_engine.pool_metrics.snapshot())
+        )
+
     @staticmethod
     def _object_pages(data_prov):
         object_frontend = frontend.ObjectFrontend(data_prov)
@@ -1,12 +1,24 @@
+import argparse
 import sys
 import logging
+import time
+from typing import List
 
 from flask import Flask, make_response
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.exc import OperationalError
 
+from . import export
+from . import importer
+from . import json_response
+from . import pbcore
+from . import search
+from . import sessions
+from .cache import create_backend
 from .database import init_database
 from .exceptions import DataError, NoTable
+from .pool_metrics import engine_options
+from .query_diagnostics import QueryDiagnostics
 from .data_provider import DataProvider, get_schema_version
 from .schema import ALEMBIC_VERSION
 from .routes import Routes
@@ -38,13 +50,24 @@ def create_app(app=None, verify_db=True) -> Flask:
     app.config.from_envvar("TYKO_SETTINGS", True)
 
     app.register_error_handler(DataError, handle_error)
+    json_response.init_app(app, json_response.create_encoder(app.config))
 
     app.logger.info("Configuring database")
-    database = SQLAlchemy(app, engine_options={"pool_pre_ping": True})
+    database = SQLAlchemy(app, engine_options=engine_options(app.config))
     engine = database.get_engine()
 
     app.logger.info("Loading database connection")
-    data_provider = DataProvider(engine)
+    data_provider = DataProvider(
+        engine,
+        cache_backend=create_backend(app.config),
+        lookup_ttl=app.config.get("TYKO_LOOKUP_CACHE_TTL")
+    )
+    app.teardown_appcontext(data_provider.db_session_maker.remove)
+
+    query_diagnostics = QueryDiagnostics.from_config(app.config)
+    if query_diagnostics is not None:
+        app.logger.warning("Query diagnostics enabled")
+        query_diagnostics.init_app(app, engine)
 
     app.logger.info("Checking database schema version")
     if verify_db is True and not is_correct_db_version(app, database):
@@ -67,17 +90,195 @@ def page_failed_on_startup():
     return make_response("Tyko failed during started", 503)
 
 
+def _create_cli_data_provider() -> DataProvider:
+    my_app = Flask(__name__)
+    my_app.config.from_object("tyko.config.Config")
+    my_app.config.from_envvar("TYKO_SETTINGS", True)
+    database = SQLAlchemy(my_app)
+    return DataProvider(database.engine)
+
+
+def export_pbcore(args: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="avdata export-pbcore",
+        description="Export the PBCore documents of every object in a project"
+    )
+    parser.add_argument("--project-id", type=int, required=True)
+    parser.add_argument("--zip", action="store_true",
+                        help="write a zip archive with a document per object "
+                             "instead of a single collection document")
+    parser.add_argument("--output", default="-",
+                        help="file to write to. Defaults to stdout")
+    options = parser.parse_args(args)
+
+    data_provider = _create_cli_data_provider()
+    if options.zip:
+        chunks = pbcore.stream_pbcore_zip(options.project_id, data_provider)
+    else:
+        chunks = (chunk.encode("utf-8") for chunk in
+                  pbcore.stream_pbcore_collection(options.project_id,
+                                                  data_provider))
+    if options.output == "-":
+        output = sys.stdout.buffer
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
+    else:
+        with open(options.output, "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+
+def export_catalogue(args: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="avdata export",
+        description="Export the whole catalogue as JSON lines or CSV"
+    )
+    parser.add_argument("--format", choices=list(export.FORMATS),
+                        default="jsonl")
+    parser.add_argument("--entity", action="append",
+                        choices=list(export.ENTITIES),
+                        help="entity to export. Can be given more than once "
+                             "for JSON lines. Defaults to all of them")
+    parser.add_argument("--batch-size", type=int,
+                        default=export.DEFAULT_BATCH_SIZE,
+                        help="number of rows fetched at a time")
+    parser.add_argument("--output", default="-",
+                        help="file to write to. Defaults to stdout")
+    options = parser.parse_args(args)
+
+    data_provider = _create_cli_data_provider()
+    chunks = export.stream_catalogue(data_provider.db_session_maker,
+                                     options.format, options.entity,
+                                     batch_size=options.batch_size)
+    if options.output == "-":
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        sys.stdout.flush()
+    else:
+        with open(options.output, "w", newline="",
+                  encoding="utf-8") as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+
+def import_inventory(args: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="avdata import",
+        description="Import the items of a legacy inventory from a CSV or "
+                    "JSON lines file"
+    )
+    parser.add_argument("file", help="file to import, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"],
+                        help="format of the file. Guessed from the file "
+                             "extension if not given")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="number of items inserted per transaction")
+    options = parser.parse_args(args)
+
+    file_format = options.format
+    if file_format is None:
+        if options.file.lower().endswith(".csv"):
+            file_format = "csv"
+        elif options.file.lower().endswith((".jsonl", ".json")):
+            file_format = "jsonl"
+        else:
+            parser.error("unable to tell the format of the file, "
+                         "use --format")
+
+    def report_error(line_number: int, reason: str) -> None:
+        print(f"Skipped line {line_number}: {reason}", file=sys.stderr)
+
+    def report_progress(summary: importer.ImportSummary) -> None:
+        print(f"Imported {summary.rows} items "
+              f"({summary.rows_per_second:.0f} items/s)", file=sys.stderr)
+
+    data_provider = _create_cli_data_provider()
+    session = sessions.unscoped(data_provider.db_session_maker)()
+    stream = sys.stdin if options.file == "-" else \
+        open(options.file, newline="", encoding="utf-8")
+    try:
+        summary = importer.import_rows(
+            session, importer.read_rows(stream, file_format),
+            batch_size=options.batch_size,
+            on_error=report_error, on_progress=report_progress)
+    finally:
+        session.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+    print(f"Imported {summary.rows} items in {summary.objects} objects and "
+          f"{summary.projects} new projects in {summary.seconds:.1f}s "
+          f"({summary.rows_per_second:.0f} items/s). "
+          f"Skipped {summary.skipped} rows.", file=sys.stderr)
+    return 1 if summary.skipped else 0
+
+
+def reindex(args: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="avdata reindex",
+        description="Rebuild the search index from the records in the "
+                    "database"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of records indexed at a time")
+    parser.add_argument("--purge", action="store_true",
+                        help="only remove the entries of the records that "
+                             "no longer exist")
+    options = parser.parse_args(args)
+
+    data_provider = _create_cli_data_provider()
+    session = sessions.unscoped(data_provider.db_session_maker)()
+    start = time.perf_counter()
+    try:
+        if options.purge:
+            search.purge(session)
+        else:
+            count = search.reindex(session, batch_size=options.batch_size)
+        session.commit()
+    finally:
+        session.close()
+    if options.purge:
+        print(f"Purged the search index in "
+              f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+    else:
+        print(f"Indexed {count} records in "
+              f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
 def main() -> None:
 
     if "init-db" in sys.argv:
-        my_app = Flask(__name__)
-        my_app.config.from_object("tyko.config.Config")
-        my_app.config.from_envvar("TYKO_SETTINGS", True)
-        database = SQLAlchemy(my_app)
-        data_provider = DataProvider(database.engine)
-        my_app.logger.info("Initializing Database")  # pylint: disable=E1101
+        data_provider = _create_cli_data_provider()
+        logging.getLogger(__name__).info("Initializing Database")
         init_database(data_provider.db_engine)
         sys.exit(0)
+    if "reindex" in sys.argv:
+        reindex(sys.argv[sys.argv.index("reindex") + 1:])
+        sys.exit(0)
+    if "import" in sys.argv:
+        command_index = sys.argv.index("import")
+        try:
+            sys.exit(import_inventory(sys.argv[command_index + 1:]))
+        except importer.ImportRowError as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+    if "export" in sys.argv:
+        command_index = sys.argv.index("export")
+        try:
+            export_catalogue(sys.argv[command_index + 1:])
+        except DataError as error:
+            print(error.message, file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    if "export-pbcore" in sys.argv:
+        command_index = sys.argv.index("export-pbcore")
+        try:
+            export_pbcore(sys.argv[command_index + 1:])
+        except DataError as error:
+            print(error.message, file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
     my_app = create_app()
     if my_app is not None:
         # Run as a local program and not for production
@@ -18,8 +18,10 @@ from .formats import \
 from .objects import CollectionObject
 from .instantiation import FileAnnotationType, InstantiationFile, \
     FileAnnotation, FileNotes
+from .versions import EntityVersion
+from .search import SearchToken
 
-ALEMBIC_VERSION: str = "d008a138763c"
+ALEMBIC_VERSION: str = "9e41b7c35d12"
 
 Session = scoped_session(sessionmaker(expire_on_commit=False))
 
@@ -33,6 +35,7 @@ __all__ = [
     "Collection",
     "CollectionItem",
     "CollectionObject",
+    "EntityVersion",
     "FileAnnotationType",
     "InstantiationFile",
     "FileNotes",
@@ -45,6 +48,7 @@ __all__ = [
     "OpenReel",
     "Project",
     "ProjectStatus",
+    "SearchToken",
     "Treatment",
     "Vendor",
     "VendorTransfer",
@@ -19,8 +19,10 @@ if TYPE_CHECKING:
 item_has_notes_table = db.Table(
     "item_has_notes",
     AVTables.metadata,
-    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id")),
-    db.Column("item_id", db.Integer, db.ForeignKey("formats.item_id"))
+    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id"),
+              index=True),
+    db.Column("item_id", db.Integer, db.ForeignKey("formats.item_id"),
+              index=True)
 )
 
 
@@ -42,7 +44,8 @@ class AVFormat(AVTables):
     }
     obj_sequence = db.Column("obj_sequence", db.Integer)
 
-    object_id = db.Column(db.Integer, db.ForeignKey("tyko_object.object_id"))
+    object_id = db.Column(db.Integer, db.ForeignKey("tyko_object.object_id"),
+                          index=True)
 
     notes = relationship("Note",
                          secondary=item_has_notes_table,
@@ -50,7 +53,8 @@ class AVFormat(AVTables):
                          )
 
     format_type_id = db.Column(db.Integer,
-                               db.ForeignKey("format_types.format_id"))
+                               db.ForeignKey("format_types.format_id"),
+                               index=True)
 
     format_type = relationship("FormatTypes", foreign_keys=[format_type_id])
     files = relationship("InstantiationFile", backref="file_source")
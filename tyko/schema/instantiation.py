@@ -22,7 +22,8 @@ class InstantiationFile(AVTables):
 
     filesize = db.Column("filesize", db.Integer)
     filesize_unit = db.Column("filesize_unit", db.Text)
-    item_id = db.Column(db.Integer, db.ForeignKey("formats.item_id"))
+    item_id = db.Column(db.Integer, db.ForeignKey("formats.item_id"),
+                        index=True)
     notes = relationship(
         "FileNotes",
         backref="file_note_source"
@@ -66,7 +67,8 @@ class FileNotes(AVTables):
         "note_id", db.Integer, primary_key=True, autoincrement=True)
     message = db.Column("message", db.Text, nullable=False)
     file_id = db.Column(db.Integer,
-                        db.ForeignKey("instantiation_files.file_id"))
+                        db.ForeignKey("instantiation_files.file_id"),
+                        index=True)
 
     def serialize(self, recurse=False) -> Mapping[str, SerializedData]:
         return {
@@ -98,7 +100,8 @@ class FileAnnotation(AVTables):
     id = db.Column(
         "annotation_id", db.Integer, primary_key=True, autoincrement=True)
     file_id = db.Column(db.Integer,
-                        db.ForeignKey("instantiation_files.file_id"))
+                        db.ForeignKey("instantiation_files.file_id"),
+                        index=True)
 
     type_id = db.Column(db.Integer,
                         db.ForeignKey("file_annotation_types.type_id"))
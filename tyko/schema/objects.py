@@ -23,13 +23,19 @@ if TYPE_CHECKING:
 object_has_notes_table = db.Table(
     "object_has_notes",
     AVTables.metadata,
-    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id")),
-    db.Column("object_id", db.Integer, db.ForeignKey("tyko_object.object_id"))
+    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id"),
+              index=True),
+    db.Column("object_id", db.Integer, db.ForeignKey("tyko_object.object_id"),
+              index=True)
 )
 
 
 class CollectionObject(AVTables):
     __tablename__ = "tyko_object"
+    __table_args__ = (
+        # MySQL can only index the start of a TEXT column
+        db.Index("ix_tyko_object_barcode", "barcode", mysql_length=64),
+    )
 
     id = db.Column(
         "object_id",
@@ -44,7 +50,8 @@ class CollectionObject(AVTables):
 
     collection = relationship("Collection", foreign_keys=[collection_id])
 
-    project_id = db.Column(db.Integer, db.ForeignKey("project.project_id"))
+    project_id = db.Column(db.Integer, db.ForeignKey("project.project_id"),
+                           index=True)
     project = relationship("Project", foreign_keys=[project_id])
     originals_rec_date = db.Column("originals_rec_date", db.Date)
     originals_return_date = db.Column("originals_return_date", db.Date)
@@ -13,13 +13,19 @@ if TYPE_CHECKING:
 project_has_notes_table = db.Table(
     "project_has_notes",
     AVTables.metadata,
-    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id")),
-    db.Column("project_id", db.Integer, db.ForeignKey("project.project_id"))
+    db.Column("notes_id", db.Integer, db.ForeignKey("notes.note_id"),
+              index=True),
+    db.Column("project_id", db.Integer, db.ForeignKey("project.project_id"),
+              index=True)
 )
 
 
 class Project(AVTables):
     __tablename__ = "project"
+    __table_args__ = (
+        # MySQL can only index the start of a TEXT column
+        db.Index("ix_project_project_code", "project_code", mysql_length=64),
+    )
 
     id = db.Column(
         "project_id",
@@ -0,0 +1,28 @@
+from typing import Mapping
+
+import sqlalchemy as db
+
+from tyko.schema.avtables import AVTables, SerializedData
+
+
+class SearchToken(AVTables):
+    """Entry of the token index used for search on databases without FTS5.
+
+    One row for every distinct token of an indexed record, with the number
+    of times the token occurs in it.
+    """
+
+    __tablename__ = "search_tokens"
+
+    kind = db.Column("kind", db.String(16), primary_key=True)
+    entity_id = db.Column("entity_id", db.Integer, primary_key=True)
+    token = db.Column("token", db.String(64), primary_key=True, index=True)
+    weight = db.Column("weight", db.Integer, nullable=False, default=1)
+
+    def serialize(self, recurse=False) -> Mapping[str, SerializedData]:
+        return {
+            "kind": self.kind,
+            "entity_id": self.entity_id,
+            "token": self.token,
+            "weight": self.weight
+        }
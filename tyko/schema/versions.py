@@ -0,0 +1,20 @@
+from typing import Mapping
+
+import sqlalchemy as db
+
+from tyko.schema.avtables import AVTables, SerializedData
+
+
+class EntityVersion(AVTables):
+    """Counter that changes every time a row of the named table changes."""
+
+    __tablename__ = "entity_versions"
+
+    entity = db.Column("entity", db.String(64), primary_key=True)
+    version = db.Column("version", db.Integer, nullable=False, default=0)
+
+    def serialize(self, recurse=False) -> Mapping[str, SerializedData]:
+        return {
+            "entity": self.entity,
+            "version": self.version
+        }
@@ -0,0 +1,487 @@
+"""Full text search over projects, objects, items, notes and files.
+
+The searchable text of every record is kept in an inverted index that is
+updated in the same transaction as the record itself. On SQLite the index
+is an FTS5 virtual table, ranked with bm25. On other databases it is the
+search_tokens table, one row per distinct token of a record, ranked by how
+often the searched tokens occur in the record.
+
+Records changed through a session of the data provider are indexed by the
+flush events. Records deleted with a bulk Query.delete() have to be
+removed with remove_records() and records inserted with the bulk
+operations indexed with index_instances(). An existing database is indexed
+with the reindex command, which can also only purge the entries of the
+records that no longer exist.
+
+Every word of a query has to be found in a record for it to match. Words
+match the start of a token, so "12345" finds the barcode "1234567".
+"""
+import abc
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple
+
+import sqlalchemy
+from sqlalchemy import event, orm
+
+from .exceptions import DataError
+from .schema import formats
+from .schema.instantiation import InstantiationFile
+from .schema.notes import Note
+from .schema.objects import CollectionObject
+from .schema.projects import Project
+from .schema.search import SearchToken
+
+SESSION_INFO_KEY = "search_index"
+
+PROJECT = "project"
+OBJECT = "object"
+ITEM = "item"
+NOTE = "note"
+FILE = "file"
+
+FTS_TABLE = "search_index"
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_MAX_TOKEN_LENGTH = 64
+
+# kind: (mapped class, primary key attribute, attributes with the label
+# shown in the results first)
+INDEXED = {
+    PROJECT: (Project, "id", ["title", "project_code", "current_location"]),
+    OBJECT: (CollectionObject, "id", ["name", "barcode"]),
+    ITEM: (formats.AVFormat, "table_id", ["name"]),
+    NOTE: (Note, "id", ["text"]),
+    FILE: (InstantiationFile, "file_id", ["file_name", "generation"]),
+}
+
+# Codes of the kinds in the FTS5 rowid, which is entity id * 8 + code
+_KIND_CODES = {kind: code for code, kind in enumerate(INDEXED, start=1)}
+
+Document = Tuple[str, int, str]
+
+
+def tokenize(text: str) -> List[str]:
+    return [token[:_MAX_TOKEN_LENGTH] for token in
+            _TOKEN.findall(text.lower())]
+
+
+def _kind_of_class(class_) -> Optional[str]:
+    for kind, (mapped_class, _, _) in INDEXED.items():
+        if issubclass(class_, mapped_class):
+            return kind
+    return None
+
+
+def _kind_of(instance) -> Optional[str]:
+    return _kind_of_class(type(instance))
+
+
+def _text_attributes(instance, attributes: List[str]) -> Iterator[str]:
+    yield from attributes
+    if isinstance(instance, formats.AVFormat):
+        # Format specific details such as the tape brand
+        for column in orm.object_mapper(instance).local_table.columns:
+            if isinstance(column.type, sqlalchemy.Text) and \
+                    column.key not in attributes and column.key != "type":
+                yield orm.object_mapper(instance)\
+                    .get_property_by_column(column).key
+
+
+def document(instance) -> Optional[Document]:
+    """Get the kind, id and searchable text of an instance to index."""
+    kind = _kind_of(instance)
+    if kind is None:
+        return None
+    _, id_attribute, attributes = INDEXED[kind]
+    values = [getattr(instance, attribute) for attribute in
+              _text_attributes(instance, attributes)]
+    text = " ".join(str(value) for value in values if value is not None)
+    return kind, getattr(instance, id_attribute), text
+
+
+class AbsSearchIndex(metaclass=abc.ABCMeta):
+
+    @abc.abstractmethod
+    def create(self, connection) -> None:
+        """Create the storage of the index if it does not exist"""
+
+    @abc.abstractmethod
+    def add(self, connection, documents: Sequence[Document]) -> None:
+        """Index documents, replacing what was indexed for them before"""
+
+    @abc.abstractmethod
+    def remove(self, connection, kind: str,
+               entity_ids: Optional[Iterable[int]]) -> None:
+        """Remove records from the index, all of the kind if None"""
+
+    @abc.abstractmethod
+    def purge(self, connection, kind: str) -> None:
+        """Remove the records of a kind that no longer exist"""
+
+    @abc.abstractmethod
+    def search(self, connection, tokens: List[str], kinds: List[str],
+               limit: int, offset: int
+               ) -> Tuple[int, List[Tuple[str, int, float]]]:
+        """Get the number of matches and the page of best matches"""
+
+    def clear(self, connection) -> None:
+        for kind in INDEXED:
+            self.remove(connection, kind, None)
+
+
+def _existing_ids(kind: str):
+    mapped_class, id_attribute, _ = INDEXED[kind]
+    return sqlalchemy.select([getattr(mapped_class, id_attribute)])
+
+
+class FTS5SearchIndex(AbsSearchIndex):
+    """Search index in a SQLite FTS5 virtual table."""
+
+    table = sqlalchemy.table(
+        FTS_TABLE,
+        sqlalchemy.column("rowid", sqlalchemy.Integer),
+        sqlalchemy.column("kind", sqlalchemy.Text),
+        sqlalchemy.column("entity_id", sqlalchemy.Integer),
+        sqlalchemy.column("content", sqlalchemy.Text),
+    )
+
+    def create(self, connection) -> None:
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"kind UNINDEXED, entity_id UNINDEXED, content, "
+            f"tokenize = 'unicode61')"
+        )
+
+    @staticmethod
+    def _rowid(kind: str, entity_id: int) -> int:
+        return entity_id * 8 + _KIND_CODES[kind]
+
+    def add(self, connection, documents: Sequence[Document]) -> None:
+        if not documents:
+            return
+        rowids = [self._rowid(kind, entity_id)
+                  for kind, entity_id, _ in documents]
+        connection.execute(
+            self.table.delete().where(self.table.c.rowid.in_(rowids)))
+        connection.execute(self.table.insert(), [
+            {"rowid": rowid, "kind": kind, "entity_id": entity_id,
+             "content": text}
+            for rowid, (kind, entity_id, text) in zip(rowids, documents)
+        ])
+
+    def remove(self, connection, kind: str,
+               entity_ids: Optional[Iterable[int]]) -> None:
+        if entity_ids is None:
+            connection.execute(
+                self.table.delete().where(self.table.c.kind == kind))
+            return
+        rowids = [self._rowid(kind, entity_id) for entity_id in entity_ids]
+        if rowids:
+            connection.execute(
+                self.table.delete().where(self.table.c.rowid.in_(rowids)))
+
+    def purge(self, connection, kind: str) -> None:
+        connection.execute(
+            self.table.delete()
+            .where(self.table.c.kind == kind)
+            .where(self.table.c.entity_id.notin_(_existing_ids(kind)))
+        )
+
+    def search(self, connection, tokens, kinds, limit, offset):
+        match = " ".join('"{}"*'.format(token) for token in tokens)
+        score = sqlalchemy.literal_column(f"bm25({FTS_TABLE})")
+        condition = sqlalchemy.and_(
+            sqlalchemy.literal_column(FTS_TABLE).match(match),
+            self.table.c.kind.in_(kinds)
+        )
+        total = connection.execute(
+            sqlalchemy.select([sqlalchemy.func.count()])
+            .select_from(self.table).where(condition)
+        ).scalar()
+        rows = connection.execute(
+            sqlalchemy.select([self.table.c.kind, self.table.c.entity_id,
+                               score.label("score")])
+            .where(condition)
+            .order_by(score, self.table.c.rowid)
+            .limit(limit).offset(offset)
+        )
+        return total, [(kind, entity_id, -score)
+                       for kind, entity_id, score in rows]
+
+
+class TokenSearchIndex(AbsSearchIndex):
+    """Search index in the search_tokens table."""
+
+    table = SearchToken.__table__
+
+    def create(self, connection) -> None:
+        self.table.create(bind=connection, checkfirst=True)
+
+    def add(self, connection, documents: Sequence[Document]) -> None:
+        if not documents:
+            return
+        for kind in {kind for kind, _, _ in documents}:
+            self.remove(connection, kind,
+                        [entity_id for document_kind, entity_id, _
+                         in documents if document_kind == kind])
+        rows: List[Dict[str, Any]] = []
+        for kind, entity_id, text in documents:
+            weights: Dict[str, int] = {}
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0) + 1
+            rows.extend({"kind": kind, "entity_id": entity_id,
+                         "token": token, "weight": weight}
+                        for token, weight in weights.items())
+        if rows:
+            connection.execute(self.table.insert(), rows)
+
+    def remove(self, connection, kind: str,
+               entity_ids: Optional[Iterable[int]]) -> None:
+        query = self.table.delete().where(self.table.c.kind == kind)
+        if entity_ids is not None:
+            entity_ids = list(entity_ids)
+            if not entity_ids:
+                return
+            query = query.where(self.table.c.entity_id.in_(entity_ids))
+        connection.execute(query)
+
+    def purge(self, connection, kind: str) -> None:
+        connection.execute(
+            self.table.delete()
+            .where(self.table.c.kind == kind)
+            .where(self.table.c.entity_id.notin_(_existing_ids(kind)))
+        )
+
+    def search(self, connection, tokens, kinds, limit, offset):
+        # One subquery per token with the records that have a token
+        # starting with it, joined to keep the records that have them all
+        matches = []
+        for token in tokens:
+            pattern = token.replace("\\", "\\\\").replace("_", "\\_") + "%"
+            matches.append(
+                sqlalchemy.select([
+                    self.table.c.kind, self.table.c.entity_id,
+                    sqlalchemy.func.sum(self.table.c.weight).label("weight")
+                ])
+                .where(self.table.c.token.like(pattern, escape="\\"))
+                .where(self.table.c.kind.in_(kinds))
+                .group_by(self.table.c.kind, self.table.c.entity_id)
+                .alias()
+            )
+        first = matches[0]
+        joined = first
+        for match in matches[1:]:
+            joined = joined.join(match, sqlalchemy.and_(
+                match.c.kind == first.c.kind,
+                match.c.entity_id == first.c.entity_id))
+        score = sum((match.c.weight for match in matches[1:]),
+                    first.c.weight)
+        total = connection.execute(
+            sqlalchemy.select([sqlalchemy.func.count()]).select_from(joined)
+        ).scalar()
+        rows = connection.execute(
+            sqlalchemy.select([first.c.kind, first.c.entity_id,
+                               score.label("score")])
+            .select_from(joined)
+            .order_by(score.desc(), first.c.kind, first.c.entity_id)
+            .limit(limit).offset(offset)
+        )
+        return total, [(kind, entity_id, float(score))
+                       for kind, entity_id, score in rows]
+
+
+def _has_fts5(engine) -> bool:
+    if engine.dialect.name != "sqlite":
+        return False
+    options = {row[0] for row in
+               engine.execute("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+
+def create_index(engine) -> AbsSearchIndex:
+    """Get the best search index available for the database."""
+    if _has_fts5(engine):
+        return FTS5SearchIndex()
+    return TokenSearchIndex()
+
+
+def is_index_table(table_name: str) -> bool:
+    """Check if a table is the FTS5 table, or one of its shadow tables."""
+    return table_name == FTS_TABLE or table_name.startswith(f"{FTS_TABLE}_")
+
+
+def from_session(session) -> Optional[AbsSearchIndex]:
+    return session.info.get(SESSION_INFO_KEY)
+
+
+def index_instances(session, instances: Iterable[Any]) -> None:
+    """Index records that did not go through a flush of the session."""
+    search_index = from_session(session)
+    if search_index is None:
+        return
+    documents = [doc for doc in map(document, instances) if doc is not None]
+    search_index.add(session.connection(), documents)
+
+
+def reindex(session, batch_size: int = 1000) -> int:
+    """Rebuild the whole index from the records in the database.
+
+    Returns:
+        number of records indexed
+
+    """
+    search_index = from_session(session)
+    if search_index is None:
+        raise ValueError("The session has no search index")
+    connection = session.connection()
+    search_index.clear(connection)
+    count = 0
+    for kind in INDEXED:
+        for batch in _documents(session, kind, batch_size):
+            search_index.add(connection, batch)
+            count += len(batch)
+    return count
+
+
+def purge(session) -> None:
+    """Remove the entries of the records that no longer exist.
+
+    Records deleted outside of the data provider, or by a cascade of the
+    database, are left in the index until it is purged or rebuilt.
+    """
+    search_index = from_session(session)
+    if search_index is None:
+        return
+    connection = session.connection()
+    for kind in INDEXED:
+        search_index.purge(connection, kind)
+
+
+def _documents(session, kind: str,
+               batch_size: int) -> Iterator[List[Document]]:
+    """Read the documents of every record of a kind, a batch at a time.
+
+    Each batch is a separate query on the primary key that is read in full
+    before the batch is indexed, as MySQL does not allow statements on a
+    connection while it still has a result set to read.
+    """
+    mapped_class, id_attribute, _ = INDEXED[kind]
+    id_column = getattr(mapped_class, id_attribute)
+    after = None
+    while True:
+        if mapped_class is formats.AVFormat:
+            query = session.query(orm.with_polymorphic(mapped_class, "*"))
+        else:
+            query = session.query(mapped_class)
+        if after is not None:
+            query = query.filter(id_column > after)
+        instances = query.order_by(id_column).limit(batch_size).all()
+        if not instances:
+            return
+        after = getattr(instances[-1], id_attribute)
+        yield [doc for doc in map(document, instances) if doc is not None]
+
+
+def _labels(session, kind: str, entity_ids: List[int]) -> Dict[int, str]:
+    mapped_class, id_attribute, attributes = INDEXED[kind]
+    id_column = getattr(mapped_class, id_attribute)
+    rows = session.query(id_column, getattr(mapped_class, attributes[0]))\
+        .filter(id_column.in_(entity_ids))
+    return {entity_id: label for entity_id, label in rows}
+
+
+def search(session, query: str, kinds: Optional[List[str]] = None,
+           limit: int = DEFAULT_LIMIT,
+           offset: int = 0) -> Dict[str, Any]:
+    """Find the records that match a query, best matches first.
+
+    Args:
+        session: session of the data provider
+        query: words to look for
+        kinds: kinds of records to look for, all of them if None
+        limit: max number of results
+        offset: number of results to skip
+
+    Raises:
+        DataError: if the query has no words or a kind is unknown
+
+    """
+    search_index = from_session(session)
+    if search_index is None:
+        raise DataError(message="Search is not available", status_code=503)
+
+    tokens = tokenize(query or "")
+    if not tokens:
+        raise DataError(message="The search query has no words",
+                        status_code=400)
+    kinds = list(kinds or INDEXED)
+    unknown = [kind for kind in kinds if kind not in INDEXED]
+    if unknown:
+        raise DataError(
+            message=f"Unknown type: {', '.join(unknown)}. "
+                    f"Expected one of {', '.join(INDEXED)}",
+            status_code=400)
+
+    total, matches = search_index.search(session.connection(), tokens,
+                                         kinds, limit, offset)
+    labels = {
+        kind: _labels(session, kind,
+                      [entity_id for match_kind, entity_id, _ in matches
+                       if match_kind == kind])
+        for kind in {kind for kind, _, _ in matches}
+    }
+    return {
+        "total": total,
+        "results": [
+            {
+                "type": kind,
+                "id": entity_id,
+                "name": labels[kind][entity_id],
+                "score": score,
+            }
+            for kind, entity_id, score in matches
+            if entity_id in labels[kind]
+        ]
+    }
+
+
+def _after_flush(session, flush_context):  # pylint: disable=unused-argument
+    search_index = from_session(session)
+    if search_index is None:
+        return
+    changed = list(session.new) + [
+        instance for instance in session.dirty
+        if session.is_modified(instance)
+    ]
+    connection = session.connection()
+    search_index.add(connection, [
+        doc for doc in map(document, changed) if doc is not None
+    ])
+    for instance in session.deleted:
+        kind = _kind_of(instance)
+        if kind is not None:
+            _, id_attribute, _ = INDEXED[kind]
+            search_index.remove(connection, kind,
+                                [getattr(instance, id_attribute)])
+
+
+def remove_records(session, mapped_class, entity_ids: Iterable[int]
+                   ) -> None:
+    """Remove records from the index of the session.
+
+    Needed before a bulk Query.delete(), which does not go through the
+    flush events.
+    """
+    search_index = from_session(session)
+    kind = _kind_of_class(mapped_class)
+    if search_index is not None and kind is not None:
+        search_index.remove(session.connection(), kind, list(entity_ids))
+
+
+def track_changes(session_factory) -> None:
+    """Keep the search index up to date for sessions from the factory."""
+    event.listen(session_factory, "after_flush", _after_flush)
@@ -0,0 +1,123 @@
+"""Request scoped database sessions.
+
+Inside a Flask application context every call to a RequestSessionMaker
+returns the same session, so all the connectors used while handling a
+request share one connection and one identity map. Connectors still close
+the sessions they get, but closing a request scoped session only discards
+a failed transaction, or the changes left uncommitted by a connector that
+did not finish its work. The session is really closed, and its connection
+returned to the pool, when the application context is torn down.
+
+Outside of an application context, such as in the command line tools,
+every call creates a new independent session like a plain sessionmaker.
+"""
+from typing import Any, Dict, Optional
+
+import flask
+from sqlalchemy import event, orm
+
+
+class RequestSession(orm.Session):
+    """Session that can be shared by everything handling a request.
+
+    A connector can call other connectors, which get and close the same
+    session, so the session counts the connectors using it. Changes that
+    are still uncommitted once the last of them closes it were left by a
+    connector that failed, and are rolled back so the next connector to
+    commit does not save them.
+    """
+
+    request_scoped = False
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.users = 0
+        self.flushed = False
+
+    def has_uncommitted_changes(self) -> bool:
+        return self.flushed or bool(self.new or self.deleted) or \
+            any(self.is_modified(instance) for instance in self.dirty)
+
+    def close(self) -> None:
+        if not self.request_scoped:
+            super().close()
+            return
+
+        self.users = max(self.users - 1, 0)
+        # Let the next connector in the request use the session again
+        if not self.is_active or \
+                (self.users == 0 and self.has_uncommitted_changes()):
+            self.rollback()
+
+    def close_request(self) -> None:
+        """Close the session at the end of the request."""
+        self.request_scoped = False
+        self.close()
+
+
+class RequestSessionMaker:
+    """Create sessions that are shared for the length of a request.
+
+    Args:
+        session_factory: sessionmaker creating RequestSession sessions. Any
+            events listening to it apply to the request scoped sessions
+
+    """
+
+    def __init__(self, session_factory: orm.sessionmaker) -> None:
+        self.session_factory = session_factory
+        self._key = f"tyko_session_{id(self)}"
+
+    @property
+    def kw(self) -> Dict[str, Any]:
+        return self.session_factory.kw
+
+    def __call__(self) -> orm.Session:
+        if not flask.has_app_context():
+            return self.session_factory()
+
+        session: Optional[RequestSession] = flask.g.get(self._key)
+        if session is None:
+            session = self.session_factory()
+            session.request_scoped = True
+            setattr(flask.g, self._key, session)
+        session.users += 1
+        return session
+
+    def remove(self, exception=None) -> None:  # noqa: E501 pylint: disable=unused-argument
+        """Close the session of the current application context, if any.
+
+        Registered with Flask's teardown_appcontext.
+        """
+        session: Optional[RequestSession] = flask.g.pop(self._key, None)
+        if session is not None:
+            session.close_request()
+
+
+def _after_flush(session, flush_context):  # noqa: E501 pylint: disable=unused-argument
+    session.flushed = True
+
+
+def _after_transaction_end(session, transaction):  # noqa: E501 pylint: disable=unused-argument
+    if transaction.parent is None:
+        session.flushed = False
+
+
+def create_session_maker(engine, **kwargs) -> RequestSessionMaker:
+    session_factory = orm.sessionmaker(bind=engine, class_=RequestSession,
+                                       **kwargs)
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "after_transaction_end",
+                 _after_transaction_end)
+    return RequestSessionMaker(session_factory)
+
+
+def unscoped(session_maker):
+    """Get a factory for sessions that are not shared with the request.
+
+    For long running work, such as streaming an export, that should not
+    keep everything it loads in the identity map of the request.
+    """
+    if isinstance(session_maker, RequestSessionMaker):
+        return session_maker.session_factory
+    return session_maker
@@ -0,0 +1,111 @@
+"""Per table change counters.
+
+Every time a flush inserts, updates or deletes rows, the counter in the
+entity_versions table for each affected table is incremented in the same
+transaction. Responses built from a set of tables can then be identified
+by the counters of those tables, which is a single small query, instead of
+by hashing the serialized data.
+
+Items are tracked under the table of the base AVFormat class so a change to
+any type of item bumps the "formats" counter.
+"""
+import hashlib
+from typing import Dict, Iterable, Set
+
+import sqlalchemy
+from sqlalchemy import event, orm
+
+from .schema.avtables import AVTables
+from .schema.versions import EntityVersion
+
+VERSIONS_TABLE = EntityVersion.__table__
+
+
+def entity_name(mapper: orm.Mapper) -> str:
+    """Get the name the changes to a mapped class are tracked under."""
+    return mapper.base_mapper.local_table.name
+
+
+def tracked_entities() -> Iterable[str]:
+    for table_name in AVTables.metadata.tables:
+        if table_name not in (VERSIONS_TABLE.name, "alembic_version"):
+            yield table_name
+
+
+def populate_versions(connection) -> None:
+    """Add a counter for every table that does not have one yet."""
+    existing = {
+        row.entity for row in
+        connection.execute(sqlalchemy.select([VERSIONS_TABLE.c.entity]))
+    }
+    missing = [
+        {"entity": name, "version": 0}
+        for name in tracked_entities() if name not in existing
+    ]
+    if missing:
+        connection.execute(VERSIONS_TABLE.insert(), missing)
+
+
+def bump(connection, entities: Iterable[str]) -> None:
+    for name in sorted(set(entities)):
+        result = connection.execute(
+            VERSIONS_TABLE.update()
+            .where(VERSIONS_TABLE.c.entity == name)
+            .values(version=VERSIONS_TABLE.c.version + 1)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                VERSIONS_TABLE.insert().values(entity=name, version=1))
+
+
+def get_versions(session, entities: Iterable[str]) -> Dict[str, int]:
+    names = sorted(set(entities))
+    versions = dict.fromkeys(names, 0)
+    rows = session.query(EntityVersion.entity, EntityVersion.version)\
+        .filter(EntityVersion.entity.in_(names))
+    for name, version in rows:
+        versions[name] = version
+    return versions
+
+
+def make_etag(key: str, versions: Dict[str, int]) -> str:
+    """Create an ETag for a resource built from the versioned tables.
+
+    Args:
+        key: identifies the resource, such as the full path of the request
+        versions: counters as returned by get_versions()
+
+    """
+    stamp = ",".join(f"{name}={version}"
+                     for name, version in sorted(versions.items()))
+    return hashlib.sha256(f"{key}|{stamp}".encode("utf-8")).hexdigest()
+
+
+def _changed_entities(session) -> Set[str]:
+    changed = set()
+    for instance in session.new:
+        changed.add(entity_name(orm.object_mapper(instance)))
+    for instance in session.deleted:
+        changed.add(entity_name(orm.object_mapper(instance)))
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            changed.add(entity_name(orm.object_mapper(instance)))
+    return changed
+
+
+def _after_flush(session, flush_context):  # pylint: disable=unused-argument
+    # new, dirty and deleted still describe the state before the flush here
+    changed = _changed_entities(session)
+    if changed:
+        bump(session.connection(), changed)
+
+
+def _after_bulk_operation(context):
+    bump(context.session.connection(), [entity_name(context.mapper)])
+
+
+def track_changes(session_factory) -> None:
+    """Keep the entity versions up to date for sessions from the factory."""
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "after_bulk_update", _after_bulk_operation)
+    event.listen(session_factory, "after_bulk_delete", _after_bulk_operation)
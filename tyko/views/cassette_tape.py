@@ -1,5 +1,7 @@
 import abc
-from flask import views, request, jsonify, make_response
+from flask import views, request, make_response
+from tyko.decorators import conditional_response
+from tyko.json_response import jsonify
 from tyko.data_provider import CassetteTypeConnector, \
     CassetteTapeTypeConnector, \
     CassetteTapeThicknessConnector, \
@@ -15,6 +17,7 @@ class AbsEnumView(views.MethodView):
         super().__init__()
         self._provider = provider
 
+    @conditional_response
     def get(self):
         requested_id = request.args.get("id")
         results = self.connector.get(id=requested_id, serialize=True)
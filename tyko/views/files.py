@@ -1,8 +1,10 @@
 import functools
 import flask.wrappers
-from flask import views, request, url_for, jsonify, make_response
+from flask import views, request, url_for, make_response
 
-from tyko import data_provider
+from tyko.decorators import conditional_response
+from tyko.json_response import jsonify
+from tyko import data_provider, hierarchy
 from tyko.data_provider import DataProvider
 
 
@@ -12,11 +14,12 @@ class ItemFilesAPI(views.MethodView):
         def validate(cls, func):
             @functools.wraps(func)
             def wrapper(self, project_id, object_id, item_id):
-                file_id = int(request.args['id'])
-
-                if self._has_matching_file(project_id, object_id,  # noqa: E501 pylint: disable=W0212
-                                           item_id, file_id) is False:
-                    raise AttributeError("Record mismatch")
+                provider = self._data_provider  # pylint: disable=W0212
+                hierarchy.check_path(
+                    provider.db_session_maker,
+                    project_id=project_id, object_id=object_id,
+                    item_id=item_id,
+                    file_id=request.args.get('id', type=int))
                 return func(self, project_id, object_id, item_id)
 
             return wrapper
@@ -29,6 +32,7 @@ class ItemFilesAPI(views.MethodView):
     def get_by_id(self, file_id):
         return self._data_connector.get(int(file_id), serialize=True)
 
+    @conditional_response
     @Decorators.validate
     def get(self, project_id, object_id, item_id) -> flask.Response:  # noqa: E501 pylint: disable=W0613
         file_id = request.args.get("id")
@@ -40,12 +44,20 @@ class ItemFilesAPI(views.MethodView):
         items_dp = data_provider.ItemDataConnector(
             self._data_provider.db_session_maker)
         item = items_dp.get(item_id, serialize=True)
+        files = self._data_connector.get_many(
+            [item_file['id'] for item_file in item['files']],
+            serialize=True
+        )
+        for item_file in files:
+            # Files used to be listed with the summary the item gives them
+            item_file['name'] = item_file['file_name']
         return jsonify({
-            "files": item['files'],
-            "total": len(item['files'])
+            "files": files,
+            "total": len(files)
 
         })
 
+    @Decorators.validate
     def post(self, project_id, object_id, item_id) -> flask.Response:
         json_request = request.get_json()
         new_file_id = self._data_connector.create(
@@ -83,33 +95,6 @@ class ItemFilesAPI(views.MethodView):
             return make_response("", 202)
         return make_response("", 404)
 
-    def _has_matching_file(self,
-                           project_id: int,
-                           object_id: int,
-                           item_id: int,
-                           file_id: int
-                           ) -> bool:
-        """Check if there is a matching file that matches all the ids"""
-
-        project_connector = data_provider.ProjectDataConnector(
-            self._data_provider.db_session_maker)
-        item_connector = data_provider.ItemDataConnector(
-            self._data_provider.db_session_maker)
-
-        project = project_connector.get(project_id, serialize=True)
-
-        for obj in filter(lambda obj: obj['object_id'] == object_id,
-                          project['objects']):
-            for item in filter(lambda i: i['item_id'] == item_id,
-                               obj['items']):
-
-                matching_files = list(
-                    filter(lambda f: f['id'] == file_id, item_connector.get(
-                        item['item_id'], serialize=True)['files']))
-                return len(matching_files) == 1
-
-        return False
-
 
 class FileNotesAPI(views.MethodView):
     def __init__(self, provider: DataProvider) -> None:
@@ -117,6 +102,7 @@ class FileNotesAPI(views.MethodView):
         self._data_connector = \
             data_provider.FileNotesDataConnector(provider.db_session_maker)
 
+    @conditional_response
     def get(self, file_id: int) -> flask.Response:
         note_id = request.args.get("id")
         if note_id is not None:
@@ -223,6 +209,7 @@ class FileAnnotationsAPI(views.MethodView):
     def __init__(self, provider: DataProvider) -> None:
         self._data_provider = provider
 
+    @conditional_response
     def get(self, file_id: int) -> flask.Response:
         file_connector = data_provider.FilesDataConnector(
             self._data_provider.db_session_maker)
@@ -284,6 +271,7 @@ class FileAnnotationTypesAPI(views.MethodView):
     def __init__(self, provider: DataProvider) -> None:
         self._data_provider = provider
 
+    @conditional_response
     def get(self) -> flask.Response:
         connector = data_provider.FileAnnotationsConnector(
             self._data_provider.db_session_maker)
@@ -2,19 +2,23 @@ import sys
 import traceback
 from typing import Dict, Any
 
-from flask import views, make_response, jsonify, request, url_for
+from flask import views, make_response, request, url_for
 
-from tyko import middleware, data_provider
+from tyko.decorators import conditional_response
+from tyko.json_response import jsonify
+from tyko import middleware, data_provider, hierarchy
 
 
 class ObjectItemNotesAPI(views.MethodView):
     def __init__(self, item: middleware.ItemMiddlwareEntity) -> None:
         self._item = item
 
-    def put(self, project_id, object_id, item_id, note_id):  # noqa: E501 pylint: disable=W0613,C0301
+    def put(self, project_id, object_id, item_id, note_id):
+        self._item.check_path(project_id, object_id, item_id)
         return self._item.update_note(item_id, note_id)
 
-    def delete(self, project_id, object_id, item_id, note_id):  # noqa: E501  pylint: disable=W0613,C0301
+    def delete(self, project_id, object_id, item_id, note_id):
+        self._item.check_path(project_id, object_id, item_id)
         return self._item.remove_note(item_id, note_id)
 
 
@@ -23,14 +27,16 @@ class ObjectItemAPI(views.MethodView):
 
         self._provider = provider
 
-    def post(self, project_id, object_id):  # noqa: E501  pylint: disable=W0613,C0301
-        current_project = middleware.ProjectMiddlwareEntity(
-            self._provider).get_project_by_id(project_id)
-        # make sure that the project has that object
-        for child_object in current_project['objects']:
-            if child_object['object_id'] == object_id:
-                break
-        else:
+    def _has_object(self, project_id: int, object_id: int) -> bool:
+        session = self._provider.db_session_maker()
+        try:
+            return hierarchy.path_exists(session, project_id=project_id,
+                                         object_id=object_id)
+        finally:
+            session.close()
+
+    def post(self, project_id, object_id):
+        if not self._has_object(project_id, object_id):
             return make_response(
                 f"Project with id {project_id} does not have an object with an"
                 f" id of {object_id}",
@@ -94,15 +100,17 @@ class ObjectItemAPI(views.MethodView):
             traceback.print_exc(file=sys.stderr)
             return make_response("Invalid item data", 400)
 
-    def get(self, project_id, object_id):  # noqa: E501  pylint: disable=W0613,C0301
+    @conditional_response
+    def get(self, project_id, object_id):
         item_id = int(request.args.get("item_id"))
+        hierarchy.check_path(self._provider.db_session_maker,
+                             project_id=project_id, object_id=object_id,
+                             item_id=item_id)
 
         connector = data_provider.ItemDataConnector(
             self._provider.db_session_maker)
 
         i = connector.get(id=item_id, serialize=True)
-        if i['parent_object_id'] != object_id:
-            raise AttributeError("object id doesn't match item id")
         for note in i['notes']:
             note['route'] = self.get_note_routes(
                 note,
@@ -114,6 +122,9 @@ class ObjectItemAPI(views.MethodView):
 
     def put(self, project_id, object_id):
         item_id = request.args.get("item_id")
+        hierarchy.check_path(self._provider.db_session_maker,
+                             project_id=project_id, object_id=object_id,
+                             item_id=int(item_id))
         data = request.get_json()
         connector = data_provider.ItemDataConnector(
             self._provider.db_session_maker)
@@ -132,8 +143,11 @@ class ObjectItemAPI(views.MethodView):
                            project_id=project_id)
         }
 
-    def delete(self, project_id, object_id):  # noqa: E501  pylint: disable=W0613,C0301
+    def delete(self, project_id, object_id):
         item_id = int(request.args.get("item_id"))
+        hierarchy.check_path(self._provider.db_session_maker,
+                             project_id=project_id, object_id=object_id,
+                             item_id=item_id)
         parent_object = middleware.ObjectMiddlwareEntity(self._provider)
         return parent_object.remove_item(object_id=object_id, item_id=item_id)
 
@@ -186,6 +200,7 @@ class ItemAPI(views.MethodView):
             }
         )
 
+    @conditional_response
     def get(self, item_id):
         item = self._data_connector.get(item_id, True)
         object_provider = data_provider.ObjectDataConnector(
@@ -1,5 +1,6 @@
 from flask import views
 
+from tyko.decorators import conditional_response
 from tyko import middleware
 
 
@@ -20,6 +21,7 @@ class ProjectsAPI(views.MethodView):
     def __init__(self, project: middleware.ProjectMiddlwareEntity) -> None:
         self._project = project
 
+    @conditional_response
     def get(self):
         return self._project.get(True)
 
@@ -34,5 +36,6 @@ class ProjectAPI(views.MethodView):
     def delete(self, project_id: int):
         return self._project.delete(id=project_id)
 
+    @conditional_response
     def get(self, project_id: int):
         return self._project.get(id=project_id)
@@ -1,5 +1,7 @@
-from flask import views, jsonify, make_response, url_for
+from flask import views, make_response, url_for
 
+from tyko.decorators import conditional_response
+from tyko.json_response import jsonify
 from tyko import middleware
 
 
@@ -7,34 +9,27 @@ class ProjectObjectAPI(views.MethodView):
     def __init__(self, project: middleware.ProjectMiddlwareEntity) -> None:
         self._project = project
 
+    @conditional_response
     def get(self, project_id, object_id):
-
-        p = self._project.get_project_by_id(id=project_id)
-        for o in p['objects']:
-            if object_id == o['object_id']:
-                for item in o['items']:
-                    routes = {
-                        "frontend": url_for(
-                            "page_project_object_item_details",
-                            project_id=project_id,
-                            object_id=object_id,
-                            item_id=item['item_id']
-                        ),
-                        "api": url_for(
-                            "object_item",
-                            project_id=project_id,
-                            object_id=object_id,
-                            item_id=item['item_id']
-                        )
-                    }
-                    item['routes'] = routes
-                return jsonify(
-                    {
-                        **o,
-                        "parent_project_id": project_id
-                    }
+        o = self._project.get_project_object(project_id, object_id)
+        if o is None:
+            return make_response("no matching item", 404)
+        for item in o['items']:
+            item['routes'] = {
+                "frontend": url_for(
+                    "page_project_object_item_details",
+                    project_id=project_id,
+                    object_id=object_id,
+                    item_id=item['item_id']
+                ),
+                "api": url_for(
+                    "object_item",
+                    project_id=project_id,
+                    object_id=object_id,
+                    item_id=item['item_id']
                 )
-        return make_response("no matching item", 404)
+            }
+        return jsonify(o)
 
     def delete(self, project_id, object_id):
         return self._project.remove_object(project_id, object_id)
@@ -49,6 +44,7 @@ class ObjectApi(views.MethodView):
     def delete(self, object_id: int):
         return self._object_middleware.delete(id=object_id)
 
+    @conditional_response
     def get(self, object_id: int):
         return self._object_middleware.get(id=object_id)
 
@@ -63,8 +59,10 @@ class ProjectObjectNotesAPI(views.MethodView):
 
         self._project_object = project_object
 
-    def delete(self, project_id, object_id, note_id):  # pylint: disable=W0613
+    def delete(self, project_id, object_id, note_id):
+        self._project_object.check_path(project_id, object_id)
         return self._project_object.remove_note(object_id, note_id)
 
-    def put(self, project_id, object_id, note_id):  # pylint: disable=W0613
+    def put(self, project_id, object_id, note_id):
+        self._project_object.check_path(project_id, object_id)
         return self._project_object.update_note(object_id, note_id)